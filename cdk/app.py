@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import os, sys
+import json, os, sys
 import aws_cdk as cdk
 from app.iam_nested_stack import IamNestedStack
 from app.api_nested_stack import ApiNestedStack
@@ -7,52 +7,125 @@ from app.network_nested_stack import NetworkNestedStack
 from app.medialive_nested_stack import MediaLiveNestedStack
 from app.storage_nested_stack import StorageNestedStack
 from app.protected_streaming_root_stack import ProtectedStreamingRoot
+from app.monitoring_nested_stack import MonitoringNestedStack
+from app.channel_config import load_channel_config
 from cdk_nag import AwsSolutionsChecks
 from aws_cdk import Aspects
 from cdk_nag import NagSuppressions
 
-### UPDATE THESE TWO VARIABLES WITH ARNs OF YOUR VPN CLIENT AND SERVER CERTIFICATES
-my_client_vpn_cert_param = ""
-my_server_vpn_cert_param = ""
+app = cdk.App()
+
+### ARNs OF YOUR VPN CLIENT AND SERVER CERTIFICATES
+# Pass them with -c client_vpn_cert=<arn> -c server_vpn_cert=<arn>, set CLIENT_VPN_CERT_ARN and SERVER_VPN_CERT_ARN,
+# or replace the "" defaults below
+my_client_vpn_cert_param = app.node.try_get_context("client_vpn_cert") or os.environ.get("CLIENT_VPN_CERT_ARN") or ""
+my_server_vpn_cert_param = app.node.try_get_context("server_vpn_cert") or os.environ.get("SERVER_VPN_CERT_ARN") or ""
 if (my_client_vpn_cert_param == "" or my_server_vpn_cert_param == ""):
-    print("Update the client and server certificate ARNs in the app.py file")
+    print("Set the client and server certificate ARNs with -c client_vpn_cert=<arn> -c server_vpn_cert=<arn>, "
+          "the CLIENT_VPN_CERT_ARN and SERVER_VPN_CERT_ARN environment variables, or in the app.py file")
     sys.exit(1) # Exit with error
 
-app = cdk.App()
 env = cdk.Environment(account=os.environ['CDK_DEFAULT_ACCOUNT'], region=os.environ['CDK_DEFAULT_REGION'])
 
 my_stack_name = "protected_streaming"
 
 
-my_media_destinations = {
-    "primary": "/pipe-1/media",
-    "secondary": "/pipe-2/media"
-}
+def context_value(key: str, default=None):
+    """Value of -c key=value, or default when it is not set. JSON values such as true or {"rate_limit": 100} are parsed."""
+    value = app.node.try_get_context(key)
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass            # Plain strings such as -c delivery_mode=redirect
+    return default if value is None else value
+
+
+# Channels to deploy, each with its own MediaLive input, channel and S3 prefix. They share the VPC and the API.
+# Use another file with: cdk deploy -c channels_config=<path>
+my_channels_config = app.node.try_get_context("channels_config") or os.path.join(os.path.dirname(__file__), "channels.json")
+my_channels = load_channel_config(my_channels_config)
+
+# The API settings below can also be set per deploy, e.g. cdk deploy -c cache_cluster_size=0.5 -c manifest_origin=true
+
+# Set to e.g. "0.5" (GB) to cache playlists in the API stage, and segments under 900 KB
+my_cache_cluster_size = context_value("cache_cluster_size")
+my_cache_cluster_size = None if my_cache_cluster_size is None else str(my_cache_cluster_size)
+
+# Serve live playlists from the API stage cache, refreshed each time MediaLive writes them. Needs my_cache_cluster_size.
+my_manifest_origin = context_value("manifest_origin", False)
+
+# "proxy" streams segments through the API, "redirect" sends players to S3 through a private interface endpoint with presigned URLs
+my_delivery_mode = context_value("delivery_mode", "proxy")
+
+# Throttles are {"rate_limit": requests per second, "burst_limit": requests}, None leaves only the account limit.
+# Size them with capacity_planner.py, e.g. manifests at 2 requests per segment length per viewer.
+my_stage_throttle = context_value("stage_throttle")
+my_manifest_throttle = context_value("manifest_throttle")
+my_segment_throttle = context_value("segment_throttle")
+
+# One API key per viewer client, e.g. -c usage_plan_clients='["lobby", "floor_3"]', each key gets client_throttle on its own.
+# Needs the proxy delivery mode, presigned segment requests go past the usage plan.
+my_usage_plan_clients = context_value("usage_plan_clients")
+my_client_throttle = context_value("client_throttle")
+
+# Require a signed, channel scoped viewer token on every playlist and segment request, see lambda/viewer_authorizer.
+# Mint and revoke tokens with viewer_token.py.
+my_viewer_auth = context_value("viewer_auth", False)
 
 root_stack = ProtectedStreamingRoot(app, "ProtectedStreaming", env=env)
 
 network_stack = NetworkNestedStack(root_stack, "Network", 
     client_vpn_cert=my_client_vpn_cert_param, 
     server_vpn_cert=my_server_vpn_cert_param,
+    s3_interface_endpoint=(my_delivery_mode == "redirect"),
     stack_name=my_stack_name)
 iam_stack = IamNestedStack(root_stack, "Security")
 storage_stack = StorageNestedStack(root_stack, "Storage", 
     security=iam_stack,
     network=network_stack,
+    event_bridge_enabled=my_manifest_origin,
+    lifecycle_rules=[rule for channel in my_channels for rule in channel["lifecycle_rules"]],    # "lifecycle" in channels.json
     stack_name=my_stack_name)
+medialive_stacks = [
+    MediaLiveNestedStack(root_stack, f"MediaLive-{channel['name']}", 
+        network=network_stack, 
+        storage=storage_stack,
+        media_destinations=channel["media_destinations"], 
+        channel_name=channel["name"],
+        stack_name=my_stack_name,
+        **channel["settings"])      # renditions, latency_profile, rate_control, ingest, ts_file_mode, container, see channels.json
+    for channel in my_channels
+]
 gateway_stack = ApiNestedStack(root_stack, "Gateway", 
     security=iam_stack,
     network=network_stack, 
     storage=storage_stack,
-    media_destinations=my_media_destinations,
+    channels=medialive_stacks,
+    cache_cluster_size=my_cache_cluster_size,
+    manifest_origin=my_manifest_origin,
+    minimum_compression_size=1024,  # Playlists and player files of at least this many bytes are gzipped, None turns it off
+    delivery_mode=my_delivery_mode,
+    stage_throttle=my_stage_throttle,
+    manifest_throttle=my_manifest_throttle,
+    segment_throttle=my_segment_throttle,
+    usage_plan_clients=my_usage_plan_clients,
+    client_throttle=my_client_throttle,
+    viewer_auth=my_viewer_auth,
+    auth_cache_ttl=300,             # Seconds a viewer's authorization is reused, and how long a revoked viewer keeps access
     stack_name=my_stack_name)
-medialive_stack = MediaLiveNestedStack(root_stack, "MediaLive", 
-    network=network_stack, 
+monitoring_stack = MonitoringNestedStack(root_stack, "Monitoring",
+    gateway=gateway_stack,
     storage=storage_stack,
-    media_destinations=my_media_destinations, 
+    channels=medialive_stacks,
+    alarm_thresholds={},            # Override defaults from ALARM_THRESHOLDS in app/monitoring_nested_stack.py
     stack_name=my_stack_name)
 
-Aspects.of(app).add(AwsSolutionsChecks(verbose=True))
+# cdk_nag AwsSolutions checks of every stack, the slowest part of synth. Skip them while iterating with -c nag=false,
+# run them before deploying. The suppressions below only add metadata, so templates are the same either way.
+my_nag = str(app.node.try_get_context("nag")).lower() != "false"
+if my_nag:
+    Aspects.of(app).add(AwsSolutionsChecks(verbose=True))
 # adding suppressions and justifications
 NagSuppressions.add_stack_suppressions(iam_stack, [{"id":"AwsSolutions-IAM5", "reason":"resources are added to the policy in the storage stack, done to avoid circular dependencies"}])
 NagSuppressions.add_stack_suppressions(network_stack,[{"id":"AwsSolutions-VPC7", "reason":"flow logs are not created to reduce cost impact on customer"}])
@@ -60,8 +133,10 @@ NagSuppressions.add_stack_suppressions(gateway_stack,[
     {"id":"AwsSolutions-COG4", "reason":"the API gateway created is private, can only be accessed when customer has set up their VPN to connect to the private VPC endpoint. Solution does not require cognito for authentication"},
     {"id":"AwsSolutions-APIG6", "reason":"the API gateway created is private, can only be accessed when customer has set up their VPN to connect to the private VPC endpoint. Solution does not require cognito for authentication"},
     {"id":"AwsSolutions-APIG4", "reason":"the API gateway created is private, can only be accessed when customer has set up their VPN to connect to the private VPC endpoint. Solution does not require cognito for authentication"},
-    {"id":"AwsSolutions-APIG1", "reason":"the API gateway created is private, can only be accessed when customer has set up their VPN to connect to the private VPC endpoint. Solution does not require cognito for authentication"},
-    {"id":"AwsSolutions-APIG2", "reason":"the API gateway created is private, can only be accessed when customer has set up their VPN to connect to the private VPC endpoint. Solution does not require cognito for authentication"}
+    {"id":"AwsSolutions-APIG2", "reason":"the API gateway created is private, can only be accessed when customer has set up their VPN to connect to the private VPC endpoint. Solution does not require cognito for authentication"},
+    {"id":"AwsSolutions-IAM4", "reason":"the manifest refresher, presigned delivery and viewer authorizer functions, and the API Gateway CloudWatch role, use the AWS managed policies for logging and VPC access"},
+    {"id":"AwsSolutions-IAM5", "reason":"the presigned delivery function reads any object of the media bucket, it only signs keys under the channel prefixes"},
+    {"id":"AwsSolutions-SMG4", "reason":"rotating the viewer token signing key invalidates every token handed out, it is rotated on purpose with viewer_token.py rotate"}
     ])
 NagSuppressions.add_stack_suppressions(storage_stack,[
     {"id":"AwsSolutions-S1", "reason":"customer can choose to enable server access logging as part of their logging strategy as they deploy this solution"}
@@ -1,14 +1,50 @@
+import json
+import os
 from aws_cdk import (
+    Annotations,
+    Duration,
+    Fn,
     NestedStack,
+    Size,
     CfnOutput,
     aws_apigateway as apigateway,
     aws_ec2 as ec2,
-    aws_iam as iam
+    aws_events as events,
+    aws_events_targets as targets,
+    aws_iam as iam,
+    aws_lambda as lambda_,
+    aws_logs as logs,
+    aws_secretsmanager as secretsmanager
 )
 from constructs import Construct
 from app.network_nested_stack import NetworkNestedStack
 from app.storage_nested_stack import StorageNestedStack
 from app.iam_nested_stack import IamNestedStack
+from app.medialive_nested_stack import MediaLiveNestedStack
+
+# Request headers forwarded to S3: validators used by browsers to revalidate manifests and segments, and byte ranges
+FORWARDED_REQUEST_HEADERS = ["If-None-Match", "If-Modified-Since", "Range"]
+# Response headers returned from S3 as they are
+PASSTHROUGH_RESPONSE_HEADERS = ["ETag", "Last-Modified", "Accept-Ranges", "Content-Range"]
+# How segment bodies reach the player, see delivery_mode
+DELIVERY_MODES = ["proxy", "redirect"]
+STAGE_NAME = "prod"
+# Channels with segments this short or shorter get the low latency player preset
+LOW_LATENCY_SEGMENT_LENGTH = 2
+# API Gateway does not cache responses larger than 1 MB, and encrypting the cached data makes them larger still.
+# Segments are only cached in the stage when the segments of every rendition of the channel stay below this size.
+STAGE_CACHE_MAX_SEGMENT_BYTES = 900 * 1024
+# MediaLive numbers segments from the start again when a channel restarts, so the same segment names come back with
+# other content. Browsers and the stage cache keep a segment for at most this long, less than a channel takes to stop and start.
+MAX_SEGMENT_CACHE_TTL = 60
+# Seconds a throttled client is asked to wait before retrying (Retry-After of 429 responses)
+THROTTLE_RETRY_AFTER = 1
+# Header carrying the API key of a viewer when usage plans are enabled
+API_KEY_HEADER = "x-api-key"
+# Header carrying the signed token of a viewer when viewer_auth is enabled, see lambda/viewer_authorizer
+AUTH_HEADER = "Authorization"
+# API Gateway keeps authorizer results for at most an hour
+MAX_AUTH_CACHE_TTL = 3600
 
 class ApiNestedStack(NestedStack):
 
@@ -18,8 +54,23 @@ class ApiNestedStack(NestedStack):
             security: IamNestedStack,
             network: NetworkNestedStack, 
             storage: StorageNestedStack, 
-            media_destinations: dict,
+            channels: list,
             stack_name = str,
+            cache_cluster_size: str = None,
+            segment_cache_ttl: int = MAX_SEGMENT_CACHE_TTL,
+            manifest_origin: bool = False,
+            minimum_compression_size: int = 1024,
+            delivery_mode: str = "proxy",
+            presign_expiry: int = 300,
+            access_log_retention: logs.RetentionDays = logs.RetentionDays.ONE_MONTH,
+            qoe_endpoint: bool = True,
+            stage_throttle: dict = None,
+            manifest_throttle: dict = None,
+            segment_throttle: dict = None,
+            usage_plan_clients: list = None,
+            client_throttle: dict = None,
+            viewer_auth: bool = False,
+            auth_cache_ttl: int = 300,
             **kwargs) -> None:
 
         super().__init__(scope, construct_id, **kwargs)
@@ -27,27 +78,98 @@ class ApiNestedStack(NestedStack):
 
         vpc = network.vpc
         bucket = storage.media_bucket
+        self._security = security
+        self._network = network
+        self._bucket = bucket
+
+        caching_enabled = cache_cluster_size is not None
+        self.caching_enabled = caching_enabled
+        # The manifest origin serves playlists from the stage cache and refreshes them when MediaLive writes them,
+        # so it needs the cache and the object created events of the media bucket (event_bridge_enabled on the storage stack)
+        if manifest_origin and not caching_enabled:
+            raise ValueError("manifest_origin needs the API stage cache, set cache_cluster_size")
+        self._manifest_origin = manifest_origin
+        # Responses of at least minimum_compression_size bytes are gzipped for clients that send Accept-Encoding: gzip, None turns it off
+        self._compression_enabled = minimum_compression_size is not None
+
+        # "proxy": segment bodies stream through API Gateway from S3 (up to 10 MB per response).
+        # "redirect": the API rewrites playlists so segments point at short lived presigned URLs on the S3 interface endpoint,
+        # and segments go from S3 to the player over the private network. Needs s3_interface_endpoint on the network stack.
+        if delivery_mode not in DELIVERY_MODES:
+            raise ValueError(f"delivery_mode must be one of {DELIVERY_MODES}, got {delivery_mode!r}")
+        redirect = delivery_mode == "redirect"
+        if redirect and network.s3_vpc_interface_endpoint is None:
+            raise ValueError("delivery_mode 'redirect' needs the S3 interface endpoint, set s3_interface_endpoint on the network stack")
+
+        # Manifest and segment routes of every channel (MediaLiveNestedStack) served by this API
+        routes = [self._media_routes(channel) for channel in channels]
+
+        if not isinstance(segment_cache_ttl, int) or not 1 <= segment_cache_ttl <= MAX_SEGMENT_CACHE_TTL:
+            raise ValueError(f"segment_cache_ttl must be from 1 to {MAX_SEGMENT_CACHE_TTL} seconds, a restarted channel writes "
+                f"segments with the same names again, got {segment_cache_ttl!r}")
+        # Segments over the stage cache size limit are never stored, every request for them would be a cache miss.
+        # The segment methods of such channels are not cached at all, only their playlists are.
+        if caching_enabled:
+            for channel, route in zip(channels, routes):
+                if not route["segments_cacheable"]:
+                    oversized = [name for name, size in channel.segment_bytes.items() if size > STAGE_CACHE_MAX_SEGMENT_BYTES]
+                    Annotations.of(self).add_warning(
+                        f"Channel {channel.channel_name}: segments of the {oversized} renditions are larger than the "
+                        f"{STAGE_CACHE_MAX_SEGMENT_BYTES // 1024} KB the API stage cache stores, only the playlists of this channel "
+                        f"are cached. Shorter segments or lower bitrates let the stage cache its segments as well.")
+        segment_cacheable = {folder: route["segments_cacheable"] for route in routes for folder in route["folders"]}
+        # Folders that also hold I-frame only playlists keep what they serve for a playlist TTL only, see _media_routes
+        folder_cache_ttl = {folder: route["manifest_cache_ttl"] if route["iframe_playlists"] else segment_cache_ttl
+                            for route in routes for folder in route["folders"]}
+
+        # Throttles are {"rate_limit": requests per second, "burst_limit": requests}. The stage throttle applies to every method,
+        # the manifest and segment throttles to each playlist and segment folder method, so a flood of playlist polls is
+        # rejected before it uses up the stage budget segments need.
+        stage_throttle = self._throttle("stage_throttle", stage_throttle)
+        manifest_throttle = self._throttle("manifest_throttle", manifest_throttle)
+        segment_throttle = self._throttle("segment_throttle", segment_throttle)
+        for name, method_throttle in [("manifest_throttle", manifest_throttle), ("segment_throttle", segment_throttle)]:
+            if stage_throttle and method_throttle and method_throttle["throttling_rate_limit"] > stage_throttle["throttling_rate_limit"]:
+                raise ValueError(f"{name} rate_limit must not be above the stage_throttle rate_limit")
+
+        # With usage plan clients every media request needs the API key of one client, and each key gets client_throttle
+        # on its own, so one misbehaving player can not use up the budget of the others. The player bundle stays open.
+        if usage_plan_clients is not None and not (isinstance(usage_plan_clients, list) and
+                all(isinstance(client, str) and client for client in usage_plan_clients)):
+            raise ValueError(f"usage_plan_clients must be a list of client names, got {usage_plan_clients!r}")
+        if usage_plan_clients and not client_throttle:
+            raise ValueError("usage_plan_clients needs client_throttle, the limits each client gets")
+        # Presigned segment requests go straight to S3, past the usage plan, so a key would only limit the playlists
+        if usage_plan_clients and redirect:
+            raise ValueError("usage_plan_clients needs the proxy delivery mode, segments fetched from S3 with presigned URLs bypass the usage plan")
+        self._api_key_required = bool(usage_plan_clients)
+
+        # With viewer_auth every media request needs a signed viewer token for its channel. The authorizer result is cached
+        # per token for auth_cache_ttl seconds, so a viewer's playlist and segment requests only invoke it once per TTL.
+        # A revoked viewer keeps access until the cached result expires.
+        # The manifest refresher signs its requests with its role, it has no API key and no viewer token,
+        # so every refresh would be rejected and the stage would keep serving playlists until their TTL runs out
+        if manifest_origin and (usage_plan_clients or viewer_auth):
+            raise ValueError("manifest_origin can not be combined with usage_plan_clients or viewer_auth, the refresher can not send an API key or viewer token")
+        if viewer_auth and not (isinstance(auth_cache_ttl, int) and 0 <= auth_cache_ttl <= MAX_AUTH_CACHE_TTL):
+            raise ValueError(f"auth_cache_ttl must be a whole number of seconds from 0 to {MAX_AUTH_CACHE_TTL}, got {auth_cache_ttl!r}")
+
+        if redirect:
+            # A replay plays the whole archive from one playlist fetch, longer than any presigned URL should live
+            if any(channel.archive for channel in channels):
+                raise ValueError("archive outputs need the proxy delivery mode, presigned segment URLs expire during a replay")
+            for route in routes:
+                # A presigned URL must still be valid when a player gets to the oldest segment of a cached playlist
+                playlist_lifetime = (route["manifest_origin_ttl"] if manifest_origin else route["manifest_cache_ttl"]) + route["playlist_seconds"]
+                if presign_expiry < playlist_lifetime:
+                    raise ValueError(f"presign_expiry must be at least {playlist_lifetime} seconds for the channel writing to {route['folders']}")
 
         ### S3 AWS service integration ###
-        
-        apigw_s3_integration_options = apigateway.IntegrationOptions(
-            credentials_role=security.apigw_svc_role,
-            integration_responses=[
-                apigateway.IntegrationResponse(
-                    status_code="200",
-                    response_parameters={"method.response.header.Content-Type": "integration.response.header.Content-Type"}
-                )
-            ],
-            request_parameters={        # Map {proxy} from the method request path to the integration request path
-                "integration.request.path.proxy": "method.request.path.proxy"
-            }
-        )
 
-        apigw_s3_integration = apigateway.AwsIntegration(
-            service="s3",
-            integration_http_method="GET",
-            path=bucket.bucket_name+"/{proxy}",  # The path needs to contain the bucket name and then the [proxy] path
-            options=apigw_s3_integration_options
+        apigw_s3_integration = self._s3_integration(
+            path="{proxy}",
+            cache_control="integration.response.header.Cache-Control",     # Files from the player bundle keep their own Cache-Control
+            proxy=True
         )
 
         ### VPC Endpoint for API Gateway ###
@@ -70,6 +192,15 @@ class ApiNestedStack(NestedStack):
 
         ### API Gateway REST API ###
 
+        # A GET with Cache-Control: max-age=0 only replaces the cache entry when the resource policy allows the caller
+        # execute-api:InvalidateCache, otherwise API Gateway answers from the cache and ignores the header.
+        # The role of the manifest refresher is created before the API so the policy can name it.
+        self.manifest_refresher = None
+        refresher_role = iam.Role(self, "ManifestRefresherRole",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            managed_policies=[iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaVPCAccessExecutionRole")]
+        ) if manifest_origin else None
+
         # API resource policy
         apigw_api_resource_policy = iam.PolicyDocument(
             statements=[
@@ -88,40 +219,433 @@ class ApiNestedStack(NestedStack):
                     principals=[iam.AnyPrincipal()],
                     actions=["execute-api:Invoke"],
                     resources=["*"]
-                )
+                ),
+                *([iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    principals=[iam.ArnPrincipal(refresher_role.role_arn)],
+                    actions=["execute-api:InvalidateCache"],
+                    resources=["*"]
+                )] if manifest_origin else [])
             ]
         )
 
+        # One JSON line per request, with the latency split between API Gateway and S3 and whether the stage cache answered
+        access_log_group = logs.LogGroup(self, "ApiAccessLogs", retention=access_log_retention)
+        access_log_format = apigateway.AccessLogFormat.custom(json.dumps({
+            "requestId": apigateway.AccessLogField.context_request_id(),
+            "sourceIp": apigateway.AccessLogField.context_identity_source_ip(),
+            "requestTime": apigateway.AccessLogField.context_request_time_epoch(),
+            "httpMethod": apigateway.AccessLogField.context_http_method(),
+            "path": apigateway.AccessLogField.context_path(),
+            "resourcePath": apigateway.AccessLogField.context_resource_path(),
+            "status": apigateway.AccessLogField.context_status(),
+            "responseLength": apigateway.AccessLogField.context_response_length(),
+            "responseLatency": apigateway.AccessLogField.context_response_latency(),
+            "integrationLatency": apigateway.AccessLogField.context_integration_latency(),
+            "integrationStatus": apigateway.AccessLogField.context_integration_status(),
+            "errorMessage": apigateway.AccessLogField.context_error_message(),
+            "userAgent": apigateway.AccessLogField.context_identity_user_agent(),
+            **({"viewer": apigateway.AccessLogField.context_authorizer("viewer")} if viewer_auth else {})     # Viewer of the token
+        }))
+
         # Create REST API
         api = apigateway.RestApi(self, "private-stream-api",
             rest_api_name="Protected Media Streaming",
             description="This API streams video from an S3 bucket.",
             binary_media_types=["*/*"],                     # Configure for binary media types to allow video to be served
+            min_compression_size=Size.bytes(minimum_compression_size) if self._compression_enabled else None,
             endpoint_configuration=apigateway.EndpointConfiguration(
                 types=[apigateway.EndpointType.PRIVATE],    # Private endpoint in the VPC
                 vpc_endpoints=[apigw_vpc_endpoint]          # Use the VPC interface endpoint set up above
             ),
-            policy=apigw_api_resource_policy
+            policy=apigw_api_resource_policy,
+            cloud_watch_role=True,                          # Lets API Gateway write the access logs
+            deploy_options=apigateway.StageOptions(
+                stage_name=STAGE_NAME,
+                access_log_destination=apigateway.LogGroupLogDestination(access_log_group),
+                access_log_format=access_log_format,
+                cache_cluster_enabled=caching_enabled,
+                cache_cluster_size=cache_cluster_size,
+                metrics_enabled=True,                       # Per method metrics, including CacheHitCount and CacheMissCount
+                **(stage_throttle or {}),
+                method_options={
+                    # Segments and files from the player bundle. Segment redirects are never cached, they carry a presigned URL
+                    **{f"{folder}/{{proxy+}}/GET": apigateway.MethodDeploymentOptions(
+                        caching_enabled=caching_enabled and (not folder or (segment_cacheable[folder] and not redirect)),
+                        cache_ttl=Duration.seconds(folder_cache_ttl.get(folder, segment_cache_ttl)) if caching_enabled else None,
+                        cache_data_encrypted=caching_enabled,
+                        **((segment_throttle or {}) if folder else {})
+                    ) for folder in [""] + [folder for route in routes for folder in route["folders"]]},
+                    # Live manifests, kept until the manifest origin replaces them when it is enabled
+                    **{f"{key}/GET": apigateway.MethodDeploymentOptions(
+                        caching_enabled=caching_enabled,
+                        cache_ttl=Duration.seconds(route["manifest_origin_ttl"] if manifest_origin else route["manifest_cache_ttl"]) if caching_enabled else None,
+                        cache_data_encrypted=caching_enabled,
+                        **(manifest_throttle or {})
+                    ) for route in routes for key in route["manifests"]}
+                } if caching_enabled or manifest_throttle or segment_throttle else None
+            )
+        )
+
+        self.api = api
+        self._authorizer = self._add_viewer_authorizer(channels, routes, auth_cache_ttl, stack_name) if viewer_auth else None
+
+        # Throttled requests get 429 with Retry-After instead of the default body only response, the player waits and retries
+        api.add_gateway_response("ThrottledResponse",
+            type=apigateway.ResponseType.THROTTLED,
+            status_code="429",
+            response_headers={"Retry-After": f"'{THROTTLE_RETRY_AFTER}'"}
         )
+        if usage_plan_clients:
+            self._add_usage_plan(api, usage_plan_clients, self._throttle("client_throttle", client_throttle), stack_name)
 
         # Add resources to the API 
         # The path for the API will be /{stage}/{resource}, for example /prod/index.html
-        api.root.add_resource("{proxy+}").add_method(
-            "GET",
+        self._add_s3_get_method(
+            api.root.add_resource("{proxy+}"),
             apigw_s3_integration,
+            proxy=True,
+            request_parameters={
+                "method.request.header.Content-Type": True
+            }
+        )
+
+        # A segment does not change while the channel runs, but a restarted channel writes the same names again,
+        # so browsers keep segments for the segment cache TTL only, not as immutable.
+        # In single file mode the .ts file keeps growing, only the byte ranges already listed in the playlist are final.
+        segment_cache_control = f"'private, max-age={segment_cache_ttl}'"
+        if qoe_endpoint:
+            self._add_qoe_endpoint(api, channels, access_log_retention)
+        else:
+            self.qoe_beacons = None
+
+        if redirect:            # Manifest and segment routes are served by the presigned delivery function instead of S3
+            self._add_presigned_delivery(api, routes, presign_expiry)
+        for route in ([] if redirect else routes):
+            for folder in route["folders"]:
+                self._add_s3_get_method(
+                    api.root.resource_for_path(folder).add_resource("{proxy+}"),
+                    self._s3_integration(
+                        path=f"{folder.lstrip('/')}/{{proxy}}",
+                        cache_control=f"'private, max-age={route['manifest_cache_ttl']}'" if route["single_file"] or route["iframe_playlists"] else segment_cache_control,
+                        partial_cache_control=segment_cache_control,
+                        proxy=True,
+                        compress=False
+                    ),
+                    proxy=True
+                )
+
+            # Manifests get their own resources so the stage can cache them with a shorter TTL than segments.
+            # API Gateway matches these before the {proxy+} resources. Browsers must revalidate them with If-None-Match.
+            for key in route["manifests"]:
+                self._add_s3_get_method(
+                    api.root.resource_for_path(key),
+                    self._s3_integration(
+                        path=key.lstrip("/"),
+                        cache_control=f"'private, max-age={route['manifest_cache_ttl']}, must-revalidate'",
+                        # With the manifest origin every viewer shares one cache entry per playlist, the one it refreshes
+                        conditional=not manifest_origin
+                    )
+                )
+
+        if manifest_origin:
+            self._add_manifest_origin(api, vpc, refresher_role)
+
+        # Outputs
+        # MediaLive writes the master playlist listing every rendition next to the destination, e.g. /pipe-1/media.m3u8
+        for channel in channels:
+            CfnOutput(self, f"VideoManifestPrimaryURL-{channel.channel_name}",
+                value=f"{api.url.strip('/')}{channel.media_destinations['primary']}{'.m3u8'}",
+                description=f"Master playlist of the {channel.channel_name} channel")
+            if channel.redundant:
+                CfnOutput(self, f"VideoManifestSecondaryURL-{channel.channel_name}",
+                    value=f"{api.url.strip('/')}{channel.media_destinations['secondary']}{'.m3u8'}",
+                    description=f"Master playlist of the second pipeline of the {channel.channel_name} channel")
+            if channel.archive:
+                CfnOutput(self, f"VideoArchiveURL-{channel.channel_name}",
+                    value=f"{api.url.strip('/')}{channel.media_destinations['archive_primary']}{'.m3u8'}",
+                    description=f"Replay playlist of the {channel.channel_name} channel, complete once the channel stops")
+
+        # Everything the video player needs to know about the channels, written to player-config.json by player_config.py
+        self.player_config = {
+            "channels": [{
+                "name": channel.channel_name,
+                "manifest": f"/{STAGE_NAME}{channel.media_destinations['primary']}.m3u8",
+                "segment_length": channel.latency["segment_length"],
+                "preset": "low-latency" if channel.latency["segment_length"] <= LOW_LATENCY_SEGMENT_LENGTH else "standard"
+            } for channel in channels] + [{
+                # Replays are not live, so they never need the low latency tuning
+                "name": f"{channel.channel_name}-archive",
+                "manifest": f"/{STAGE_NAME}{channel.media_destinations['archive_primary']}.m3u8",
+                "segment_length": channel.latency["segment_length"],
+                "preset": "standard"
+            } for channel in channels if channel.archive],
+            "qoe_endpoint": f"/{STAGE_NAME}/qoe" if qoe_endpoint else None,
+            # The player retries throttled requests after Retry-After, and sends an API key when the media methods need one
+            "retry_throttled": bool(stage_throttle or manifest_throttle or segment_throttle or usage_plan_clients),
+            "api_key_header": API_KEY_HEADER if usage_plan_clients else None,
+            "auth_header": AUTH_HEADER if viewer_auth else None
+        }
+        CfnOutput(self, "PlayerConfig", value=json.dumps(self.player_config), description="Configuration of the video player")
+
+    def _media_routes(self, channel: MediaLiveNestedStack) -> dict:
+        # Redundant channels write the same playlists to the secondary destination as well
+        pipelines = ["primary", "secondary"] if channel.redundant else ["primary"]
+        destinations = [channel.media_destinations[destination] for destination in pipelines]
+        # The archive output group writes the same playlists again under its own destinations
+        if channel.archive:
+            destinations += [channel.media_destinations[f"archive_{destination}"] for destination in pipelines]
+        # Object keys of the master playlist and of one playlist per rendition.
+        # MediaLive does not document the names of I-frame only playlists, players find them through the
+        # EXT-X-I-FRAME-STREAM-INF tags of the master playlist. They are served by the folder {proxy+} resource.
+        manifests = [
+            key for destination in destinations
+            for key in [f"{destination}.m3u8"] + [f"{destination}{modifier}.m3u8" for modifier in channel.hls_name_modifiers]
+        ]
+        return {
+            "manifests": manifests,
+            # Folders holding the manifests, e.g. /pipe-1. Segments in them need their own {proxy+} resource
+            # because API Gateway does not fall back to the root {proxy+} once /pipe-1 exists.
+            "folders": sorted({key.rsplit("/", 1)[0] for key in manifests}),
+            # Live manifests are rewritten once per segment, so they are cached for half a segment at most.
+            # Segments are cached for segment_cache_ttl, see MAX_SEGMENT_CACHE_TTL, when they fit in the stage cache.
+            "manifest_cache_ttl": max(1, channel.latency["segment_length"] // 2),
+            # The manifest origin replaces the cached playlist on every write, the TTL only bounds staleness if a refresh is lost
+            "manifest_origin_ttl": 3 * channel.latency["segment_length"],
+            # Seconds of media listed in a live playlist
+            "playlist_seconds": channel.latency["index_n_segments"] * channel.latency["segment_length"],
+            "single_file": channel.ts_file_mode == "SINGLE_FILE",
+            # I-frame only playlists are rewritten every segment like the others, but share the folder resource with the
+            # segments. So the folder is cached for the manifest TTL, not the segment TTL, in the stage and in browsers.
+            "iframe_playlists": channel.i_frame_only_playlists,
+            "segments_cacheable": max(channel.segment_bytes.values()) <= STAGE_CACHE_MAX_SEGMENT_BYTES
+        }
+
+    def _add_manifest_origin(self, api: apigateway.RestApi, vpc: ec2.Vpc, role: iam.Role) -> None:
+        # Refreshes the cached playlist through the API VPC endpoint each time MediaLive writes it, see lambda/manifest_refresher
+        self.manifest_refresher = lambda_.Function(self, "ManifestRefresher",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            handler="index.handler",
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "..", "lambda", "manifest_refresher")),
+            timeout=Duration.seconds(10),
+            retry_attempts=0,           # The next segment rewrites the playlist anyway
+            role=role,
+            vpc=vpc,
+            vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_ISOLATED),
+            environment={"API_URL": api.url}
+        )
+        # Signed requests with Cache-Control: max-age=0 replace the cache entry, unsigned ones are served from the cache
+        self.manifest_refresher.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["execute-api:Invoke", "execute-api:InvalidateCache"],
+            resources=[api.arn_for_execute_api("GET", "/*", api.deployment_stage.stage_name)]
+        ))
+
+        events.Rule(self, "ManifestWrittenRule",
+            description="Playlists written by MediaLive to the media bucket",
+            event_pattern=events.EventPattern(
+                source=["aws.s3"],
+                detail_type=["Object Created"],
+                detail={
+                    "bucket": {"name": [self._bucket.bucket_name]},
+                    "object": {"key": [{"suffix": ".m3u8"}]}
+                }
+            ),
+            targets=[targets.LambdaFunction(self.manifest_refresher, retry_attempts=0)]
+        )
+
+    def _throttle(self, name: str, throttle: dict) -> dict:
+        # Stage and method throttling settings from {"rate_limit": ..., "burst_limit": ...}, None when not throttled
+        if throttle is None:
+            return None
+        if set(throttle) != {"rate_limit", "burst_limit"}:
+            raise ValueError(f"{name} needs rate_limit and burst_limit, got {sorted(throttle)}")
+        if not isinstance(throttle["rate_limit"], (int, float)) or throttle["rate_limit"] <= 0:
+            raise ValueError(f"{name} rate_limit must be a positive number of requests per second, got {throttle['rate_limit']!r}")
+        if not isinstance(throttle["burst_limit"], int) or throttle["burst_limit"] < 1:
+            raise ValueError(f"{name} burst_limit must be a positive whole number of requests, got {throttle['burst_limit']!r}")
+        return {"throttling_rate_limit": throttle["rate_limit"], "throttling_burst_limit": throttle["burst_limit"]}
+
+    def _add_usage_plan(self, api: apigateway.RestApi, clients: list, client_throttle: dict, stack_name: str) -> None:
+        # One API key per client. Get a key value with: aws apigateway get-api-key --api-key <ViewerApiKey output> --include-value
+        plan = api.add_usage_plan("ViewerUsagePlan",
+            name=f"{stack_name}_viewers",
+            description="Per viewer client limits for the media methods",
+            throttle=apigateway.ThrottleSettings(
+                rate_limit=client_throttle["throttling_rate_limit"],
+                burst_limit=client_throttle["throttling_burst_limit"]
+            ),
+            api_stages=[apigateway.UsagePlanPerApiStage(api=api, stage=api.deployment_stage)]
+        )
+        for client in clients:
+            key = api.add_api_key(f"ViewerApiKey-{client}", api_key_name=f"{stack_name}_{client}")
+            plan.add_api_key(key)
+            CfnOutput(self, f"ViewerApiKey-{client}", value=key.key_id, description=f"API key ID of the {client} viewer client")
+
+    def _add_viewer_authorizer(self, channels: list, routes: list, cache_ttl: int, stack_name: str) -> apigateway.TokenAuthorizer:
+        # Signing key and revoked viewers of the viewer tokens: {"signing_key": ..., "revoked": [viewer, ...]}.
+        # Mint and revoke tokens with viewer_token.py. The function only reads the secret, so it needs no VPC access.
+        self.viewer_tokens = secretsmanager.Secret(self, "ViewerTokens",
+            secret_name=f"{stack_name}_viewer_tokens",
+            description="Signing key and revoked viewers of the viewer tokens",
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                secret_string_template=json.dumps({"revoked": []}),
+                generate_string_key="signing_key",
+                exclude_punctuation=True,
+                password_length=64
+            )
+        )
+        self.viewer_authorizer = lambda_.Function(self, "ViewerAuthorizer",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            handler="index.handler",
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "..", "lambda", "viewer_authorizer")),
+            timeout=Duration.seconds(5),
+            memory_size=256,            # Authorizer latency adds to every uncached request, more memory means more CPU
+            environment={
+                "SECRET_ARN": self.viewer_tokens.secret_arn,
+                # Folders each channel serves its playlists and segments from, a token allows the folders of its channels
+                "CHANNEL_FOLDERS": json.dumps({channel.channel_name: route["folders"] for channel, route in zip(channels, routes)})
+            }
+        )
+        self.viewer_tokens.grant_read(self.viewer_authorizer)
+        CfnOutput(self, "ViewerTokensSecretArn", value=self.viewer_tokens.secret_arn, description="Secret holding the viewer token signing key")
+
+        return apigateway.TokenAuthorizer(self, "ViewerTokenAuthorizer",
+            handler=self.viewer_authorizer,
+            identity_source=apigateway.IdentitySource.header(AUTH_HEADER),
+            validation_regex="^Bearer [-_A-Za-z0-9]+\\.[-_A-Za-z0-9]+$",     # Malformed headers get 401 without invoking the function
+            results_cache_ttl=Duration.seconds(cache_ttl)
+        )
+
+    def _add_qoe_endpoint(self, api: apigateway.RestApi, channels: list, log_retention: logs.RetentionDays) -> None:
+        # POST /qoe receives the beacons of the video player, see lambda/qoe_beacons. The function only writes
+        # embedded metric format logs, CloudWatch turns them into metrics, so it needs no VPC access.
+        # Each stream is a custom metric dimension, billed per metric, so only the master playlists players
+        # are configured with are accepted, anything else a client sends is counted as "unknown".
+        streams = []
+        for channel in channels:
+            pipelines = ["primary", "secondary"] if channel.redundant else ["primary"]
+            destinations = pipelines + ([f"archive_{pipeline}" for pipeline in pipelines] if channel.archive else [])
+            streams += [f"/{STAGE_NAME}{channel.media_destinations[destination]}.m3u8" for destination in destinations]
+        self.qoe_beacons = lambda_.Function(self, "QoeBeacons",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            handler="index.handler",
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "..", "lambda", "qoe_beacons")),
+            timeout=Duration.seconds(5),
+            log_group=logs.LogGroup(self, "QoeBeaconLogs", retention=log_retention),    # Raw events per viewer session
+            environment={"STREAMS": json.dumps(streams)}
+        )
+        api.root.add_resource("qoe").add_method("POST", apigateway.LambdaIntegration(self.qoe_beacons))
+
+    def _add_presigned_delivery(self, api: apigateway.RestApi, routes: list, presign_expiry: int) -> None:
+        # Rewrites playlists to presigned segment URLs and redirects segment requests, see lambda/presigned_delivery
+        network = self._network
+        self.presigned_delivery = lambda_.Function(self, "PresignedDelivery",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            handler="index.handler",
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "..", "lambda", "presigned_delivery")),
+            timeout=Duration.seconds(10),
+            vpc=network.vpc,
+            vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_ISOLATED),
+            environment={
+                "BUCKET": self._bucket.bucket_name,
+                "S3_ENDPOINT_DNS": Fn.select(0, network.s3_vpc_interface_endpoint.vpc_endpoint_dns_entries),
+                "PRESIGN_EXPIRY": str(presign_expiry),
+                "ALLOWED_PREFIXES": ",".join(folder.lstrip("/") for route in routes for folder in route["folders"]),
+                # The shortest manifest TTL of all channels, so no browser keeps a playlist longer than its channel allows
+                "MANIFEST_CACHE_CONTROL": f"private, max-age={min(route['manifest_cache_ttl'] for route in routes)}, must-revalidate"
+            }
+        )
+        # Presigned URLs carry the permissions of the function role: read only, media bucket only
+        self._bucket.grant_read(self.presigned_delivery)
+
+        delivery_integration = apigateway.LambdaIntegration(self.presigned_delivery)
+        for route in routes:
+            for folder in route["folders"]:
+                api.root.resource_for_path(folder).add_resource("{proxy+}").add_method("GET", delivery_integration,
+                    api_key_required=self._api_key_required, authorizer=self._authorizer)
+            for key in route["manifests"]:
+                api.root.resource_for_path(key).add_method("GET", delivery_integration,
+                    api_key_required=self._api_key_required, authorizer=self._authorizer)
+
+    def _s3_integration(self, path: str, cache_control: str, partial_cache_control: str = None, proxy: bool = False, conditional: bool = True, compress: bool = True) -> apigateway.AwsIntegration:
+        # Conditional and Range request headers are forwarded so S3 can answer 304 Not Modified and 206 Partial Content
+        forwarded_headers = FORWARDED_REQUEST_HEADERS if conditional else []
+        request_parameters = {f"integration.request.header.{header}": f"method.request.header.{header}" for header in forwarded_headers}
+        if proxy:               # Map {proxy} from the method request path to the integration request path
+            request_parameters["integration.request.path.proxy"] = "method.request.path.proxy"
+        # A cached 304 or 206 must never be returned to a client that asked for something else, so these headers are part of the cache key
+        cache_key_parameters = [f"method.request.header.{header}" for header in forwarded_headers]
+        if proxy:
+            cache_key_parameters.append("method.request.path.proxy")
+
+        response_parameters = {f"method.response.header.{header}": f"integration.response.header.{header}" for header in PASSTHROUGH_RESPONSE_HEADERS}
+        response_parameters["method.response.header.Cache-Control"] = cache_control
+        if self._compression_enabled:
+            if compress:        # Playlists and the player bundle: browser caches must keep gzip and plain copies apart
+                response_parameters["method.response.header.Vary"] = "'Accept-Encoding'"
+            else:               # Segments are already compressed video, and gzip would break the byte ranges of 206 responses.
+                                # A Content-Encoding from the integration tells API Gateway to send the body as it is.
+                response_parameters["method.response.header.Content-Encoding"] = "'identity'"
+        return apigateway.AwsIntegration(
+            service="s3",
+            integration_http_method="GET",
+            path=f"{self._bucket.bucket_name}/{path}",  # The path needs to contain the bucket name and then the object key
+            options=apigateway.IntegrationOptions(
+                credentials_role=self._security.apigw_svc_role,
+                integration_responses=[
+                    apigateway.IntegrationResponse(
+                        status_code="200",
+                        response_parameters={
+                            "method.response.header.Content-Type": "integration.response.header.Content-Type",
+                            **response_parameters
+                        }
+                    ),
+                    apigateway.IntegrationResponse(
+                        status_code="206",
+                        selection_pattern="206",
+                        response_parameters={
+                            "method.response.header.Content-Type": "integration.response.header.Content-Type",
+                            **response_parameters,
+                            "method.response.header.Cache-Control": partial_cache_control or cache_control
+                        }
+                    ),
+                    apigateway.IntegrationResponse(
+                        status_code="304",
+                        selection_pattern="304",
+                        response_parameters=response_parameters
+                    )
+                ],
+                request_parameters=request_parameters,
+                cache_key_parameters=cache_key_parameters if self.caching_enabled else None
+            )
+        )
+
+    def _add_s3_get_method(self, resource: apigateway.Resource, integration: apigateway.AwsIntegration, proxy: bool = False, request_parameters: dict = None) -> apigateway.Method:
+        proxy_root = resource.path == "/{proxy+}"       # The player bundle, loaded by the browser without an API key
+        response_headers = {f"method.response.header.{header}": True for header in PASSTHROUGH_RESPONSE_HEADERS + ["Cache-Control", "Vary", "Content-Encoding"]}
+        return resource.add_method(
+            "GET",
+            integration,
             method_responses=[
                 apigateway.MethodResponse(
                     status_code="200",
-                    response_parameters={"method.response.header.Content-Type": True}
+                    response_parameters={"method.response.header.Content-Type": True, **response_headers}
+                ),
+                apigateway.MethodResponse(
+                    status_code="206",
+                    response_parameters={"method.response.header.Content-Type": True, **response_headers}
+                ),
+                apigateway.MethodResponse(
+                    status_code="304",
+                    response_parameters=response_headers
                 )
             ],
-            request_parameters={        # {prefix} and {key} are mapped from the request path
-                "method.request.path.proxy": True,
-                "method.request.header.Content-Type": True
+            api_key_required=self._api_key_required and not proxy_root,
+            authorizer=None if proxy_root else self._authorizer,
+            request_parameters={
+                **({"method.request.path.proxy": True} if proxy else {}),
+                **{f"method.request.header.{header}": False for header in FORWARDED_REQUEST_HEADERS},   # Optional headers
+                **(request_parameters or {})
             }
         )
-
-        # Outputs
-        CfnOutput(self, "VideoManifestPrimaryURL", value=f"{api.url.strip('/')}{media_destinations['primary']}{'/media_1.m3u8'}")
-        
-        
\ No newline at end of file
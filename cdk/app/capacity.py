@@ -0,0 +1,145 @@
+from app.rate_control import peak_bitrate
+from app.containers import AUDIO_BITRATE, segment_bytes as container_segment_bytes
+from app.api_nested_stack import STAGE_CACHE_MAX_SEGMENT_BYTES
+from app.medialive_nested_stack import DEFAULT_SOURCE_FRAME_RATE
+
+# Origin load estimates for a MediaLive channel served through private-stream-api, and the service limits they are checked against.
+# Limits are the defaults for a new account and region; raise them in LIMITS if your account has increases.
+LIMITS = {
+    "api_requests_per_second": 10000,           # API Gateway account level throttle
+    "api_payload_bytes": 10 * 1024 * 1024,      # API Gateway response payload
+    "s3_gets_per_second_per_prefix": 5500,
+    "s3_puts_per_second_per_prefix": 3500,
+    "vpc_endpoint_bits_per_second": 10 * 10**9, # Interface endpoint sustained bandwidth per AZ
+}
+
+MANIFEST_LINE_BYTES = 80        # Approximate bytes per segment entry in a media playlist
+
+
+def channel_profile(channel_properties: dict, source_frame_rate: float = DEFAULT_SOURCE_FRAME_RATE) -> dict:
+    """Extracts the settings that drive origin load from synthesized AWS::MediaLive::Channel properties.
+
+    The encoder takes its frame rate from the source, so it is not in the template. Pass the source_frame_rate of the channel.
+    """
+    encoder = channel_properties["EncoderSettings"]
+    # The live group comes first, an archive group writes the same renditions again in VOD mode to its own prefix
+    hls_group = encoder["OutputGroups"][0]
+    hls = hls_group["OutputGroupSettings"]["HlsGroupSettings"]
+    archive_groups = [group for group in encoder["OutputGroups"][1:] if group["OutputGroupSettings"].get("HlsGroupSettings", {}).get("Mode") == "VOD"]
+    # VBR and QVBR renditions are sized at their cap, the worst case for the origin
+    bitrates = {video["Name"]: peak_bitrate(video["CodecSettings"]["H264Settings"]) for video in encoder["VideoDescriptions"]}
+
+    renditions = []
+    audio_outputs = 0
+    container = "TS"
+    for output in hls_group["Outputs"]:
+        if "VideoDescriptionName" not in output:
+            audio_outputs += 1
+            continue
+        if "Fmp4HlsSettings" in output["OutputSettings"]["HlsOutputSettings"]["HlsSettings"]:
+            container = "FMP4"
+        renditions.append({
+            "name": output["OutputName"],
+            "video_bitrate": bitrates[output["VideoDescriptionName"]],
+            # Muxed outputs carry the audio in every rendition
+            "bitrate": bitrates[output["VideoDescriptionName"]] + (AUDIO_BITRATE if output.get("AudioDescriptionNames") else 0)
+        })
+
+    return {
+        "name": channel_properties["Name"],
+        "pipelines": 2 if channel_properties.get("ChannelClass") == "STANDARD" else 1,
+        "segment_length": hls["SegmentLength"],
+        "index_n_segments": hls["IndexNSegments"],
+        "keep_segments": hls["KeepSegments"],
+        "single_file": hls["TsFileMode"] == "SINGLE_FILE",
+        "container": container,
+        "frame_rate": source_frame_rate,
+        "renditions": renditions,
+        "audio_renditions": audio_outputs,
+        "archive": bool(archive_groups),
+    }
+
+
+def plan(profile: dict, viewers: int, api_cache: bool = False) -> dict:
+    """Estimates request rates, bandwidth and storage for a number of concurrent viewers of one channel.
+
+    Every viewer is assumed to watch the highest rendition, which is the worst case for bandwidth and payload size.
+    """
+    segment_length = profile["segment_length"]
+    top_bitrate = max(rendition["bitrate"] for rendition in profile["renditions"])
+    total_bitrate = sum(rendition["bitrate"] for rendition in profile["renditions"]) + profile["audio_renditions"] * AUDIO_BITRATE
+    playlists_per_viewer = 1 + profile["audio_renditions"]     # Players reload their media playlists once per target duration
+    playlists_per_pipeline = 1 + len(profile["renditions"]) + profile["audio_renditions"]
+
+    # Each playlist reload is followed by one new segment download
+    manifest_rps = viewers * playlists_per_viewer / segment_length
+    segment_rps = manifest_rps
+    api_rps = manifest_rps + segment_rps
+    bandwidth = viewers * (top_bitrate + (AUDIO_BITRATE if profile["audio_renditions"] else 0))
+
+    # Same estimate, container overhead included, as MediaLiveNestedStack.segment_bytes, which decides what the stage caches
+    segment_bytes = max(
+        container_segment_bytes(rendition["video_bitrate"], profile["container"], segment_length, profile["frame_rate"])
+        for rendition in profile["renditions"]
+    )
+    # With the stage cache on, S3 only sees each playlist once per manifest TTL (half a segment) instead of once per viewer.
+    # The stage only caches the segments of a channel when its largest segment fits, see STAGE_CACHE_MAX_SEGMENT_BYTES,
+    # then S3 sees each segment once. Larger segments are fetched from S3 for every viewer.
+    segments_cached = api_cache and segment_bytes <= STAGE_CACHE_MAX_SEGMENT_BYTES
+    manifest_gets = min(manifest_rps, 2 * playlists_per_pipeline / segment_length) if api_cache else manifest_rps
+    segment_gets = min(segment_rps, (playlists_per_pipeline - 1) / segment_length) if segments_cached else segment_rps
+    s3_gets = manifest_gets + segment_gets
+
+    manifest_bytes = profile["index_n_segments"] * MANIFEST_LINE_BYTES
+    # VOD mode keeps every segment, so storage grows for as long as the channel runs
+    retained_seconds = 3600 if profile["single_file"] else profile["keep_segments"] * segment_length
+    storage_bytes = profile["pipelines"] * total_bitrate / 8 * retained_seconds
+    # Each pipeline writes one segment and one playlist per output per segment, plus the master playlist, to its own prefix
+    s3_puts = (2 * (playlists_per_pipeline - 1) + 1) / segment_length
+    # The archive group writes all of that again to the archive prefix, and keeps every segment until the lifecycle rule expires it
+    archive_puts = s3_puts if profile["archive"] else 0
+    archive_bytes = profile["pipelines"] * total_bitrate / 8 * 3600 if profile["archive"] else 0
+
+    metrics = {
+        "channel": profile["name"],
+        "viewers": viewers,
+        "api_requests_per_second": round(api_rps, 1),
+        "api_manifest_requests_per_second": round(manifest_rps, 1),
+        "api_segment_requests_per_second": round(segment_rps, 1),
+        "api_bandwidth_mbps": round(bandwidth / 10**6, 1),
+        "s3_gets_per_second_per_prefix": round(s3_gets, 1),
+        "s3_puts_per_second_per_prefix": round(s3_puts, 2),
+        "s3_puts_per_second": round(profile["pipelines"] * (s3_puts + archive_puts), 2),     # All prefixes of the channel
+        "vpc_endpoint_mbps": round(bandwidth / 10**6, 1),
+        "largest_segment_mb": round(segment_bytes / 10**6, 2),
+        "api_cached_segments": segments_cached,
+        "manifest_kb": round(manifest_bytes / 1000, 1),
+        "bucket_storage_gb": round(storage_bytes / 10**9, 2),      # After one hour for single file channels
+        "archive_storage_gb_per_hour": round(archive_bytes / 10**9, 2),
+    }
+    # Checks that apply to each channel on its own, account wide limits are checked in fleet_checks
+    checks = [
+        _check(f"{profile['name']}: API Gateway segment payload", segment_bytes, LIMITS["api_payload_bytes"],
+            # A single file rendition is only safe to serve with byte range requests
+            note="single file renditions must be fetched with Range requests" if profile["single_file"] else None),
+        _check(f"{profile['name']}: S3 GETs per second per prefix", s3_gets, LIMITS["s3_gets_per_second_per_prefix"]),
+        _check(f"{profile['name']}: S3 PUTs per second per prefix", s3_puts, LIMITS["s3_puts_per_second_per_prefix"]),
+    ]
+    return {"metrics": metrics, "checks": checks}
+
+
+def fleet_checks(plans: list) -> list:
+    """Checks the limits shared by every channel behind the same API and VPC endpoint."""
+    api_rps = sum(channel_plan["metrics"]["api_requests_per_second"] for channel_plan in plans)
+    bandwidth = sum(channel_plan["metrics"]["vpc_endpoint_mbps"] for channel_plan in plans) * 10**6
+    return [
+        _check("All channels: API Gateway requests per second", api_rps, LIMITS["api_requests_per_second"]),
+        # Viewers are spread across both AZs, the check assumes they all land in one
+        _check("All channels: VPC endpoint bandwidth per AZ", bandwidth, LIMITS["vpc_endpoint_bits_per_second"]),
+    ]
+
+
+def _check(name: str, value: float, limit: float, note: str = None) -> dict:
+    usage = value / limit
+    status = "EXCEEDED" if usage > 1 else "WARNING" if usage > 0.8 else "OK"
+    return {"check": name, "usage_percent": round(usage * 100, 1), "status": status, "note": note}
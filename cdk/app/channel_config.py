@@ -0,0 +1,85 @@
+import json
+import re
+from app.lifecycle import WRITE_ONCE_MAX_BYTES, validate_lifecycle
+
+# Settings a channel entry may pass on to MediaLiveNestedStack
+CHANNEL_SETTINGS = ["renditions", "latency_profile", "source_frame_rate", "ts_file_mode", "container", "redundant",
+    "directory_structure", "segments_per_subdirectory", "rate_control", "ingest", "dvr_window_minutes", "i_frame_only_playlists",
+    "archive", "log_level"]
+
+# Channel names end up in MediaLive, IAM and security group names, so they are kept short and simple
+_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,19}$")
+_PREFIX_PATTERN = re.compile(r"^(/[A-Za-z0-9_-]+)*$")
+
+
+def load_channel_config(path: str) -> list:
+    """Reads the channel fleet config file and returns one entry per channel.
+
+    Each entry has the channel name, the media destinations under the channel S3 prefix, the settings
+    passed to MediaLiveNestedStack and the lifecycle rules for its prefixes in the media bucket.
+    Raises ValueError if names or prefixes collide.
+    """
+    with open(path) as config_file:
+        config = json.load(config_file)
+
+    channels = config.get("channels")
+    if not channels:
+        raise ValueError(f"{path} does not declare any channels")
+
+    entries = []
+    names = set()
+    prefixes = set()
+    for channel in channels:
+        name = channel.get("name", "")
+        if not _NAME_PATTERN.match(name):
+            raise ValueError(
+                f"Channel name {name!r} must be 1 to 20 lowercase letters, numbers, hyphens or underscores"
+            )
+        # CloudFormation logical IDs drop hyphens and underscores, so "town-hall" and "town_hall" would collide
+        logical_name = re.sub(r"[-_]", "", name)
+        if logical_name in names:
+            raise ValueError(f"Channel name {name!r} is declared more than once or only differs in hyphens and underscores")
+        names.add(logical_name)
+
+        # Every channel writes under its own S3 prefix, /<name> unless the config says otherwise
+        prefix = channel.get("prefix", f"/{name}")
+        if not _PREFIX_PATTERN.match(prefix):
+            raise ValueError(f"Channel {name!r} prefix {prefix!r} must be empty or look like /folder")
+        if prefix in prefixes:
+            raise ValueError(f"Channel {name!r} uses the prefix {prefix!r} of another channel")
+        prefixes.add(prefix)
+
+        unknown = [key for key in channel if key not in CHANNEL_SETTINGS + ["name", "prefix", "lifecycle", "archive_lifecycle"]]
+        if unknown:
+            raise ValueError(f"Channel {name!r} has unknown settings {unknown}")
+
+        # Expiry and tiering for the folders of both pipelines, see app/lifecycle.py.
+        # expire_days only for segments, the initialization segments and master playlist of a running channel are never
+        # rewritten. manifest_expire_days for every object, once the channel has been stopped for long enough.
+        lifecycle_rules = []
+        if "lifecycle" in channel:
+            lifecycle = validate_lifecycle(f"Channel {name!r}", channel["lifecycle"], live=True,
+                dvr_window_minutes=channel.get("dvr_window_minutes"))
+            pipes = ["pipe-1", "pipe-2"] if channel.get("redundant") else ["pipe-1"]
+            lifecycle_rules = [{"prefix": f"{prefix}/{pipe}/".lstrip("/"), "object_size_greater_than": WRITE_ONCE_MAX_BYTES, **lifecycle}
+                               for pipe in pipes]
+        # Archives usually outlive the live window, so they get their own rule covering both pipelines.
+        # It applies to every object, archive_lifecycle expire_days must be longer than the channel runs.
+        if "archive_lifecycle" in channel:
+            if not channel.get("archive"):
+                raise ValueError(f"Channel {name!r} sets archive_lifecycle without archive")
+            lifecycle = validate_lifecycle(f"Channel {name!r} archive", channel["archive_lifecycle"])
+            lifecycle_rules.append({"prefix": f"{prefix}/archive/".lstrip("/"), **lifecycle})
+
+        entries.append({
+            "name": name,
+            "media_destinations": {
+                "primary": f"{prefix}/pipe-1/media",
+                "secondary": f"{prefix}/pipe-2/media",
+                "archive_primary": f"{prefix}/archive/pipe-1/media",
+                "archive_secondary": f"{prefix}/archive/pipe-2/media"
+            },
+            "settings": {key: channel[key] for key in CHANNEL_SETTINGS if key in channel},
+            "lifecycle_rules": lifecycle_rules
+        })
+    return entries
@@ -0,0 +1,70 @@
+# Segment containers supported by the HLS output group, and a rough model of the bytes each one adds on top of the
+# encoded audio and video. The model only has to be good enough to compare containers for the same rendition.
+CONTAINERS = ["TS", "FMP4"]
+
+AUDIO_BITRATE = 192000          # MediaLive AAC default, in bits per second
+AUDIO_FRAMES_PER_SECOND = 48000 / 1024
+AUDIO_FRAMES_PER_PES = 4        # Matches audio_frames_per_pes in the M3u8 settings
+
+TS_PACKET_SIZE = 188
+TS_PACKET_PAYLOAD = 184
+PES_HEADER_SIZE = 19            # PES header with PTS and DTS
+PCR_ADAPTATION_FIELD_SIZE = 8   # Added to every video PES packet with PCR_EVERY_PES_PACKET
+PSI_PACKETS_PER_SEGMENT = 2     # PAT and PMT at the start of each segment
+
+FMP4_FRAGMENT_HEADER_SIZE = 120 # moof, mfhd, traf, tfhd, tfdt, trun headers and mdat header per track
+FMP4_VIDEO_SAMPLE_SIZE = 16     # trun entry with duration, size, flags and composition offset
+FMP4_AUDIO_SAMPLE_SIZE = 4      # trun entry with size only
+
+
+def validate_container(container: str) -> str:
+    if container == "CMAF":
+        raise ValueError(
+            "CMAF ingest output groups push to an HTTP ingest endpoint such as MediaPackage and cannot write to the "
+            "S3 media bucket. Use FMP4 for CMAF compatible fragmented MP4 segments in the HLS output group."
+        )
+    if container not in CONTAINERS:
+        raise ValueError(f"Unknown container {container!r}, choose one of {CONTAINERS}")
+    return container
+
+
+def _ts_overhead(video_bitrate: int, frame_rate: float, segment_length: int) -> float:
+    """Overhead in bytes per second for a muxed audio and video TS rendition."""
+    video_pes = frame_rate
+    audio_pes = AUDIO_FRAMES_PER_SECOND / AUDIO_FRAMES_PER_PES
+    pes_headers = (video_pes + audio_pes) * PES_HEADER_SIZE + video_pes * PCR_ADAPTATION_FIELD_SIZE
+    payload = (video_bitrate + AUDIO_BITRATE) / 8 + pes_headers
+    packet_headers = payload / TS_PACKET_PAYLOAD * (TS_PACKET_SIZE - TS_PACKET_PAYLOAD)
+    stuffing = (video_pes + audio_pes) * TS_PACKET_PAYLOAD / 2      # On average the last packet of a PES is half empty
+    psi = PSI_PACKETS_PER_SEGMENT * TS_PACKET_SIZE / segment_length
+    return pes_headers + packet_headers + stuffing + psi
+
+
+def _fmp4_overhead(frame_rate: float, segment_length: int) -> float:
+    """Overhead in bytes per second for a video rendition plus its share of the separate audio rendition."""
+    video = FMP4_FRAGMENT_HEADER_SIZE / segment_length + frame_rate * FMP4_VIDEO_SAMPLE_SIZE
+    audio = FMP4_FRAGMENT_HEADER_SIZE / segment_length + AUDIO_FRAMES_PER_SECOND * FMP4_AUDIO_SAMPLE_SIZE
+    return video + audio
+
+
+def overhead_report(renditions: list, segment_length: int, frame_rate: float) -> list:
+    """Estimated container overhead per rendition, for every supported container."""
+    report = []
+    for rung in renditions:
+        payload = (rung["bitrate"] + AUDIO_BITRATE) / 8
+        overheads = {"TS": _ts_overhead(rung["bitrate"], frame_rate, segment_length), "FMP4": _fmp4_overhead(frame_rate, segment_length)}
+        report.append({
+            "rendition": rung["name"],
+            **{f"{container.lower()}_overhead_kbps": round(overhead * 8 / 1000, 1) for container, overhead in overheads.items()},
+            **{f"{container.lower()}_overhead_percent": round(overhead / payload * 100, 2) for container, overhead in overheads.items()},
+        })
+    return report
+
+
+def segment_bytes(video_bitrate: int, container: str, segment_length: int, frame_rate: float) -> int:
+    """Estimated size of one segment of a rendition. TS segments carry the audio as well, FMP4 segments only the video."""
+    if container == "TS":
+        per_second = (video_bitrate + AUDIO_BITRATE) / 8 + _ts_overhead(video_bitrate, frame_rate, segment_length)
+    else:
+        per_second = video_bitrate / 8 + _fmp4_overhead(frame_rate, segment_length)
+    return int(per_second * segment_length)
@@ -0,0 +1,92 @@
+# Contribution inputs for the MediaLive channel: the protocol venues send the live feed with, and an optional backup
+# input MediaLive switches to automatically when the primary feed is lost.
+#
+# {"type": "SRT_CALLER", "latency_ms": 2000, "sources": [{"address": "10.20.0.15", "port": 9000, "stream_id": "main"}],
+#  "failover": {"input_loss_ms": 1000, "sources": [{"address": "10.20.0.16", "port": 9000}]}}
+import ipaddress
+
+# Protocol and VPC ports each push input listens on, the input security group only opens these.
+# RTP inputs take the FEC column and row streams on the two ports after the media port.
+INPUT_PORTS = {
+    "RTMP_PUSH": ("tcp", [1935]),
+    "RTP_PUSH": ("udp", [5000, 5002, 5004]),
+    "SRT_LISTENER": ("udp", [5000]),
+}
+# SRT_CALLER inputs connect out to a listener at the venue, so they need an egress rule instead
+INPUT_TYPES = list(INPUT_PORTS) + ["SRT_CALLER"]
+SRT_TYPES = ["SRT_LISTENER", "SRT_CALLER"]
+
+# SRT retransmits lost packets within its latency window. Links with more loss or a longer round trip need more,
+# a common starting point is four times the round trip time.
+DEFAULT_SRT_LATENCY_MS = 2000
+MAX_SRT_LATENCY_MS = 15000
+DEFAULT_INPUT_LOSS_MS = 1000
+
+INGEST_KEYS = ["type", "latency_ms", "sources", "passphrase_secret_arn", "failover"]
+FAILOVER_KEYS = ["input_loss_ms", "video_black_ms", "prefer_primary", "sources"]
+
+
+def _validate_sources(name: str, sources, pipelines: int) -> list:
+    if not isinstance(sources, list) or len(sources) != pipelines:
+        raise ValueError(f"{name} needs {pipelines} SRT listener source(s), one per pipeline")
+    checked = []
+    for source in sources:
+        try:
+            ipaddress.ip_address(source.get("address", ""))
+        except ValueError:
+            raise ValueError(f"{name} source address must be an IP address, got {source.get('address')!r}")
+        port = source.get("port")
+        if not isinstance(port, int) or isinstance(port, bool) or not 1 <= port <= 65535:
+            raise ValueError(f"{name} source port must be a number from 1 to 65535, got {port!r}")
+        checked.append({"address": source["address"], "port": port, "stream_id": source.get("stream_id", "")})
+    return checked
+
+
+def validate_ingest(ingest: dict, pipelines: int) -> dict:
+    """Checks the contribution input settings of a channel and returns them with defaults filled in.
+
+    latency_ms only applies to SRT, where it is the minimum latency of the connection. RTP inputs have no
+    receive buffer setting in MediaLive, their latency is set by the FEC matrix of the venue encoder.
+    """
+    settings = {"type": "RTMP_PUSH", **(ingest or {})}
+    unknown = [key for key in settings if key not in INGEST_KEYS]
+    if unknown:
+        raise ValueError(f"Input has unknown settings {unknown}")
+    input_type = settings["type"]
+    if input_type not in INPUT_TYPES:
+        raise ValueError(f"Input type must be one of {INPUT_TYPES}, got {input_type!r}")
+
+    if input_type in SRT_TYPES:
+        latency = settings.setdefault("latency_ms", DEFAULT_SRT_LATENCY_MS)
+        if not isinstance(latency, int) or isinstance(latency, bool) or not 0 < latency <= MAX_SRT_LATENCY_MS:
+            raise ValueError(f"Input latency_ms must be a whole number of milliseconds up to {MAX_SRT_LATENCY_MS}, got {latency!r}")
+    else:
+        for key in ("latency_ms", "passphrase_secret_arn"):
+            if key in settings:
+                raise ValueError(f"Input {key} only applies to SRT inputs, not {input_type}")
+        settings["latency_ms"] = 0
+
+    if input_type == "SRT_CALLER":
+        settings["sources"] = _validate_sources("SRT_CALLER input", settings.get("sources"), pipelines)
+    elif "sources" in settings:
+        raise ValueError(f"Input sources only apply to SRT_CALLER inputs, {input_type} inputs are pushed to")
+
+    failover = settings.setdefault("failover", None)
+    if failover is not None:
+        # The default waits at least as long as SRT keeps retransmitting, so a recoverable gap never switches inputs
+        failover = {"input_loss_ms": max(DEFAULT_INPUT_LOSS_MS, settings["latency_ms"]), "video_black_ms": None, "prefer_primary": True, **failover}
+        unknown = [key for key in failover if key not in FAILOVER_KEYS]
+        if unknown:
+            raise ValueError(f"Input failover has unknown settings {unknown}")
+        # A gap shorter than the SRT latency window is recovered by retransmission, it is not a lost feed
+        if not isinstance(failover["input_loss_ms"], int) or failover["input_loss_ms"] < max(100, settings["latency_ms"]):
+            raise ValueError(f"Input failover input_loss_ms must be at least 100 and at least the input latency_ms "
+                f"({settings['latency_ms']}), got {failover['input_loss_ms']!r}")
+        if failover["video_black_ms"] is not None and (not isinstance(failover["video_black_ms"], int) or failover["video_black_ms"] < 1000):
+            raise ValueError(f"Input failover video_black_ms must be at least 1000, got {failover['video_black_ms']!r}")
+        if input_type == "SRT_CALLER":
+            failover["sources"] = _validate_sources("SRT_CALLER backup input", failover.get("sources"), pipelines)
+        elif "sources" in failover:
+            raise ValueError("Input failover sources only apply to SRT_CALLER inputs")
+        settings["failover"] = failover
+    return settings
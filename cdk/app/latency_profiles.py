@@ -0,0 +1,101 @@
+from app.renditions import GOP_SIZE_UNITS
+
+# HLS latency profiles for the MediaLive channel.
+# GOP sizes are given in seconds so they stay aligned with segment boundaries whatever the source frame rate is.
+LATENCY_PROFILES = {
+    "standard": {
+        "segment_length": 6,
+        "gop_size": 2,
+        "gop_size_units": "SECONDS",
+        "index_n_segments": 10,
+        "keep_segments": 21,
+        "look_ahead_rate_control": "MEDIUM",
+    },
+    "low": {
+        "segment_length": 2,
+        "gop_size": 1,
+        "gop_size_units": "SECONDS",
+        "index_n_segments": 6,
+        "keep_segments": 13,
+        "look_ahead_rate_control": "LOW",
+    },
+    "ultra-low": {
+        "segment_length": 1,
+        "gop_size": 1,
+        "gop_size_units": "SECONDS",
+        "index_n_segments": 6,
+        "keep_segments": 13,
+        "look_ahead_rate_control": "LOW",
+    },
+}
+
+LOOK_AHEAD_RATE_CONTROLS = ["LOW", "MEDIUM", "HIGH"]
+
+# Approximate encoder delay added by each look ahead setting, in seconds
+LOOK_AHEAD_DELAY = {"LOW": 1, "MEDIUM": 2, "HIGH": 4}
+
+# Players start this many segments back from the live edge (HLS spec recommendation)
+PLAYER_HOLD_BACK_SEGMENTS = 3
+
+
+def resolve_latency_profile(profile) -> dict:
+    """Returns the settings for a latency profile name, or checks a custom profile dict."""
+    if isinstance(profile, str):
+        if profile not in LATENCY_PROFILES:
+            raise ValueError(f"Unknown latency profile {profile!r}, choose one of {list(LATENCY_PROFILES)}")
+        return dict(LATENCY_PROFILES[profile])
+
+    settings = dict(profile)
+    missing = [key for key in LATENCY_PROFILES["standard"] if key not in settings]
+    if missing:
+        raise ValueError(f"Custom latency profile is missing {missing}")
+    if not isinstance(settings["segment_length"], int) or settings["segment_length"] < 1:
+        raise ValueError("Latency profile segment_length must be a whole number of seconds, at least 1")
+    # Same rules as the GOP of a rendition, see app/renditions.py. Alignment with the segments is checked per rendition.
+    if settings["gop_size_units"] not in GOP_SIZE_UNITS:
+        raise ValueError(f"Latency profile gop_size_units must be one of {GOP_SIZE_UNITS}, got {settings['gop_size_units']!r}")
+    if not isinstance(settings["gop_size"], (int, float)) or isinstance(settings["gop_size"], bool) or settings["gop_size"] <= 0:
+        raise ValueError(f"Latency profile needs a positive gop_size, got {settings['gop_size']!r}")
+    if settings["keep_segments"] <= settings["index_n_segments"]:
+        raise ValueError("Latency profile keep_segments must be greater than index_n_segments")
+    if settings["look_ahead_rate_control"] not in LOOK_AHEAD_RATE_CONTROLS:
+        raise ValueError(f"Latency profile look_ahead_rate_control must be one of {LOOK_AHEAD_RATE_CONTROLS}")
+    return settings
+
+
+def apply_dvr_window(settings: dict, minutes: int) -> dict:
+    """Returns the latency settings with a playlist covering the last minutes of the stream.
+
+    index_n_segments is the DVR window viewers can seek back in. keep_segments keeps the same margin over it as the
+    profile, so segments a player still has in an older playlist stay in the bucket.
+    """
+    if not isinstance(minutes, int) or isinstance(minutes, bool) or minutes < 1:
+        raise ValueError(f"dvr_window_minutes must be a positive whole number of minutes, got {minutes!r}")
+    index_n_segments = -(-minutes * 60 // settings["segment_length"])
+    if index_n_segments < settings["index_n_segments"]:
+        raise ValueError(f"A {minutes} minute DVR window is shorter than the {settings['index_n_segments']} segment playlist of the latency profile")
+    return {
+        **settings,
+        "index_n_segments": index_n_segments,
+        "keep_segments": index_n_segments + settings["keep_segments"] - settings["index_n_segments"],
+    }
+
+
+def validate_gop_alignment(renditions: list, segment_length: int, frame_rate: float) -> None:
+    """Fails synth when a rendition's GOP does not divide the segment length.
+
+    Frame based GOPs are converted to seconds using frame_rate, the expected source frame rate.
+    """
+    for rung in renditions:
+        gop_seconds = rung["gop_size"] if rung["gop_size_units"] == "SECONDS" else rung["gop_size"] / frame_rate
+        gops_per_segment = segment_length / gop_seconds
+        if gop_seconds > segment_length or abs(gops_per_segment - round(gops_per_segment)) > 1e-6:
+            raise ValueError(
+                f"Rendition {rung['name']!r} GOP of {gop_seconds:g}s does not divide the {segment_length}s segment length, "
+                "segments would not start on a keyframe. Pick a GOP size that divides the segment length."
+            )
+
+
+def expected_latency_seconds(settings: dict) -> int:
+    """Rough glass-to-glass latency: encoder look ahead, one segment being written and the player hold back."""
+    return LOOK_AHEAD_DELAY[settings["look_ahead_rate_control"]] + settings["segment_length"] * (1 + PLAYER_HOLD_BACK_SEGMENTS)
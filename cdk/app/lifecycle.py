@@ -0,0 +1,95 @@
+# Lifecycle rules for the media bucket: expiry and storage tiering per S3 prefix.
+# MediaLive deletes live segments once they fall out of keep_segments, these rules catch what it leaves
+# behind: playlists and segments of stopped channels, single file and archive outputs.
+#
+# S3 counts expire_days from when an object was written, not from when the channel stopped. Playlists and segments
+# are rewritten or replaced every segment, but MediaLive writes the FMP4 initialization segments (_init.mp4), and
+# possibly the master playlist, once when the channel starts. An expiry shorter than the channel run would delete
+# them under a running channel. So the live rule of a channel only applies to objects larger than
+# WRITE_ONCE_MAX_BYTES: segments, never the small write-once objects. A second rule with manifest_expire_days
+# removes every object of the prefix, including the playlists and initialization segments of a stopped channel.
+# It must be longer than max_run_days, the longest the channel runs before it is stopped or restarted, and than
+# the DVR window, so it never reaches the write-once objects of a running channel.
+
+# Larger than any initialization segment or master playlist, smaller than the segments of any usable rendition
+# (192 kbps audio for 1 s is 24 KB)
+WRITE_ONCE_MAX_BYTES = 16 * 1024
+
+# Storage classes objects can move to. Only classes that still answer a plain GET are allowed, the API and
+# players can not restore objects from the archive tiers. Values are the minimum age S3 accepts for the transition.
+# Listed in the order S3 allows objects to move down (the transition waterfall).
+TRANSITION_STORAGE_CLASSES = {
+    "STANDARD_IA": 30,
+    "INTELLIGENT_TIERING": 0,
+    "ONEZONE_IA": 30,
+    "GLACIER_INSTANT_RETRIEVAL": 0,
+}
+# Objects must stay this many days in an infrequent access class before moving on
+INFREQUENT_ACCESS_MINIMUM_DAYS = 30
+
+LIFECYCLE_KEYS = ["expire_days", "transitions"]
+# Only for the live folders, where the expire_days rule skips the write-once objects
+LIVE_LIFECYCLE_KEYS = LIFECYCLE_KEYS + ["manifest_expire_days", "max_run_days"]
+
+
+def _positive_days(name: str, lifecycle: dict, key: str):
+    days = lifecycle.get(key)
+    if days is not None and (not isinstance(days, int) or isinstance(days, bool) or days < 1):
+        raise ValueError(f"{name} lifecycle {key} must be a positive integer, got {days!r}")
+    return days
+
+
+def validate_lifecycle(name: str, lifecycle: dict, live: bool = False, dvr_window_minutes: int = None) -> dict:
+    """Checks the lifecycle settings of a channel and returns them with transitions sorted by age.
+
+    {"expire_days": 7, "transitions": [{"storage_class": "STANDARD_IA", "days": 30}]}
+    Live folders also take {"manifest_expire_days": 30, "max_run_days": 14}, see the top of this file.
+
+    expire_days counts from when S3 received the object, see WRITE_ONCE_MAX_BYTES for the objects of a running channel.
+    """
+    keys = LIVE_LIFECYCLE_KEYS if live else LIFECYCLE_KEYS
+    if not isinstance(lifecycle, dict):
+        raise ValueError(f"{name} lifecycle must be an object with {keys}")
+    unknown = [key for key in lifecycle if key not in keys]
+    if unknown:
+        raise ValueError(f"{name} lifecycle has unknown settings {unknown}")
+
+    expire_days = _positive_days(name, lifecycle, "expire_days")
+    manifest_expire_days = _positive_days(name, lifecycle, "manifest_expire_days")
+    max_run_days = _positive_days(name, lifecycle, "max_run_days")
+    if (manifest_expire_days is None) != (max_run_days is None):
+        raise ValueError(f"{name} lifecycle must set manifest_expire_days and max_run_days together")
+    if manifest_expire_days is not None:
+        if manifest_expire_days <= max_run_days:
+            raise ValueError(f"{name} lifecycle manifest_expire_days must be longer than max_run_days ({max_run_days}), "
+                "or initialization segments and master playlists expire under the running channel")
+        if dvr_window_minutes is not None and manifest_expire_days * 24 * 60 <= dvr_window_minutes:
+            raise ValueError(f"{name} lifecycle manifest_expire_days must be longer than the {dvr_window_minutes} minute DVR window")
+        if expire_days is not None and manifest_expire_days <= expire_days:
+            raise ValueError(f"{name} lifecycle manifest_expire_days must be longer than expire_days ({expire_days}), "
+                "it applies to segments as well")
+
+    transitions = []
+    for transition in lifecycle.get("transitions", []):
+        storage_class = transition.get("storage_class")
+        days = transition.get("days")
+        if storage_class not in TRANSITION_STORAGE_CLASSES:
+            raise ValueError(f"{name} lifecycle storage_class must be one of {list(TRANSITION_STORAGE_CLASSES)}, got {storage_class!r}")
+        if not isinstance(days, int) or isinstance(days, bool) or days < TRANSITION_STORAGE_CLASSES[storage_class]:
+            raise ValueError(f"{name} lifecycle transition to {storage_class} needs days of at least {TRANSITION_STORAGE_CLASSES[storage_class]}, got {days!r}")
+        if expire_days is not None and days >= expire_days:
+            raise ValueError(f"{name} lifecycle transition to {storage_class} after {days} days never happens, objects expire after {expire_days}")
+        transitions.append({"storage_class": storage_class, "days": days})
+    transitions.sort(key=lambda transition: transition["days"])
+    order = list(TRANSITION_STORAGE_CLASSES)
+    for previous, transition in zip(transitions, transitions[1:]):
+        if order.index(transition["storage_class"]) <= order.index(previous["storage_class"]):
+            raise ValueError(f"{name} lifecycle can not move objects from {previous['storage_class']} to {transition['storage_class']}, "
+                f"storage classes must follow the order {order}")
+        if previous["storage_class"] in ("STANDARD_IA", "ONEZONE_IA") and transition["days"] - previous["days"] < INFREQUENT_ACCESS_MINIMUM_DAYS:
+            raise ValueError(f"{name} lifecycle must keep objects in {previous['storage_class']} for {INFREQUENT_ACCESS_MINIMUM_DAYS} days")
+
+    if expire_days is None and not transitions and manifest_expire_days is None:
+        raise ValueError(f"{name} lifecycle needs expire_days, transitions or manifest_expire_days")
+    return {"expire_days": expire_days, "transitions": transitions,
+            **({"manifest_expire_days": manifest_expire_days} if manifest_expire_days is not None else {})}
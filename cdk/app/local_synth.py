@@ -0,0 +1,48 @@
+import aws_cdk as cdk
+from aws_cdk.assertions import Template
+from app.iam_nested_stack import IamNestedStack
+from app.network_nested_stack import NetworkNestedStack
+from app.medialive_nested_stack import MediaLiveNestedStack
+from app.storage_nested_stack import StorageNestedStack
+from app.protected_streaming_root_stack import ProtectedStreamingRoot
+from app.channel_config import load_channel_config
+
+# The templates are never deployed, the certificates only need to look like ARNs
+PLACEHOLDER_CERT = "arn:aws:acm:us-east-1:123456789012:certificate/local-synth"
+
+
+def synthesize_channels(channels_config: str) -> list:
+    """Builds the MediaLive stacks for every channel in the config without deploying anything.
+
+    Returns (channel, properties) pairs: the channel entry from load_channel_config and the
+    synthesized AWS::MediaLive::Channel properties. Used by the offline tools next to app.py.
+    """
+    app = cdk.App()
+    root_stack = ProtectedStreamingRoot(app, "ProtectedStreaming")
+    network_stack = NetworkNestedStack(root_stack, "Network",
+        client_vpn_cert=PLACEHOLDER_CERT,
+        server_vpn_cert=PLACEHOLDER_CERT,
+        stack_name="local_synth")
+    iam_stack = IamNestedStack(root_stack, "Security")
+    storage_stack = StorageNestedStack(root_stack, "Storage",
+        security=iam_stack,
+        network=network_stack,
+        stack_name="local_synth")
+
+    channels = load_channel_config(channels_config)
+    medialive_stacks = [
+        MediaLiveNestedStack(root_stack, f"MediaLive-{channel['name']}",
+            network=network_stack,
+            storage=storage_stack,
+            media_destinations=channel["media_destinations"],
+            channel_name=channel["name"],
+            stack_name="local_synth",
+            **channel["settings"])
+        for channel in channels
+    ]
+    # The whole tree has to exist before the first template is synthesized
+    return [
+        (channel, resource["Properties"])
+        for channel, medialive_stack in zip(channels, medialive_stacks)
+        for resource in Template.from_stack(medialive_stack).find_resources("AWS::MediaLive::Channel").values()
+    ]
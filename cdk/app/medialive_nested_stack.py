@@ -1,4 +1,5 @@
 from aws_cdk import (
+    Annotations,
     CfnOutput,
     Fn,
     NestedStack,
@@ -10,8 +11,20 @@ from aws_cdk.aws_ec2 import SecurityGroup, Peer, Port, SubnetType
 from constructs import Construct
 from app.network_nested_stack import NetworkNestedStack
 from app.storage_nested_stack import StorageNestedStack
+from app.renditions import DEFAULT_RENDITION_LADDER, validate_rendition_ladder
+from app.latency_profiles import resolve_latency_profile, apply_dvr_window, validate_gop_alignment, expected_latency_seconds
+from app.rate_control import resolve_rate_control, h264_rate_settings
+from app.ingest import INPUT_PORTS, validate_ingest
+from app.containers import validate_container, overhead_report, segment_bytes
 from cdk_nag import NagSuppressions
 
+# Output group names, the monitoring stack alarms on the S3 write errors of each group
+LIVE_OUTPUT_GROUP_NAME = "HLS_stream"
+ARCHIVE_OUTPUT_GROUP_NAME = "HLS_archive"
+# MediaLive channel log levels. DEBUG logs every segment written and is meant for troubleshooting a channel for a while.
+LOG_LEVELS = ["ERROR", "WARNING", "INFO", "DEBUG", "DISABLED"]
+# Frame rate of the source when a channel does not set source_frame_rate, the encoder follows the source
+DEFAULT_SOURCE_FRAME_RATE = 30
 
 class MediaLiveNestedStack(NestedStack):
 
@@ -23,18 +36,115 @@ class MediaLiveNestedStack(NestedStack):
             storage: StorageNestedStack,
             media_destinations: dict,
             stack_name: str,
+            renditions: list = None,
+            latency_profile = "standard",
+            source_frame_rate: float = DEFAULT_SOURCE_FRAME_RATE,
+            ts_file_mode: str = "SEGMENTED_FILES",
+            container: str = "TS",
+            channel_name: str = "protected_stream",
+            redundant: bool = False,
+            directory_structure: str = "SINGLE_DIRECTORY",
+            segments_per_subdirectory: int = 10000,
+            rate_control = "cbr",
+            ingest: dict = None,
+            dvr_window_minutes: int = None,
+            i_frame_only_playlists: bool = False,
+            archive: bool = False,
+            log_level: str = "ERROR",
             **kwargs) -> None:
             
         super().__init__(scope, construct_id, **kwargs)
 
-        input_name = "protected_stream_input"
-        channel_name = "protected_stream_channel"
-        output_id = "protected-stream-output" # Destination IDs in MediaLive only allow letters, numbers and hyphens.
+        self.channel_name = channel_name
+        self.media_destinations = media_destinations
+        # A redundant channel runs two pipelines in separate AZs, each writing to its own destination
+        self.redundant = redundant
+        pipelines = 2 if redundant else 1
+
+        # SINGLE_FILE writes one .ts file per rendition and indexes it with EXT-X-BYTERANGE tags.
+        # MediaLive only supports it in VOD mode, where every segment stays in the playlist.
+        if ts_file_mode not in ["SEGMENTED_FILES", "SINGLE_FILE"]:
+            raise ValueError(f"ts_file_mode must be SEGMENTED_FILES or SINGLE_FILE, got {ts_file_mode!r}")
+        self.ts_file_mode = ts_file_mode
+
+        # TS muxes audio into every rendition. FMP4 writes video only renditions plus one audio rendition.
+        self.container = validate_container(container)
+        if self.container == "FMP4" and self.ts_file_mode == "SINGLE_FILE":
+            raise ValueError("SINGLE_FILE ts_file_mode only applies to the TS container")
+
+        # SUBDIRECTORY_PER_STREAM starts a new numbered subdirectory of the destination folder every segments_per_subdirectory
+        # segments, so the segments of a long running channel are spread over many S3 prefixes instead of one
+        if directory_structure not in ["SINGLE_DIRECTORY", "SUBDIRECTORY_PER_STREAM"]:
+            raise ValueError(f"directory_structure must be SINGLE_DIRECTORY or SUBDIRECTORY_PER_STREAM, got {directory_structure!r}")
+        if not isinstance(segments_per_subdirectory, int) or isinstance(segments_per_subdirectory, bool) or segments_per_subdirectory < 1:
+            raise ValueError(f"segments_per_subdirectory must be a positive integer, got {segments_per_subdirectory!r}")
+        if directory_structure == "SUBDIRECTORY_PER_STREAM" and ts_file_mode == "SINGLE_FILE":
+            raise ValueError("SUBDIRECTORY_PER_STREAM needs SEGMENTED_FILES, a single file rendition has no segments to spread")
+        self.directory_structure = directory_structure
+        self.segments_per_subdirectory = segments_per_subdirectory
+
+        # Contribution protocol and optional backup input, see app/ingest.py. RTMP push without failover when not set.
+        self.ingest = validate_ingest(ingest, pipelines)
+
+        # latency_profile is "standard", "low", "ultra-low" or a dict with the same keys, see app/latency_profiles.py
+        self.latency = resolve_latency_profile(latency_profile)
+        # A DVR window replaces the playlist length of the profile, viewers can seek back that many minutes
+        if dvr_window_minutes is not None:
+            if ts_file_mode == "SINGLE_FILE":
+                raise ValueError("dvr_window_minutes does not apply to SINGLE_FILE, every segment already stays in the playlist")
+            self.latency = apply_dvr_window(self.latency, dvr_window_minutes)
+
+        # I-frame only playlists (EXT-X-I-FRAMES-ONLY) let players scrub the window and show thumbnails without loading full segments
+        self.i_frame_only_playlists = i_frame_only_playlists
+        # The archive output group writes a VOD copy of every rendition under the archive destinations, for replay after the event
+        if archive and not {"archive_primary", "archive_secondary"} <= set(media_destinations):
+            raise ValueError("archive needs archive_primary and archive_secondary media destinations")
+        self.archive = archive
+        self.output_group_names = [LIVE_OUTPUT_GROUP_NAME] + ([ARCHIVE_OUTPUT_GROUP_NAME] if archive else [])
+        if log_level not in LOG_LEVELS:
+            raise ValueError(f"log_level must be one of {LOG_LEVELS}, got {log_level!r}")
+
+        # Fails synth if the ladder is invalid, see app/renditions.py for the rules
+        # Rungs without their own GOP use the latency profile GOP, and every GOP must line up with the segments
+        self.renditions = [
+            {"gop_size": self.latency["gop_size"], "gop_size_units": self.latency["gop_size_units"], **rung}
+            for rung in validate_rendition_ladder(renditions or DEFAULT_RENDITION_LADDER)
+        ]
+        validate_gop_alignment(self.renditions, self.latency["segment_length"], source_frame_rate)
+
+        # rate_control is "cbr", "camera", "slides" or a dict with a mode, see app/rate_control.py
+        self.rate_control = resolve_rate_control(rate_control)
+        self.rate_settings = {rung["name"]: h264_rate_settings(self.rate_control, rung) for rung in self.renditions}
+        # Largest segment of each rendition, VBR and QVBR rungs at their cap. The API only caches segments that are small enough.
+        self.segment_bytes = {
+            name: segment_bytes(settings.get("max_bitrate", settings.get("bitrate")), self.container, self.latency["segment_length"], source_frame_rate)
+            for name, settings in self.rate_settings.items()
+        }
+
+        # Name modifiers of every playlist in the HLS group, e.g. media_720p.m3u8 for "_720p"
+        self.hls_name_modifiers = [f"_{rung['name']}" for rung in self.renditions]
+        if self.container == "FMP4":
+            self.hls_name_modifiers.append("_audio")
+        # Each video rendition also gets a playlist with only its I-frames. MediaLive does not document its name,
+        # the master playlist links it with EXT-X-I-FRAME-STREAM-INF, so nothing in the stacks depends on it.
+
+        # Synth time report comparing the container overhead of each rendition, shown by cdk synth
+        for row in overhead_report(self.renditions, self.latency["segment_length"], source_frame_rate):
+            Annotations.of(self).add_info(
+                f"Rendition {row['rendition']}: TS overhead {row['ts_overhead_kbps']} kbps ({row['ts_overhead_percent']}%), "
+                f"FMP4 overhead {row['fmp4_overhead_kbps']} kbps ({row['fmp4_overhead_percent']}%), container in use {self.container}"
+            )
+
+        # Resource names are derived from the channel name so several channels can share the VPC
+        input_name = f"{channel_name}_input"
+        medialive_channel_name = f"{channel_name}_channel"
+        output_id = f"{channel_name.replace('_', '-')}-output" # Destination IDs in MediaLive only allow letters, numbers and hyphens.
         s3destination = storage.media_bucket.bucket_name
-        subnet_ids = [Fn.select(0, network.vpc.select_subnets().subnet_ids)] # We only select one subnet for the SINGLE_PIPELINE channel
+        # One subnet per pipeline: a SINGLE_PIPELINE channel uses the first one, a STANDARD channel one in each AZ
+        subnet_ids = [Fn.select(pipeline, network.vpc.select_subnets(one_per_az=True).subnet_ids) for pipeline in range(pipelines)]
 
         ### MediaLive IAM role definition
-        medialive_role_name = f"{stack_name}_MediaLiveAccessRole"
+        medialive_role_name = f"{stack_name}_{channel_name}_MediaLiveAccessRole"
         medialive_role = iam.CfnRole(
             self,
             medialive_role_name,
@@ -99,7 +209,14 @@ class MediaLiveNestedStack(NestedStack):
                                     "logs:DescribeLogGroups",
                                 ]
                             ),
-                        ]
+                        ] + ([
+                            # SRT passphrase, read by MediaLive when the input connects
+                            iam.PolicyStatement(
+                                effect=iam.Effect.ALLOW,
+                                resources=[self.ingest["passphrase_secret_arn"]],
+                                actions=["secretsmanager:GetSecretValue"]
+                            )
+                        ] if "passphrase_secret_arn" in self.ingest else [])
                     ),
                 )
             ]
@@ -111,51 +228,51 @@ class MediaLiveNestedStack(NestedStack):
             }
         ])
 
-        # MediaLive input security group
+        # MediaLive input security group, only open for the protocol and ports of the input type
+        input_protocol, input_ports = INPUT_PORTS.get(self.ingest["type"], ("udp", []))
         input_secgrp = SecurityGroup(
             self,
             "MediaLiveInputSecGrp",
             vpc=network.vpc,
-            allow_all_outbound=True,
-            security_group_name="medialive_input_secgrp"
+            allow_all_outbound=self.ingest["type"] != "SRT_CALLER",
+            security_group_name=f"{channel_name}_medialive_input_secgrp"
         )
-        input_secgrp.add_ingress_rule(peer=Peer.ipv4(network.vpc.vpc_cidr_block),connection=Port.all_tcp())
-        input_secgrp.add_ingress_rule(peer=Peer.ipv4(network.vpc.vpc_cidr_block),connection=Port.all_udp())
+        for port in input_ports:
+            input_secgrp.add_ingress_rule(peer=Peer.ipv4(network.vpc.vpc_cidr_block),
+                connection=Port.tcp(port) if input_protocol == "tcp" else Port.udp(port))
+        # SRT callers connect out to the venue listeners, of the primary and the backup input
+        if self.ingest["type"] == "SRT_CALLER":
+            for source in self.ingest["sources"] + (self.ingest["failover"] or {}).get("sources", []):
+                input_secgrp.add_egress_rule(peer=Peer.ipv4(f"{source['address']}/32"), connection=Port.udp(source["port"]))
 
         ### Medialive input definition
-        self.media_input = medialive.CfnInput(
-            self,
-            input_name,
-            name=input_name,
-            type="RTMP_PUSH",
-            role_arn= medialive_role.attr_arn,
-            vpc=medialive.CfnInput.InputVpcRequestProperty(
-                security_group_ids=[input_secgrp.security_group_id], # VPC Inputs cannot use MediaLive Input Security Groups and use a VPC security group instead
-                subnet_ids=subnet_ids
-            ),
-            destinations=[
-                medialive.CfnInput.InputDestinationRequestProperty(stream_name="protected_stream_app/protected_stream_appinst1"),
-            ]
-        )
-
+        self.media_input = self._media_input(input_name, self.ingest.get("sources"), medialive_role, input_secgrp, subnet_ids, pipelines)
+        # The backup input takes the same protocol, MediaLive switches to it when the primary feed is lost
+        self.backup_input = None
+        if self.ingest["failover"]:
+            self.backup_input = self._media_input(f"{channel_name}_backup_input", self.ingest["failover"].get("sources"),
+                medialive_role, input_secgrp, subnet_ids, pipelines)
 
         ### MediaLive channel definition
         self.my_medialive_tx_channel = medialive.CfnChannel(
             self,
-            channel_name,
-            channel_class="SINGLE_PIPELINE",
-            log_level="DEBUG",
-            name=channel_name,
+            medialive_channel_name,
+            channel_class="STANDARD" if redundant else "SINGLE_PIPELINE",
+            log_level=log_level,
+            name=medialive_channel_name,
             role_arn=medialive_role.attr_arn,
             destinations=[
                 medialive.CfnChannel.OutputDestinationProperty(
-                    id=output_id,
+                    id=destination_id,
                     settings=[
                         medialive.CfnChannel.OutputDestinationSettingsProperty(
-                            url=f"{'s3ssl://'}{s3destination}{media_destinations['primary']}"
+                            url=f"{'s3ssl://'}{s3destination}{media_destinations[destination]}"
                         )
+                        for destination in destinations[:pipelines]
                     ]
                 )
+                for destination_id, destinations in [(output_id, ["primary", "secondary"])]
+                    + ([(f"{output_id}-archive", ["archive_primary", "archive_secondary"])] if archive else [])
             ],
             input_specification=medialive.CfnChannel.InputSpecificationProperty(
                 codec="AVC",
@@ -166,20 +283,8 @@ class MediaLiveNestedStack(NestedStack):
             vpc=medialive.CfnChannel.VpcOutputSettingsProperty(
                  subnet_ids = subnet_ids
             ),
-            input_attachments=[medialive.CfnChannel.InputAttachmentProperty(
-                input_id=self.media_input.ref,
-                input_attachment_name=self.media_input.name,
-                input_settings=medialive.CfnChannel.InputSettingsProperty(
-                    audio_selectors=[],
-                    caption_selectors=[],
-                    input_filter="AUTO",
-                    filter_strength=1,
-                    deblock_filter="DISABLED",
-                    denoise_filter="DISABLED",
-                    smpte2038_data_preference="IGNORE",
-                )
-            )
-            ],
+            input_attachments=[self._input_attachment(self.media_input, self.backup_input)]
+                + ([self._input_attachment(self.backup_input)] if self.backup_input else []),
             encoder_settings=medialive.CfnChannel.EncoderSettingsProperty(
                 audio_descriptions=[
                     medialive.CfnChannel.AudioDescriptionProperty(
@@ -188,122 +293,255 @@ class MediaLiveNestedStack(NestedStack):
                         language_code_control="FOLLOW_INPUT",
                     )
                 ],
-                output_groups=[
-                    medialive.CfnChannel.OutputGroupProperty(
-                        name="HLS_stream",
-                        output_group_settings=medialive.CfnChannel.OutputGroupSettingsProperty(
-                            hls_group_settings=medialive.CfnChannel.HlsGroupSettingsProperty(
-                                destination=medialive.CfnChannel.OutputLocationRefProperty(
-                                    destination_ref_id="protected-stream-output" # Generates "Status: 422; UnprocessableEntityException" if missing
-                                ),
-                                incomplete_segment_behavior="AUTO",
-                                discontinuity_tags="INSERT",
-                                segmentation_mode="USE_SEGMENT_DURATION",
-                                hls_cdn_settings=medialive.CfnChannel.HlsCdnSettingsProperty(
-                                    hls_s3_settings=medialive.CfnChannel.HlsS3SettingsProperty()
-                                ),
-                                input_loss_action="EMIT_OUTPUT",
-                                manifest_compression="NONE",
-                                iv_in_manifest="INCLUDE",
-                                iv_source="FOLLOWS_SEGMENT_NUMBER",
-                                client_cache="ENABLED",
-                                ts_file_mode="SEGMENTED_FILES",
-                                manifest_duration_format="FLOATING_POINT",
-                                redundant_manifest="DISABLED",
-                                output_selection="MANIFESTS_AND_SEGMENTS",
-                                stream_inf_resolution="INCLUDE",
-                                i_frame_only_playlists="DISABLED",
-                                index_n_segments=20,
-                                program_date_time="EXCLUDE",
-                                program_date_time_period=600,
-                                keep_segments=41,
-                                segment_length=7,
-                                timed_metadata_id3_frame="PRIV",
-                                timed_metadata_id3_period=10,
-                                hls_id3_segment_tagging="DISABLED",
-                                codec_specification="RFC_4281",
-                                directory_structure="SINGLE_DIRECTORY",
-                                segments_per_subdirectory=10000,
-                                mode="LIVE",
-                                program_date_time_clock="INITIALIZE_FROM_OUTPUT_TIMECODE"
-                            ),
-                        ),
-                        outputs=[
-                            medialive.CfnChannel.OutputProperty(
-                                output_settings=medialive.CfnChannel.OutputSettingsProperty(
-                                    hls_output_settings=medialive.CfnChannel.HlsOutputSettingsProperty(
-                                        hls_settings=medialive.CfnChannel.HlsSettingsProperty(
-                                            standard_hls_settings=medialive.CfnChannel.StandardHlsSettingsProperty(
-                                                m3_u8_settings=medialive.CfnChannel.M3u8SettingsProperty(
-                                                    audio_frames_per_pes=4,
-                                                    audio_pids="492-498",
-                                                    ecm_pid="8182",
-                                                    pcr_control="PCR_EVERY_PES_PACKET",
-                                                    pmt_pid="480",
-                                                    program_num=1,
-                                                    scte35_pid="500",
-                                                    scte35_behavior="NO_PASSTHROUGH",
-                                                    timed_metadata_pid="502",
-                                                    timed_metadata_behavior="NO_PASSTHROUGH",
-                                                    video_pid="481"
-                                                ),
-                                                audio_rendition_sets="program_audio"
-                                            )
-                                        )
-                                    ),
-                                ),
-                                output_name="video_720p",
-                                video_description_name="video_desc_private",
-                                audio_description_names=["audio_desc_private"],
-                            ),
-                        ]
-                    )
-                ],
+                output_groups=[self._hls_output_group(LIVE_OUTPUT_GROUP_NAME, output_id)]
+                    + ([self._hls_output_group(ARCHIVE_OUTPUT_GROUP_NAME, f"{output_id}-archive", archive=True)] if archive else []),
                 timecode_config=medialive.CfnChannel.TimecodeConfigProperty(
                     source="SYSTEMCLOCK",
                 ),
-                video_descriptions=[
-                    medialive.CfnChannel.VideoDescriptionProperty(
-                        name="video_desc_private",
-                        height=720,
-                        width=1280,
-                        respond_to_afd="NONE",
-                        sharpness=50,
-                        scaling_behavior="DEFAULT",
-                        codec_settings=medialive.CfnChannel.VideoCodecSettingsProperty(
-                            h264_settings=medialive.CfnChannel.H264SettingsProperty(
-                                afd_signaling="NONE",
-                                color_metadata="INSERT",
-                                adaptive_quantization="AUTO",
-                                entropy_encoding="CABAC",
-                                flicker_aq="ENABLED",
-                                force_field_pictures="DISABLED",
-                                framerate_control="INITIALIZE_FROM_SOURCE",
-                                gop_b_reference="DISABLED",
-                                gop_closed_cadence=1,
-                                gop_num_b_frames=1,
-                                gop_size=90,
-                                gop_size_units="FRAMES",
-                                subgop_length="FIXED",
-                                scan_type="PROGRESSIVE",
-                                level="H264_LEVEL_AUTO",
-                                look_ahead_rate_control="MEDIUM",
-                                num_ref_frames=1,
-                                par_control="INITIALIZE_FROM_SOURCE",
-                                profile="MAIN",
-                                rate_control_mode="CBR",
-                                syntax="DEFAULT",
-                                scene_change_detect="ENABLED",
-                                spatial_aq="ENABLED",
-                                temporal_aq="ENABLED",
-                                timecode_insertion="DISABLED"
-                            )
-                        )
-                    ),
-                ]
+                video_descriptions=[self._video_description(rung) for rung in self.renditions]
             ),
             tags={"StackName": stack_name}
         )
 
         # Outputs
-        CfnOutput(self, "MediaLivePrimaryInput", value=Fn.select(0, self.media_input.attr_destinations))
\ No newline at end of file
+        # SRT caller inputs have no endpoints, MediaLive connects to the venue sources instead
+        if self.ingest["type"] != "SRT_CALLER":
+            CfnOutput(self, "MediaLivePrimaryInput", value=Fn.select(0, self.media_input.attr_destinations))
+            if redundant:
+                CfnOutput(self, "MediaLiveSecondaryInput", value=Fn.select(1, self.media_input.attr_destinations))
+            if self.backup_input:
+                CfnOutput(self, "MediaLiveBackupPrimaryInput", value=Fn.select(0, self.backup_input.attr_destinations))
+                if redundant:
+                    CfnOutput(self, "MediaLiveBackupSecondaryInput", value=Fn.select(1, self.backup_input.attr_destinations))
+        CfnOutput(self, "ExpectedLatencySeconds",
+            value=str(expected_latency_seconds(self.latency)),
+            description="Approximate glass-to-glass latency for the selected latency profile")
+
+    def _media_input(self, input_name: str, sources: list, role: iam.CfnRole, security_group: SecurityGroup,
+            subnet_ids: list, pipelines: int) -> medialive.CfnInput:
+        input_type = self.ingest["type"]
+        srt_settings = None
+        if input_type == "SRT_CALLER":
+            srt_settings = medialive.CfnInput.SrtSettingsRequestProperty(srt_caller_sources=[
+                medialive.CfnInput.SrtCallerSourceRequestProperty(
+                    srt_listener_address=source["address"],
+                    srt_listener_port=str(source["port"]),
+                    stream_id=source["stream_id"] or None,
+                    minimum_latency=self.ingest["latency_ms"],
+                    decryption=self._srt_decryption(medialive.CfnInput.SrtCallerDecryptionRequestProperty)
+                )
+                for source in sources
+            ])
+        elif input_type == "SRT_LISTENER":
+            srt_settings = medialive.CfnInput.SrtSettingsRequestProperty(
+                srt_listener_settings=medialive.CfnInput.SrtListenerSettingsRequestProperty(
+                    minimum_latency=self.ingest["latency_ms"],
+                    decryption=self._srt_decryption(medialive.CfnInput.SrtListenerDecryptionRequestProperty)
+                )
+            )
+        return medialive.CfnInput(
+            self,
+            input_name,
+            name=input_name,
+            type=input_type,
+            role_arn=role.attr_arn,
+            vpc=medialive.CfnInput.InputVpcRequestProperty(
+                security_group_ids=[security_group.security_group_id], # VPC Inputs cannot use MediaLive Input Security Groups and use a VPC security group instead
+                subnet_ids=subnet_ids
+            ),
+            # RTMP needs an application and instance name per pipeline, the other push inputs only an address
+            destinations=[
+                medialive.CfnInput.InputDestinationRequestProperty(stream_name=f"protected_stream_app/protected_stream_appinst{pipeline + 1}")
+                for pipeline in range(pipelines)
+            ] if input_type == "RTMP_PUSH" else None,
+            srt_settings=srt_settings
+        )
+
+    def _srt_decryption(self, property_class):
+        # The passphrase stays in Secrets Manager, MediaLive reads it with the channel role
+        if "passphrase_secret_arn" not in self.ingest:
+            return None
+        return property_class(algorithm="AES256", passphrase_secret_arn=self.ingest["passphrase_secret_arn"])
+
+    def _input_attachment(self, media_input: medialive.CfnInput, backup_input: medialive.CfnInput = None) -> medialive.CfnChannel.InputAttachmentProperty:
+        failover_settings = None
+        if backup_input:
+            failover = self.ingest["failover"]
+            conditions = [medialive.CfnChannel.FailoverConditionProperty(
+                failover_condition_settings=medialive.CfnChannel.FailoverConditionSettingsProperty(
+                    input_loss_settings=medialive.CfnChannel.InputLossFailoverSettingsProperty(input_loss_threshold_msec=failover["input_loss_ms"])
+                )
+            )]
+            if failover["video_black_ms"]:
+                conditions.append(medialive.CfnChannel.FailoverConditionProperty(
+                    failover_condition_settings=medialive.CfnChannel.FailoverConditionSettingsProperty(
+                        video_black_settings=medialive.CfnChannel.VideoBlackFailoverSettingsProperty(video_black_threshold_msec=failover["video_black_ms"])
+                    )
+                ))
+            failover_settings = medialive.CfnChannel.AutomaticInputFailoverSettingsProperty(
+                secondary_input_id=backup_input.ref,
+                # PRIMARY_INPUT_PREFERRED switches back once the primary feed is healthy again
+                input_preference="PRIMARY_INPUT_PREFERRED" if failover["prefer_primary"] else "EQUAL_INPUT_PREFERENCE",
+                failover_conditions=conditions
+            )
+        return medialive.CfnChannel.InputAttachmentProperty(
+            input_id=media_input.ref,
+            input_attachment_name=media_input.name,
+            automatic_input_failover_settings=failover_settings,
+            input_settings=medialive.CfnChannel.InputSettingsProperty(
+                audio_selectors=[],
+                caption_selectors=[],
+                input_filter="AUTO",
+                filter_strength=1,
+                deblock_filter="DISABLED",
+                denoise_filter="DISABLED",
+                smpte2038_data_preference="IGNORE",
+            )
+        )
+
+    def _hls_output_group(self, name: str, destination_id: str, archive: bool = False) -> medialive.CfnChannel.OutputGroupProperty:
+        # The archive group encodes nothing of its own, its outputs reuse the video descriptions of the live group.
+        # VOD mode lists every segment and ends the playlist when the channel stops, so it can be replayed afterwards.
+        suffix = "_archive" if archive else ""
+        return medialive.CfnChannel.OutputGroupProperty(
+            name=name,
+            output_group_settings=medialive.CfnChannel.OutputGroupSettingsProperty(
+                hls_group_settings=medialive.CfnChannel.HlsGroupSettingsProperty(
+                    destination=medialive.CfnChannel.OutputLocationRefProperty(
+                        destination_ref_id=destination_id # Generates "Status: 422; UnprocessableEntityException" if missing
+                    ),
+                    incomplete_segment_behavior="AUTO",
+                    discontinuity_tags="INSERT",
+                    segmentation_mode="USE_SEGMENT_DURATION",
+                    hls_cdn_settings=medialive.CfnChannel.HlsCdnSettingsProperty(
+                        hls_s3_settings=medialive.CfnChannel.HlsS3SettingsProperty()
+                    ),
+                    input_loss_action="EMIT_OUTPUT",
+                    manifest_compression="NONE",     # Playlists are gzipped by the API for clients that accept it
+                    iv_in_manifest="INCLUDE",
+                    iv_source="FOLLOWS_SEGMENT_NUMBER",
+                    client_cache="ENABLED",
+                    ts_file_mode=self.ts_file_mode,
+                    manifest_duration_format="FLOATING_POINT",
+                    redundant_manifest="ENABLED" if self.redundant else "DISABLED",   # Each master playlist also lists the other pipeline
+                    output_selection="MANIFESTS_AND_SEGMENTS",
+                    stream_inf_resolution="INCLUDE",
+                    i_frame_only_playlists="STANDARD" if self.i_frame_only_playlists else "DISABLED",   # For scrubbing and thumbnails
+                    index_n_segments=self.latency["index_n_segments"],
+                    program_date_time="EXCLUDE",
+                    program_date_time_period=600,
+                    keep_segments=self.latency["keep_segments"],
+                    segment_length=self.latency["segment_length"],
+                    timed_metadata_id3_frame="PRIV",
+                    timed_metadata_id3_period=10,
+                    hls_id3_segment_tagging="DISABLED",
+                    codec_specification="RFC_4281",
+                    directory_structure=self.directory_structure,
+                    segments_per_subdirectory=self.segments_per_subdirectory,
+                    mode="VOD" if archive or self.ts_file_mode == "SINGLE_FILE" else "LIVE",
+                    program_date_time_clock="INITIALIZE_FROM_OUTPUT_TIMECODE"
+                ),
+            ),
+            outputs=[self._hls_output(rung, suffix) for rung in self.renditions]
+                + ([self._hls_audio_output(suffix)] if self.container == "FMP4" else [])
+        )
+
+    def _hls_output(self, rung: dict, suffix: str = "") -> medialive.CfnChannel.OutputProperty:
+        # The name modifier is appended to the destination, e.g. /pipe-1/media_720p.m3u8
+        if self.container == "FMP4":
+            hls_settings = medialive.CfnChannel.HlsSettingsProperty(
+                fmp4_hls_settings=medialive.CfnChannel.Fmp4HlsSettingsProperty(
+                    audio_rendition_sets="program_audio",
+                    timed_metadata_behavior="NO_PASSTHROUGH"
+                )
+            )
+        else:
+            hls_settings = medialive.CfnChannel.HlsSettingsProperty(
+                standard_hls_settings=medialive.CfnChannel.StandardHlsSettingsProperty(
+                    m3_u8_settings=medialive.CfnChannel.M3u8SettingsProperty(
+                        audio_frames_per_pes=4,
+                        audio_pids="492-498",
+                        ecm_pid="8182",
+                        pcr_control="PCR_EVERY_PES_PACKET",
+                        pmt_pid="480",
+                        program_num=1,
+                        scte35_pid="500",
+                        scte35_behavior="NO_PASSTHROUGH",
+                        timed_metadata_pid="502",
+                        timed_metadata_behavior="NO_PASSTHROUGH",
+                        video_pid="481"
+                    ),
+                    audio_rendition_sets="program_audio"
+                )
+            )
+        return medialive.CfnChannel.OutputProperty(
+            output_settings=medialive.CfnChannel.OutputSettingsProperty(
+                hls_output_settings=medialive.CfnChannel.HlsOutputSettingsProperty(
+                    name_modifier=f"_{rung['name']}",
+                    hls_settings=hls_settings
+                ),
+            ),
+            output_name=f"video_{rung['name']}{suffix}",     # Output names are unique across all groups of the channel
+            video_description_name=f"video_desc_{rung['name']}",
+            # All TS rungs share the same audio encode, FMP4 rungs reference the audio rendition instead
+            audio_description_names=[] if self.container == "FMP4" else ["audio_desc_private"],
+        )
+
+    def _hls_audio_output(self, suffix: str = "") -> medialive.CfnChannel.OutputProperty:
+        # Audio rendition for FMP4, listed in the master playlist under the "program_audio" group
+        return medialive.CfnChannel.OutputProperty(
+            output_settings=medialive.CfnChannel.OutputSettingsProperty(
+                hls_output_settings=medialive.CfnChannel.HlsOutputSettingsProperty(
+                    name_modifier="_audio",
+                    hls_settings=medialive.CfnChannel.HlsSettingsProperty(
+                        audio_only_hls_settings=medialive.CfnChannel.AudioOnlyHlsSettingsProperty(
+                            audio_group_id="program_audio",
+                            audio_track_type="ALTERNATE_AUDIO_AUTO_SELECT_DEFAULT",
+                            segment_type="FMP4"
+                        )
+                    )
+                ),
+            ),
+            output_name=f"audio_program{suffix}",
+            audio_description_names=["audio_desc_private"],
+        )
+
+    def _video_description(self, rung: dict) -> medialive.CfnChannel.VideoDescriptionProperty:
+        baseline = rung["profile"] == "BASELINE"  # Baseline profile supports neither CABAC nor B-frames
+        return medialive.CfnChannel.VideoDescriptionProperty(
+            name=f"video_desc_{rung['name']}",
+            height=rung["height"],
+            width=rung["width"],
+            respond_to_afd="NONE",
+            sharpness=50,
+            scaling_behavior="DEFAULT",
+            codec_settings=medialive.CfnChannel.VideoCodecSettingsProperty(
+                h264_settings=medialive.CfnChannel.H264SettingsProperty(
+                    afd_signaling="NONE",
+                    color_metadata="INSERT",
+                    adaptive_quantization="AUTO",
+                    entropy_encoding="CAVLC" if baseline else "CABAC",
+                    flicker_aq="ENABLED",
+                    force_field_pictures="DISABLED",
+                    framerate_control="INITIALIZE_FROM_SOURCE",
+                    gop_b_reference="DISABLED",
+                    gop_closed_cadence=1,
+                    gop_num_b_frames=0 if baseline else 1,
+                    gop_size=rung["gop_size"],
+                    gop_size_units=rung["gop_size_units"],
+                    subgop_length="FIXED",
+                    scan_type="PROGRESSIVE",
+                    level="H264_LEVEL_AUTO",
+                    look_ahead_rate_control=self.latency["look_ahead_rate_control"],
+                    num_ref_frames=1,
+                    par_control="INITIALIZE_FROM_SOURCE",
+                    profile=rung["profile"],
+                    syntax="DEFAULT",
+                    scene_change_detect="ENABLED",
+                    spatial_aq="ENABLED",
+                    temporal_aq="ENABLED",
+                    timecode_insertion="DISABLED",
+                    **self.rate_settings[rung["name"]]     # rate_control_mode, bitrate, max_bitrate, qvbr_quality_level
+                )
+            )
+        )
\ No newline at end of file
@@ -0,0 +1,206 @@
+from aws_cdk import (
+    Duration,
+    NestedStack,
+    CfnOutput,
+    aws_cloudwatch as cloudwatch,
+    aws_s3 as s3
+)
+from constructs import Construct
+from app.api_nested_stack import ApiNestedStack
+from app.medialive_nested_stack import ARCHIVE_OUTPUT_GROUP_NAME, MediaLiveNestedStack
+from app.storage_nested_stack import StorageNestedStack
+
+# Alarm thresholds, override any of them with the alarm_thresholds argument
+ALARM_THRESHOLDS = {
+    "api_latency_p99_ms": 1000,         # Manifests and segments, as seen by the player
+    "api_4xx_errors": 50,               # Per 5 minutes, e.g. players asking for segments that already rolled off
+    "api_5xx_errors": 5,                # Per 5 minutes
+    "api_cache_hit_ratio_percent": 80,  # Only when the stage cache is enabled
+    "manifest_refresh_errors": 5,       # Per 5 minutes, only with the manifest origin, e.g. refreshes answered from the cache
+    "medialive_input_loss_seconds": 0,  # Any input loss is an outage for viewers
+    "medialive_dropped_frames": 0,
+    "medialive_output_errors": 0,       # 4xx and 5xx errors writing to S3
+    "s3_5xx_errors": 5,                 # Per 5 minutes on the media prefix
+}
+
+ALARM_PERIOD = Duration.minutes(5)
+MEDIALIVE_NAMESPACE = "AWS/MediaLive"
+QOE_NAMESPACE = "ProtectedStreaming/QoE"   # Written by lambda/qoe_beacons, with the manifest path as the Stream dimension
+
+
+class MonitoringNestedStack(NestedStack):
+
+    def __init__(self,
+            scope: Construct,
+            construct_id: str,
+            gateway: ApiNestedStack,
+            storage: StorageNestedStack,
+            channels: list,
+            stack_name = str,
+            alarm_thresholds: dict = None,
+            **kwargs) -> None:
+
+        super().__init__(scope, construct_id, **kwargs)
+
+        unknown = set(alarm_thresholds or {}) - set(ALARM_THRESHOLDS)
+        if unknown:
+            raise ValueError(f"Unknown alarm thresholds {sorted(unknown)}, expected some of {list(ALARM_THRESHOLDS)}")
+        self.thresholds = {**ALARM_THRESHOLDS, **(alarm_thresholds or {})}
+        self.alarms = []        # Add alarm actions, e.g. an SNS topic, to these
+
+        stage = gateway.api.deployment_stage
+        bucket = storage.media_bucket
+
+        dashboard = cloudwatch.Dashboard(self, "StreamingDashboard",
+            dashboard_name=f"{stack_name}_streaming",
+            default_interval=Duration.hours(3)
+        )
+
+        ### API Gateway ###
+
+        latency_p99 = stage.metric_latency(statistic="p99", period=ALARM_PERIOD)
+        errors_4xx = stage.metric_client_error(statistic="Sum", period=ALARM_PERIOD)
+        errors_5xx = stage.metric_server_error(statistic="Sum", period=ALARM_PERIOD)
+        self._alarm("ApiLatencyAlarm", latency_p99, "api_latency_p99_ms", "API p99 latency above {} ms")
+        self._alarm("Api4xxAlarm", errors_4xx, "api_4xx_errors", "More than {} API 4xx errors in 5 minutes")
+        self._alarm("Api5xxAlarm", errors_5xx, "api_5xx_errors", "More than {} API 5xx errors in 5 minutes")
+
+        api_widgets = [
+            cloudwatch.GraphWidget(title="API latency (ms)", width=8,
+                left=[stage.metric_latency(statistic="p50"), latency_p99, stage.metric_integration_latency(statistic="p99")]),
+            cloudwatch.GraphWidget(title="API errors", width=8, left=[errors_4xx, errors_5xx])
+        ]
+        if gateway.caching_enabled:
+            cache_hit_ratio = cloudwatch.MathExpression(
+                expression="100 * hits / (hits + misses)",
+                using_metrics={
+                    "hits": stage.metric_cache_hit_count(statistic="Sum", period=ALARM_PERIOD),
+                    "misses": stage.metric_cache_miss_count(statistic="Sum", period=ALARM_PERIOD)
+                },
+                label="Cache hit ratio (%)",
+                period=ALARM_PERIOD
+            )
+            self._alarm("ApiCacheHitRatioAlarm", cache_hit_ratio, "api_cache_hit_ratio_percent", "API cache hit ratio below {}%",
+                comparison_operator=cloudwatch.ComparisonOperator.LESS_THAN_THRESHOLD)
+            api_widgets.append(cloudwatch.GraphWidget(title="API cache hit ratio (%)", width=8, left=[cache_hit_ratio],
+                left_y_axis=cloudwatch.YAxisProps(min=0, max=100)))
+        if gateway.manifest_refresher is not None:
+            refresh_errors = gateway.manifest_refresher.metric_errors(statistic="Sum", period=ALARM_PERIOD)
+            self._alarm("ManifestRefreshErrorsAlarm", refresh_errors, "manifest_refresh_errors",
+                "More than {} failed playlist cache refreshes in 5 minutes")
+            api_widgets.append(cloudwatch.GraphWidget(title="Playlist cache refreshes", width=8,
+                left=[gateway.manifest_refresher.metric_invocations(statistic="Sum", period=ALARM_PERIOD), refresh_errors]))
+        dashboard.add_widgets(cloudwatch.TextWidget(markdown="## private-stream-api", width=24, height=1))
+        dashboard.add_widgets(*api_widgets)
+
+        ### Player QoE, one line per stream ###
+
+        if gateway.qoe_beacons is not None:
+            def qoe_search(metric_name: str, statistic: str) -> cloudwatch.MathExpression:
+                # Streams are only known once players report them, so the widgets search for every Stream dimension
+                return cloudwatch.MathExpression(
+                    expression=f"SEARCH('{{{QOE_NAMESPACE},Stream}} MetricName=\"{metric_name}\"', '{statistic}', 300)",
+                    using_metrics={},
+                    label=metric_name,
+                    period=ALARM_PERIOD
+                )
+            dashboard.add_widgets(cloudwatch.TextWidget(markdown="## Player QoE", width=24, height=1))
+            dashboard.add_widgets(
+                cloudwatch.GraphWidget(title="Startup and time to first frame p90 (ms)", width=6,
+                    left=[qoe_search("StartupTime", "p90"), qoe_search("TimeToFirstFrame", "p90")]),
+                cloudwatch.GraphWidget(title="Rebuffers", width=6,
+                    left=[qoe_search("RebufferCount", "Sum")], right=[qoe_search("RebufferDuration", "Sum")]),
+                cloudwatch.GraphWidget(title="Bitrate switches", width=6, left=[qoe_search("BitrateSwitches", "Sum")]),
+                cloudwatch.GraphWidget(title="Segment throughput p10 (bits/s)", width=6, left=[qoe_search("SegmentThroughput", "p10")])
+            )
+
+        ### MediaLive, one row per channel ###
+
+        for channel in channels:
+            self._add_channel(dashboard, channel, bucket)
+
+        dashboard.add_widgets(cloudwatch.AlarmStatusWidget(title="Alarms", alarms=self.alarms, width=24))
+
+        # Outputs
+        CfnOutput(self, "DashboardName", value=dashboard.dashboard_name)
+
+    def _add_channel(self, dashboard: cloudwatch.Dashboard, channel: MediaLiveNestedStack, bucket: s3.Bucket) -> None:
+        channel_id = channel.my_medialive_tx_channel.ref
+        pipelines = ["0", "1"] if channel.redundant else ["0"]
+
+        def medialive_metric(name: str, pipeline: str, **dimensions) -> cloudwatch.Metric:
+            return cloudwatch.Metric(
+                namespace=MEDIALIVE_NAMESPACE,
+                metric_name=name,
+                dimensions_map={"ChannelId": channel_id, "Pipeline": pipeline, **dimensions},
+                statistic="Sum",
+                period=ALARM_PERIOD,
+                label=" ".join([name, *dimensions.values(), "pipeline", pipeline])   # e.g. Output4xxErrors HLS_archive pipeline 0
+            )
+
+        input_loss = [medialive_metric("InputLossSeconds", pipeline) for pipeline in pipelines]
+        dropped_frames = [medialive_metric("DroppedFrames", pipeline) for pipeline in pipelines]
+        # Each output group writes to S3 on its own, the archive group can fail while the live group keeps working
+        output_errors = [
+            (group, medialive_metric(name, pipeline, OutputGroupName=group))
+            for group in channel.output_group_names for pipeline in pipelines for name in ("Output4xxErrors", "Output5xxErrors")
+        ]
+        for pipeline, metric in zip(pipelines, input_loss):
+            self._alarm(f"InputLossAlarm-{channel.channel_name}-{pipeline}", metric, "medialive_input_loss_seconds",
+                f"{channel.channel_name} pipeline {pipeline} lost its input for more than {{}} seconds")
+        for pipeline, metric in zip(pipelines, dropped_frames):
+            self._alarm(f"DroppedFramesAlarm-{channel.channel_name}-{pipeline}", metric, "medialive_dropped_frames",
+                f"{channel.channel_name} pipeline {pipeline} dropped more than {{}} frames")
+        for group, metric in output_errors:
+            archive = group == ARCHIVE_OUTPUT_GROUP_NAME
+            self._alarm(f"{metric.metric_name}Alarm-{channel.channel_name}-{'archive-' if archive else ''}{metric.dimensions['Pipeline']}",
+                metric, "medialive_output_errors",
+                f"{channel.channel_name} pipeline {metric.dimensions['Pipeline']} had more than {{}} {metric.metric_name} writing "
+                f"{'the archive' if archive else 'the live stream'} to S3")
+
+        # S3 request metrics are only published for prefixes with a metrics configuration on the bucket
+        destinations = [channel.media_destinations[name] for name in (["primary", "secondary"] if channel.redundant else ["primary"])]
+        s3_widgets = []
+        for destination in destinations:
+            filter_id = f"{channel.channel_name}{destination.replace('/', '-')}"
+            bucket.add_metric(id=filter_id, prefix=destination.lstrip("/"))
+
+            def s3_metric(name: str, statistic: str = "Sum") -> cloudwatch.Metric:
+                return cloudwatch.Metric(
+                    namespace="AWS/S3",
+                    metric_name=name,
+                    dimensions_map={"BucketName": bucket.bucket_name, "FilterId": filter_id},
+                    statistic=statistic,
+                    period=ALARM_PERIOD,
+                    label=f"{name} {destination}"
+                )
+
+            self._alarm(f"S35xxAlarm-{filter_id}", s3_metric("5xxErrors"), "s3_5xx_errors", f"More than {{}} S3 5xx errors on {destination}")
+            s3_widgets += [
+                cloudwatch.GraphWidget(title=f"S3 requests {destination}", width=8,
+                    left=[s3_metric("GetRequests"), s3_metric("PutRequests"), s3_metric("4xxErrors"), s3_metric("5xxErrors")]),
+                cloudwatch.GraphWidget(title=f"S3 latency {destination} (ms)", width=8,
+                    left=[s3_metric("FirstByteLatency", "p99"), s3_metric("TotalRequestLatency", "p99")])
+            ]
+
+        dashboard.add_widgets(cloudwatch.TextWidget(markdown=f"## {channel.channel_name}", width=24, height=1))
+        dashboard.add_widgets(
+            cloudwatch.GraphWidget(title="Input loss (seconds)", width=8, left=input_loss),
+            cloudwatch.GraphWidget(title="Dropped frames", width=8, left=dropped_frames),
+            cloudwatch.GraphWidget(title="Output errors", width=8, left=[metric for _, metric in output_errors])
+        )
+        dashboard.add_widgets(*s3_widgets)
+
+    def _alarm(self, construct_id: str, metric: cloudwatch.IMetric, threshold_name: str, description: str,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD) -> cloudwatch.Alarm:
+        threshold = self.thresholds[threshold_name]
+        alarm = cloudwatch.Alarm(self, construct_id,
+            metric=metric,
+            threshold=threshold,
+            evaluation_periods=1,
+            comparison_operator=comparison_operator,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,    # No traffic is not an error
+            alarm_description=description.format(threshold)
+        )
+        self.alarms.append(alarm)
+        return alarm
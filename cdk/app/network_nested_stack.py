@@ -14,6 +14,7 @@ class NetworkNestedStack(NestedStack):
             stack_name = str,
             client_vpn_cert = str,
             server_vpn_cert = str,
+            s3_interface_endpoint: bool = False,
             **kwargs) -> None:
 
         super().__init__(scope, construct_id, **kwargs)
@@ -46,4 +47,11 @@ class NetworkNestedStack(NestedStack):
             client_certificate_arn=client_vpn_cert,
         )
 
-        self.s3_vpc_gateway_endpoint = self.vpc.add_gateway_endpoint("MediaBucketEndpoint", service=ec2.GatewayVpcEndpointAwsService.S3) # Endpoint is routable from all subnets in VPC by default
\ No newline at end of file
+        self.s3_vpc_gateway_endpoint = self.vpc.add_gateway_endpoint("MediaBucketEndpoint", service=ec2.GatewayVpcEndpointAwsService.S3) # Endpoint is routable from all subnets in VPC by default
+
+        # Interface endpoint for players fetching segments straight from S3 over the VPN (redirect delivery mode).
+        # Gateway endpoints are only reachable from inside the VPC, interface endpoints have IPs that VPN clients can route to.
+        self.s3_vpc_interface_endpoint = self.vpc.add_interface_endpoint("MediaBucketInterfaceEndpoint",
+            service=ec2.InterfaceVpcEndpointAwsService.S3,
+            private_dns_enabled=False       # Clients use the endpoint specific DNS name, the gateway endpoint keeps serving the VPC
+        ) if s3_interface_endpoint else None
\ No newline at end of file
@@ -0,0 +1,75 @@
+from app.renditions import MIN_BITRATE, MAX_BITRATE
+
+# H.264 rate control for the MediaLive channel, applied to every rendition of the ladder.
+# CBR spends each rung's full bitrate on every frame. VBR and QVBR spend less on content that barely moves,
+# such as slides and screen shares, which cuts the bytes served through the API and the VPN.
+RATE_CONTROL_PRESETS = {
+    # Every rung at exactly its ladder bitrate
+    "cbr": {"mode": "CBR"},
+    # Camera content: constant quality, never above the ladder bitrate
+    "camera": {"mode": "QVBR", "quality_level": 7, "max_bitrate_percent": 100},
+    # Slides and screen shares: little motion, so a lower cap, and a higher quality level keeps text sharp
+    "slides": {"mode": "QVBR", "quality_level": 8, "max_bitrate_percent": 50},
+}
+
+RATE_CONTROL_MODES = ["CBR", "VBR", "QVBR"]
+QVBR_QUALITY_LEVELS = range(1, 11)
+
+
+def resolve_rate_control(rate_control) -> dict:
+    """Returns the settings for a rate control preset name, or checks a custom rate control dict.
+
+    {"mode": "QVBR", "quality_level": 7, "max_bitrate_percent": 100}. max_bitrate_percent is the cap
+    of VBR and QVBR rungs as a percentage of the ladder bitrate, a rung's own max_bitrate overrides it.
+    """
+    if isinstance(rate_control, str):
+        if rate_control not in RATE_CONTROL_PRESETS:
+            raise ValueError(f"Unknown rate control preset {rate_control!r}, choose one of {list(RATE_CONTROL_PRESETS)}")
+        return dict(RATE_CONTROL_PRESETS[rate_control])
+
+    settings = dict(rate_control)
+    mode = settings.get("mode")
+    if mode not in RATE_CONTROL_MODES:
+        raise ValueError(f"Rate control mode must be one of {RATE_CONTROL_MODES}, got {mode!r}")
+    allowed = {"CBR": ["mode"], "VBR": ["mode", "max_bitrate_percent"], "QVBR": ["mode", "quality_level", "max_bitrate_percent"]}[mode]
+    unknown = [key for key in settings if key not in allowed]
+    if unknown:
+        raise ValueError(f"Rate control mode {mode} does not take {unknown}")
+    if mode == "CBR":
+        return settings
+
+    percent = settings.setdefault("max_bitrate_percent", 100)
+    if not isinstance(percent, int) or isinstance(percent, bool) or percent < 1:
+        raise ValueError(f"Rate control max_bitrate_percent must be a positive integer, got {percent!r}")
+    # VBR keeps the ladder bitrate as its average, so the peak can not be below it
+    if mode == "VBR" and percent < 100:
+        raise ValueError(f"VBR max_bitrate_percent must be at least 100, the ladder bitrate is the average, got {percent}")
+    if mode == "QVBR" and settings.get("quality_level") not in QVBR_QUALITY_LEVELS:
+        raise ValueError(f"QVBR quality_level must be a whole number from 1 to 10, got {settings.get('quality_level')!r}")
+    return settings
+
+
+def h264_rate_settings(settings: dict, rung: dict) -> dict:
+    """Returns the H264Settings rate control properties of one rendition.
+
+    QVBR leaves out the bitrate, MediaLive only uses the cap and the quality level.
+    """
+    mode = settings["mode"]
+    if mode == "CBR":
+        if "max_bitrate" in rung:
+            raise ValueError(f"Rendition {rung['name']!r} sets max_bitrate, which only applies to VBR and QVBR rate control")
+        return {"rate_control_mode": "CBR", "bitrate": rung["bitrate"]}
+
+    max_bitrate = rung.get("max_bitrate", rung["bitrate"] * settings["max_bitrate_percent"] // 100)
+    if not MIN_BITRATE <= max_bitrate <= MAX_BITRATE:
+        raise ValueError(f"Rendition {rung['name']!r} max bitrate {max_bitrate} must be between {MIN_BITRATE} and {MAX_BITRATE} bps")
+    if mode == "VBR":
+        if max_bitrate < rung["bitrate"]:
+            raise ValueError(f"Rendition {rung['name']!r} max_bitrate must not be below its VBR average bitrate {rung['bitrate']}")
+        return {"rate_control_mode": "VBR", "bitrate": rung["bitrate"], "max_bitrate": max_bitrate}
+    return {"rate_control_mode": "QVBR", "max_bitrate": max_bitrate, "qvbr_quality_level": settings["quality_level"]}
+
+
+def peak_bitrate(h264_settings: dict) -> int:
+    """Highest bitrate of a synthesized H264Settings block: MaxBitrate for VBR and QVBR, Bitrate for CBR."""
+    return h264_settings.get("MaxBitrate", h264_settings.get("Bitrate"))
@@ -0,0 +1,71 @@
+import re
+
+# Adaptive bitrate ladder used by the MediaLive channel when no ladder is passed in.
+# Each rung becomes one video description and one output in the HLS output group,
+# and MediaLive writes a master playlist (media.m3u8) that lists every rung.
+DEFAULT_RENDITION_LADDER = [
+    {"name": "1080p", "width": 1920, "height": 1080, "bitrate": 6000000, "profile": "HIGH"},
+    {"name": "720p", "width": 1280, "height": 720, "bitrate": 3000000, "profile": "MAIN"},
+    {"name": "540p", "width": 960, "height": 540, "bitrate": 1500000, "profile": "MAIN"},
+    {"name": "360p", "width": 640, "height": 360, "bitrate": 800000, "profile": "BASELINE"},
+]
+
+H264_PROFILES = ["BASELINE", "MAIN", "HIGH"]
+GOP_SIZE_UNITS = ["FRAMES", "SECONDS"]
+MIN_BITRATE = 1000          # MediaLive H.264 bitrate limits, in bits per second
+MAX_BITRATE = 80000000
+MAX_RENDITIONS = 10
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")  # Used as a name modifier, so it ends up in object keys
+
+
+def validate_rendition_ladder(ladder: list) -> list:
+    """Checks a rendition ladder and returns it with defaults filled in.
+
+    Raises ValueError at synth time so an invalid ladder never reaches MediaLive.
+    Rungs must be ordered from the highest to the lowest bitrate. gop_size and
+    gop_size_units are optional, rungs without them use the channel latency profile.
+    max_bitrate is optional, it caps VBR and QVBR rungs (see app/rate_control.py).
+    """
+    if not ladder:
+        raise ValueError("The rendition ladder needs at least one rung")
+    if len(ladder) > MAX_RENDITIONS:
+        raise ValueError(f"The rendition ladder has {len(ladder)} rungs, the maximum is {MAX_RENDITIONS}")
+
+    rungs = []
+    names = set()
+    for rung in ladder:
+        rung = {"profile": "MAIN", **rung}
+        name = rung.get("name")
+        if not name or not _NAME_PATTERN.match(str(name)):
+            raise ValueError(f"Rendition name {name!r} may only contain letters, numbers, hyphens and underscores")
+        if name in names:
+            raise ValueError(f"Rendition name {name!r} is used more than once")
+        names.add(name)
+
+        for key in ("width", "height", "bitrate"):
+            if not isinstance(rung.get(key), int) or rung[key] <= 0:
+                raise ValueError(f"Rendition {name!r} needs a positive integer {key}")
+        if rung["width"] % 2 or rung["height"] % 2:
+            raise ValueError(f"Rendition {name!r} width and height must be even numbers")
+        if not MIN_BITRATE <= rung["bitrate"] <= MAX_BITRATE:
+            raise ValueError(f"Rendition {name!r} bitrate must be between {MIN_BITRATE} and {MAX_BITRATE} bps")
+        if rung["profile"] not in H264_PROFILES:
+            raise ValueError(f"Rendition {name!r} profile must be one of {H264_PROFILES}")
+        if "max_bitrate" in rung and (not isinstance(rung["max_bitrate"], int) or not MIN_BITRATE <= rung["max_bitrate"] <= MAX_BITRATE):
+            raise ValueError(f"Rendition {name!r} max_bitrate must be between {MIN_BITRATE} and {MAX_BITRATE} bps")
+        if ("gop_size" in rung) != ("gop_size_units" in rung):
+            raise ValueError(f"Rendition {name!r} must set gop_size and gop_size_units together")
+        if "gop_size_units" in rung and rung["gop_size_units"] not in GOP_SIZE_UNITS:
+            raise ValueError(f"Rendition {name!r} gop_size_units must be one of {GOP_SIZE_UNITS}")
+        if "gop_size" in rung and rung["gop_size"] <= 0:
+            raise ValueError(f"Rendition {name!r} needs a positive gop_size")
+        rungs.append(rung)
+
+    for higher, lower in zip(rungs, rungs[1:]):
+        if lower["bitrate"] >= higher["bitrate"]:
+            raise ValueError(f"Rendition {lower['name']!r} must have a lower bitrate than {higher['name']!r}")
+        if lower["height"] > higher["height"] or lower["width"] > higher["width"]:
+            raise ValueError(f"Rendition {lower['name']!r} must not be larger than {higher['name']!r}")
+
+    return rungs
@@ -1,5 +1,6 @@
 from aws_cdk import (
     CfnOutput,
+    Duration,
     NestedStack,
     RemovalPolicy,
     aws_s3 as s3,
@@ -18,6 +19,8 @@ class StorageNestedStack(NestedStack):
             security: IamNestedStack,
             network: NetworkNestedStack, 
             stack_name = str,
+            event_bridge_enabled: bool = False,
+            lifecycle_rules: list = None,
             **kwargs) -> None:
         
         super().__init__(scope, construct_id, **kwargs)
@@ -27,7 +30,9 @@ class StorageNestedStack(NestedStack):
             "MediaBucket",
             removal_policy=RemovalPolicy.DESTROY,   # Remove if you wish for the media bucket to remain after you have destroyed the stack
             auto_delete_objects=True,                # Remove if you wish for the media bucket to remain after you have destroyed the stack
-            enforce_ssl=True
+            enforce_ssl=True,
+            event_bridge_enabled=event_bridge_enabled,  # Object created events drive the manifest origin in the API stack
+            lifecycle_rules=self._lifecycle_rules(lifecycle_rules or [])
         )
         self._bucket_name = self.media_bucket.bucket_name
         
@@ -37,6 +42,24 @@ class StorageNestedStack(NestedStack):
         security.vpc_s3_gw_endpoint_policy.add_resources(self.media_bucket.bucket_arn+"/*")
         network.s3_vpc_gateway_endpoint.add_to_policy(statement=security.vpc_s3_gw_endpoint_policy)
 
+        if network.s3_vpc_interface_endpoint is not None:
+            # Viewers only read objects of the media bucket through the interface endpoint, with presigned URLs
+            network.s3_vpc_interface_endpoint.add_to_policy(statement=iam.PolicyStatement(
+                principals=[iam.AnyPrincipal()],
+                effect=iam.Effect.ALLOW,
+                actions=["s3:GetObject"],
+                resources=[self.media_bucket.arn_for_objects("*")]
+            ))
+            # The player page is served by the API, so segment requests to the endpoint are cross origin.
+            # Access is controlled by the presigned URL, which CORS does not weaken.
+            self.media_bucket.add_cors_rule(
+                allowed_methods=[s3.HttpMethods.GET, s3.HttpMethods.HEAD],
+                allowed_origins=["*"],
+                allowed_headers=["Range"],
+                exposed_headers=["Content-Range", "Content-Length", "ETag"],
+                max_age=3600
+            )
+
         # Bucket specific resource restrictions added to API Gateway service role
         security.apigw_svc_policy.add_resources(self.media_bucket.bucket_arn)
         security.apigw_svc_policy.add_resources(self.media_bucket.bucket_arn+"/*")
@@ -45,6 +68,36 @@ class StorageNestedStack(NestedStack):
         # Outputs
         CfnOutput(self, "MediaBucketName", value=self._bucket_name)
     
+    def _lifecycle_rules(self, rules: list) -> list:
+        # rules come from load_channel_config: {"prefix", "expire_days", "transitions"} and for live folders
+        # "object_size_greater_than" and "manifest_expire_days", checked by app/lifecycle.py
+        prefixes = [rule["prefix"] for rule in rules]
+        overlapping = [(a, b) for a in prefixes for b in prefixes if a != b and b.startswith(a)]
+        if len(set(prefixes)) != len(prefixes) or overlapping:
+            raise ValueError(f"Lifecycle rule prefixes must not repeat or contain each other, got {prefixes}")
+        return [
+            # Uploads MediaLive abandons when a pipeline stops mid segment
+            s3.LifecycleRule(id="AbortIncompleteUploads", abort_incomplete_multipart_upload_after=Duration.days(1))
+        ] + [
+            s3.LifecycleRule(
+                id=f"Media-{rule['prefix'].strip('/').replace('/', '-') or 'root'}",
+                prefix=rule["prefix"],
+                object_size_greater_than=rule.get("object_size_greater_than"),
+                expiration=Duration.days(rule["expire_days"]) if rule["expire_days"] else None,
+                transitions=[
+                    s3.Transition(storage_class=s3.StorageClass(transition["storage_class"]), transition_after=Duration.days(transition["days"]))
+                    for transition in rule["transitions"]
+                ] or None
+            ) for rule in rules if rule["expire_days"] or rule["transitions"]
+        ] + [
+            # Every object of a live folder, including the write-once ones the rule above skips, once the channel has stopped
+            s3.LifecycleRule(
+                id=f"Manifests-{rule['prefix'].strip('/').replace('/', '-') or 'root'}",
+                prefix=rule["prefix"],
+                expiration=Duration.days(rule["manifest_expire_days"])
+            ) for rule in rules if rule.get("manifest_expire_days")
+        ]
+
     def get_bucket_name(self):
         return self._bucket_name
     
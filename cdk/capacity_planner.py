@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Estimates the origin load of the channels in channels.json for a number of concurrent viewers.
+
+The channel settings are read from the synthesized MediaLive templates, so the numbers always match
+what would be deployed. Runs offline, no AWS credentials are needed.
+
+    python3 capacity_planner.py --viewers 500
+    python3 capacity_planner.py --viewers 2000 --api-cache --json
+"""
+import argparse
+import json
+import os
+from app.local_synth import synthesize_channels
+from app.capacity import LIMITS, channel_profile, plan, fleet_checks
+from app.medialive_nested_stack import DEFAULT_SOURCE_FRAME_RATE
+
+
+def print_table(plans: list, checks: list) -> None:
+    metric_names = list(plans[0]["metrics"])
+    width = max(len(name) for name in metric_names)
+    for channel_plan in plans:
+        print()
+        for name in metric_names:
+            print(f"{name:<{width}}  {channel_plan['metrics'].get(name, '')}")
+    print()
+    check_width = max(len(check["check"]) for check in checks)
+    for check in checks:
+        note = f"  ({check['note']})" if check["note"] else ""
+        print(f"{check['check']:<{check_width}}  {check['usage_percent']:>7}%  {check['status']}{note}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Estimate origin load for the configured channels.")
+    parser.add_argument("--viewers", type=int, required=True, help="concurrent viewers per channel")
+    parser.add_argument("--channels-config", default=os.path.join(os.path.dirname(__file__), "channels.json"))
+    parser.add_argument("--api-cache", action="store_true", help="the API stage cache is enabled (cache_cluster_size in app.py)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    plans = [
+        plan(channel_profile(properties, channel["settings"].get("source_frame_rate", DEFAULT_SOURCE_FRAME_RATE)), args.viewers, args.api_cache)
+        for channel, properties in synthesize_channels(args.channels_config)
+    ]
+    checks = [check for channel_plan in plans for check in channel_plan["checks"]] + fleet_checks(plans)
+
+    if args.json:
+        print(json.dumps({"limits": LIMITS, "channels": [channel_plan["metrics"] for channel_plan in plans], "checks": checks}, indent=2))
+    else:
+        print_table(plans, checks)
+    # Non zero exit code when a limit is exceeded, so the planner can gate a pipeline
+    return 1 if any(check["status"] == "EXCEEDED" for check in checks) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
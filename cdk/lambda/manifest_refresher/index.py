@@ -0,0 +1,81 @@
+"""Refreshes the API stage cache entry of a playlist as soon as MediaLive writes it to S3.
+
+Triggered by EventBridge "Object Created" events from the media bucket. For each new .m3u8 object it
+sends a signed GET with "Cache-Control: max-age=0" to the same path on private-stream-api, which makes
+API Gateway fetch the playlist from S3 once and keep serving it from the stage cache to every viewer.
+
+API Gateway only honours max-age=0 from callers allowed execute-api:InvalidateCache by the resource policy,
+anyone else gets the cached playlist back without an error. So the function checks the ETag of every refresh
+response against the ETag of the object in the event and fails when the stage answered with an older playlist,
+which shows up in the Errors metric of the function and the refresher alarm of the monitoring stack.
+
+Tested in cdk/tests/unit/test_manifest_refresher.py.
+"""
+import os
+import urllib.request
+
+REFRESH_TIMEOUT = 5     # Seconds, a playlist is rewritten every segment so a slow refresh is not retried
+
+
+class StaleRefresh(Exception):
+    """The stage answered a refresh with a cached playlist instead of the object just written."""
+
+
+def manifest_keys(event: dict) -> list:
+    """Returns the playlist object keys in an S3 "Object Created" EventBridge event."""
+    key = event.get("detail", {}).get("object", {}).get("key", "")
+    return [key] if key.endswith(".m3u8") else []
+
+
+def written_etag(event: dict) -> str:
+    """ETag of the object in the event, empty when the event has none."""
+    return event.get("detail", {}).get("object", {}).get("etag", "").strip('"')
+
+
+def refresh_request(api_url: str, key: str) -> urllib.request.Request:
+    # max-age=0 tells API Gateway to replace the cache entry with a fresh response from S3
+    return urllib.request.Request(f"{api_url.rstrip('/')}/{key}", headers={"Cache-Control": "max-age=0"})
+
+
+def sign(request: urllib.request.Request, region: str) -> urllib.request.Request:
+    """Signs the request with the function role, which is allowed to invalidate the stage cache."""
+    import botocore.session
+    from botocore.auth import SigV4Auth
+    from botocore.awsrequest import AWSRequest
+
+    aws_request = AWSRequest(method="GET", url=request.full_url, headers=dict(request.header_items()))
+    SigV4Auth(botocore.session.get_session().get_credentials(), "execute-api", region).add_auth(aws_request)
+    return urllib.request.Request(request.full_url, headers=dict(aws_request.headers))
+
+
+def refresh(event: dict, api_url: str, send) -> list:
+    """Refreshes every playlist in the event with send(request) and returns the refreshed URLs.
+
+    send returns the ETag of the response. Raises StaleRefresh when it is not the ETag of the object in
+    the event. MediaLive rewriting the playlist again before the refresh arrives also fails the check,
+    at one write per segment that is rare, a steady stream of failures means the cache is not refreshed.
+    """
+    refreshed = []
+    expected = written_etag(event)
+    for key in manifest_keys(event):
+        request = refresh_request(api_url, key)
+        etag = (send(request) or "").strip('"')
+        if expected and etag != expected:
+            raise StaleRefresh(f"{request.full_url} answered with ETag {etag or 'none'}, the object written has {expected}")
+        refreshed.append(request.full_url)
+    return refreshed
+
+
+def _send(request: urllib.request.Request) -> str:
+    with urllib.request.urlopen(request, timeout=REFRESH_TIMEOUT) as response:
+        response.read()
+        return response.headers.get("ETag", "")
+
+
+def handler(event, context):
+    region = os.environ["AWS_REGION"]
+
+    def send(request):
+        return _send(sign(request, region))
+
+    return {"refreshed": refresh(event, os.environ["API_URL"], send)}
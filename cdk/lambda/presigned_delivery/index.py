@@ -0,0 +1,113 @@
+"""Serves playlists whose segments point straight at S3 through the private S3 interface endpoint.
+
+Handles the manifest and segment routes of private-stream-api in the "redirect" delivery mode:
+- playlists are read from the media bucket and every segment (and EXT-X-MAP) URI is replaced with a
+  short lived presigned URL on the interface endpoint, so segment bodies never pass through API Gateway
+- a segment requested through the API is answered with a redirect to the same presigned URL
+
+Variant playlist URIs in a master playlist are left relative, so players keep loading them through the API.
+
+URIs that are absolute (with a scheme, or from the root of the API) are left as they are.
+
+The rewriting is tested in cdk/tests/unit/test_presigned_delivery.py. Rewrite a playlist from disk with a fake
+presigner and no AWS access:
+
+    python3 index.py ../../emulator-output/pipe-1/media_720p.m3u8 pipe-1/media_720p.m3u8
+"""
+import os
+import posixpath
+import sys
+from urllib.parse import urlencode, urlsplit
+
+PLAYLIST_SUFFIX = ".m3u8"
+
+
+def resolve_key(playlist_key: str, uri: str) -> str:
+    """Returns the object key of a URI found in the playlist stored at playlist_key."""
+    return posixpath.normpath(posixpath.join(posixpath.dirname(playlist_key), uri))
+
+
+def relative(uri: str) -> bool:
+    """True for URIs relative to the playlist, the ones that name objects next to it in the bucket."""
+    return not urlsplit(uri).scheme and not uri.startswith("/")
+
+
+def rewrite_playlist(text: str, playlist_key: str, presign) -> str:
+    """Replaces relative segment and initialization section URIs with presign(object_key)."""
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#EXT-X-MAP:") and 'URI="' in stripped:
+            # #EXT-X-MAP:URI="media_720p_init.mp4"[,BYTERANGE="..."]
+            before, uri_and_rest = stripped.split('URI="', 1)
+            uri, rest = uri_and_rest.split('"', 1)
+            if relative(uri):
+                line = f'{before}URI="{presign(resolve_key(playlist_key, uri))}"{rest}'
+        elif stripped and not stripped.startswith("#") and not stripped.split("?")[0].endswith(PLAYLIST_SUFFIX) and relative(stripped):
+            line = presign(resolve_key(playlist_key, stripped))
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def allowed(key: str, prefixes: list) -> bool:
+    return any(key.startswith(prefix + "/") for prefix in prefixes)
+
+
+# Clients are created on the first invocation and reused by every later one in the same execution environment,
+# creating them takes longer than presigning a URL. Not at import time, so the local self check needs no boto3.
+_clients = {}
+
+
+def _s3_clients() -> dict:
+    if not _clients:
+        import boto3
+        from botocore.config import Config
+
+        # Path style addressing on the endpoint specific DNS name, see "Accessing buckets from S3 interface endpoints"
+        endpoint_dns = os.environ["S3_ENDPOINT_DNS"].split(":")[-1].removeprefix("*.")
+        _clients["presign"] = boto3.client("s3", endpoint_url=f"https://bucket.{endpoint_dns}",
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}))
+        _clients["read"] = boto3.client("s3")       # Playlists are read over the gateway endpoint
+    return _clients
+
+
+def handler(event, context):
+    bucket = os.environ["BUCKET"]
+    expiry = int(os.environ["PRESIGN_EXPIRY"])
+    key = event["path"].lstrip("/")
+    if not allowed(key, os.environ["ALLOWED_PREFIXES"].split(",")):
+        return {"statusCode": 404, "body": ""}
+
+    clients = _s3_clients()
+
+    def presign(object_key):
+        return clients["presign"].generate_presigned_url("get_object", Params={"Bucket": bucket, "Key": object_key}, ExpiresIn=expiry)
+
+    if not key.endswith(PLAYLIST_SUFFIX):
+        # Never cached, the presigned URL would outlive its signature
+        return {"statusCode": 302, "headers": {"Location": presign(key), "Cache-Control": "no-store"}, "body": ""}
+
+    from botocore.exceptions import ClientError
+    try:
+        playlist = clients["read"].get_object(Bucket=bucket, Key=key)["Body"].read().decode()
+    except ClientError:         # Without s3:ListBucket a missing playlist is AccessDenied rather than NoSuchKey
+        return {"statusCode": 404, "body": ""}
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/vnd.apple.mpegurl",
+            "Cache-Control": os.environ["MANIFEST_CACHE_CONTROL"],
+            "Vary": "Accept-Encoding"
+        },
+        "body": rewrite_playlist(playlist, key, presign)
+    }
+
+
+def _fake_presign(object_key: str) -> str:
+    return f"https://bucket.vpce-local.s3.local.vpce.amazonaws.com/media-bucket/{object_key}?{urlencode({'X-Amz-Expires': 300})}"
+
+
+if __name__ == "__main__":
+    # Rewrite a playlist from disk, e.g. written by the origin emulator
+    with open(sys.argv[1]) as playlist_file:
+        print(rewrite_playlist(playlist_file.read(), sys.argv[2], _fake_presign), end="")
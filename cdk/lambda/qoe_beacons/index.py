@@ -0,0 +1,93 @@
+"""Receives the QoE beacons of the video player (videoplayer/src/qoe.js) on POST /qoe of private-stream-api.
+
+Every event is logged as a CloudWatch embedded metric format record: CloudWatch Logs keeps the raw events
+per session and CloudWatch aggregates the metrics per stream (the manifest path) in the QOE_NAMESPACE namespace.
+Only the master playlists of the deployed channels (STREAMS) become a Stream dimension, any other manifest
+is counted as "unknown", so clients can not create custom metrics.
+
+Run locally with a beacon on stdin, the records are printed instead of logged:
+
+    echo '{"session": "s1", "manifest": "/prod/pipe-1/media.m3u8", "events": [{"type": "rebuffer", "duration_ms": 800}]}' \
+        | STREAMS='["/prod/pipe-1/media.m3u8"]' python3 index.py
+"""
+import base64
+import json
+import os
+import sys
+import time
+from urllib.parse import urlparse
+
+QOE_NAMESPACE = "ProtectedStreaming/QoE"
+MAX_EVENTS = 100            # Per beacon, the player sends at most 50
+MAX_BODY_BYTES = 64 * 1024
+
+# Event type: metrics it carries, as (event field, metric name, unit)
+EVENT_METRICS = {
+    "startup": [("startup_ms", "StartupTime", "Milliseconds"), ("ttff_ms", "TimeToFirstFrame", "Milliseconds")],
+    "rebuffer": [("duration_ms", "RebufferDuration", "Milliseconds"), (None, "RebufferCount", "Count")],
+    "bitrate_switch": [("to_bps", "SwitchedToBitrate", "Bits/Second"), (None, "BitrateSwitches", "Count")],
+    "throughput": [("bps", "SegmentThroughput", "Bits/Second"), ("bitrate_bps", "PlayingBitrate", "Bits/Second")],
+}
+
+
+def metric_records(beacon: dict, streams: list) -> list:
+    """Returns one embedded metric format record per known event in a beacon, unknown events are skipped."""
+    stream = urlparse(str(beacon.get("manifest", ""))).path
+    if stream not in streams:
+        stream = "unknown"
+    session = str(beacon.get("session", ""))[:64]
+    records = []
+    for event in beacon.get("events", [])[:MAX_EVENTS]:
+        if not isinstance(event, dict) or event.get("type") not in EVENT_METRICS:
+            continue
+        values = {}
+        for field, name, unit in EVENT_METRICS[event["type"]]:
+            value = 1 if field is None else event.get(field)
+            if isinstance(value, (int, float)) and value >= 0:
+                values[name] = (value, unit)
+        if not values:
+            continue
+        records.append({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),      # Player clocks can be off, CloudWatch drops records too far from now
+                "CloudWatchMetrics": [{
+                    "Namespace": QOE_NAMESPACE,
+                    "Dimensions": [["Stream"]],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in values.items()]
+                }]
+            },
+            "Stream": stream,
+            "Session": session,
+            "Event": event["type"],
+            "ClientTime": event.get("t"),
+            **{name: value for name, (value, _) in values.items()}
+        })
+    return records
+
+
+def parse_body(event: dict) -> dict:
+    body = event.get("body") or ""
+    # The API declares every media type as binary, so API Gateway passes the beacon base64 encoded
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode()
+    if len(body) > MAX_BODY_BYTES:
+        raise ValueError("beacon too large")
+    beacon = json.loads(body)
+    if not isinstance(beacon, dict):
+        raise ValueError("beacon must be a JSON object")
+    return beacon
+
+
+def handler(event, context):
+    try:
+        beacon = parse_body(event)
+    except ValueError:      # json.JSONDecodeError and UnicodeDecodeError are ValueErrors too
+        return {"statusCode": 400, "body": ""}
+    for record in metric_records(beacon, json.loads(os.environ["STREAMS"])):
+        print(json.dumps(record))
+    return {"statusCode": 204, "body": ""}
+
+
+if __name__ == "__main__":
+    for local_record in metric_records(json.load(sys.stdin), json.loads(os.environ.get("STREAMS", "[]"))):
+        print(json.dumps(local_record, indent=2))
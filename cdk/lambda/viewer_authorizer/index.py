@@ -0,0 +1,142 @@
+"""Token authorizer for the playlist and segment methods of private-stream-api.
+
+Viewers send "Authorization: Bearer <token>". A token is <payload>.<signature>, both base64url: the payload is
+{"sub": viewer, "ch": [channel names], "exp": unix time} and the signature its HMAC-SHA256 with the signing key
+in the ViewerTokens secret. The returned policy allows GET on the folders of every channel in the token, so
+API Gateway can cache it by token and reuse it for all of that viewer's playlist and segment requests.
+Viewers listed under "revoked" in the secret are refused as soon as their cached policy expires.
+
+Mint tokens with cdk/viewer_token.py. Run locally to simulate viewing sessions against the API Gateway
+authorizer cache and print the authorizer latency and cache hit rate:
+
+    python3 index.py --viewers 200 --minutes 30 --segment-length 6 --cache-ttl 300
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+SECRET_CACHE_SECONDS = 60       # Revocations reach new authorizations within this time
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def mint(key: str, viewer: str, channels: list, expires: int) -> str:
+    """Returns a signed token for viewer, valid for channels until the unix time expires."""
+    payload = _b64encode(json.dumps({"sub": viewer, "ch": channels, "exp": expires}, separators=(",", ":")).encode())
+    signature = _b64encode(hmac.new(key.encode(), payload.encode(), hashlib.sha256).digest())
+    return f"{payload}.{signature}"
+
+
+def verify(token: str, key: str, revoked: list, now: float) -> dict:
+    """Returns the claims of a valid token, raises ValueError otherwise."""
+    payload, _, signature = token.removeprefix("Bearer ").partition(".")
+    expected = _b64encode(hmac.new(key.encode(), payload.encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(signature, expected):
+        raise ValueError("bad signature")
+    claims = json.loads(_b64decode(payload))
+    if claims.get("exp", 0) <= now:
+        raise ValueError("token expired")
+    if claims.get("sub") in revoked:
+        raise ValueError("viewer revoked")
+    return claims
+
+
+def policy(claims: dict, method_arn: str, channel_folders: dict) -> dict:
+    """IAM policy allowing GET on every folder of the channels in the token, for any method of the stage."""
+    # arn:aws:execute-api:<region>:<account>:<api id>/<stage>/GET/pipe-1/media.m3u8 -> ...:<api id>/<stage>
+    stage_arn = "/".join(method_arn.split("/")[:2])
+    resources = [f"{stage_arn}/GET{folder}/*" for channel in claims.get("ch", []) for folder in channel_folders.get(channel, [])]
+    statement = {"Action": "execute-api:Invoke", "Effect": "Allow", "Resource": resources} if resources else \
+        {"Action": "execute-api:Invoke", "Effect": "Deny", "Resource": method_arn}
+    return {
+        "principalId": claims["sub"],
+        "policyDocument": {"Version": "2012-10-17", "Statement": [statement]},
+        "context": {"viewer": claims["sub"]}         # $context.authorizer.viewer in the access logs
+    }
+
+
+_secret = {"value": None, "loaded": 0}
+
+
+def _signing_secret() -> dict:
+    if _secret["value"] is None or time.time() - _secret["loaded"] > SECRET_CACHE_SECONDS:
+        import boto3    # Only needed in Lambda, the local simulation sets the secret directly
+        response = boto3.client("secretsmanager").get_secret_value(SecretId=os.environ["SECRET_ARN"])
+        _secret.update(value=json.loads(response["SecretString"]), loaded=time.time())
+    return _secret["value"]
+
+
+def handler(event, context):
+    secret = _signing_secret()
+    try:
+        claims = verify(event.get("authorizationToken", ""), secret["signing_key"], secret.get("revoked", []), time.time())
+    except ValueError:      # json.JSONDecodeError and binascii.Error are ValueErrors too
+        raise Exception("Unauthorized")     # API Gateway answers 401 and caches nothing
+    return policy(claims, event["methodArn"], json.loads(os.environ["CHANNEL_FOLDERS"]))
+
+
+def simulate(viewers: int, minutes: float, segment_length: int, cache_ttl: int, renditions: int = 1) -> dict:
+    """Replays the playlist and segment requests of viewing sessions through an emulated authorizer cache.
+
+    Each viewer refreshes its rendition playlist and fetches one segment per segment length. Viewers join
+    spread over the first segment. API Gateway caches the policy per token for cache_ttl seconds.
+    Latencies are the handler's own, without the secret fetch and the Lambda invocation API Gateway adds.
+    """
+    if viewers < 1:
+        raise ValueError(f"viewers is {viewers}, the simulation needs at least one viewer")
+    if segment_length < 1 or minutes * 60 < segment_length:
+        raise ValueError(f"{minutes} minutes of {segment_length} s segments, the simulation needs at least one segment")
+    if cache_ttl < 0:
+        raise ValueError(f"cache_ttl is {cache_ttl}, use 0 to disable the authorizer cache")
+    _secret.update(value={"signing_key": "local-simulation-key", "revoked": []}, loaded=float("inf"))
+    os.environ["CHANNEL_FOLDERS"] = json.dumps({"protected_stream": ["/pipe-1"]})
+    expires = int(time.time()) + int(minutes * 60) + 3600
+    tokens = [mint("local-simulation-key", f"viewer-{n}", ["protected_stream"], expires) for n in range(viewers)]
+    arn = "arn:aws:execute-api:us-east-1:123456789012:abcdef1234/prod/GET/pipe-1/media_720p.m3u8"
+
+    cache = {}
+    latencies = []
+    hits = 0
+    requests = 0
+    for step in range(int(minutes * 60 / segment_length)):
+        for viewer, token in enumerate(tokens):
+            now = step * segment_length + segment_length * viewer / viewers
+            # Master playlist at the start, then the rendition playlist and a segment every segment length
+            for _ in range((1 + renditions) if step == 0 else 2):
+                requests += 1
+                if cache.get(token, -1) > now:
+                    hits += 1
+                    continue
+                started = time.perf_counter()
+                handler({"authorizationToken": f"Bearer {token}", "methodArn": arn}, None)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if cache_ttl:
+                    cache[token] = now + cache_ttl
+    latencies.sort()
+    return {
+        "requests": requests,
+        "authorizer_invocations": len(latencies),
+        "cache_hit_rate_percent": round(100 * hits / requests, 2),
+        "authorizer_p50_ms": round(latencies[len(latencies) // 2], 3),
+        "authorizer_p99_ms": round(latencies[int(len(latencies) * 0.99)], 3),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulate viewing sessions against the authorizer and its cache.")
+    parser.add_argument("--viewers", type=int, default=100)
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--segment-length", type=int, default=6)
+    parser.add_argument("--cache-ttl", type=int, default=300, help="authorizer result cache TTL in seconds, 0 disables it")
+    args = parser.parse_args()
+    print(json.dumps(simulate(args.viewers, args.minutes, args.segment_length, args.cache_ttl), indent=2))
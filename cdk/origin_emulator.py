@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""Local stand-in for the MediaLive channels in channels.json.
+
+Writes synthetic segments and rolling HLS playlists at the cadence of the synthesized HlsGroupSettings
+(segment length, index and keep sizes, program date time, VOD or LIVE mode, single file or segmented,
+I-frame only playlists, archive output group) using the object names MediaLive would use under media_destinations. Files go to a local directory,
+served over HTTP under the same /prod/... paths as private-stream-api, or to an S3 compatible store.
+
+    python3 origin_emulator.py --port 8080
+    python3 origin_emulator.py --s3-bucket media --s3-endpoint-url http://localhost:9000
+"""
+import argparse
+import datetime
+import gzip
+import os
+import re
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from app.local_synth import synthesize_channels
+from app.rate_control import peak_bitrate
+
+TS_NULL_PACKET = b"\x47\x1f\xff\x10" + b"\xff" * 184     # 188 byte MPEG-TS null packet
+AUDIO_BITRATE = 192000
+IFRAME_PACKETS = 64             # Bytes of each segment an I-frame playlist points at, in TS packets
+# Name of the emulated I-frame only playlists, not necessarily the one MediaLive uses. Players and the API
+# do not depend on it, players follow the URI of EXT-X-I-FRAME-STREAM-INF in the master playlist.
+IFRAME_PLAYLIST_SUFFIX = "_iframe"
+CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/MP2T", ".mp4": "video/mp4"}
+
+
+class LocalStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def put(self, key: str, data: bytes) -> None:
+        # Written to a temporary file first so the HTTP server never serves a partial playlist
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(path + ".tmp", path)
+
+    def append(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as media_file:
+            media_file.write(data)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Store:
+    def __init__(self, bucket: str, endpoint_url: str = None):
+        import boto3    # Only needed when writing to an S3 compatible store
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self._single_files = {}     # S3 has no append, single files are kept in memory and rewritten
+
+    def put(self, key: str, data: bytes) -> None:
+        content_type = CONTENT_TYPES.get(os.path.splitext(key)[1], "application/octet-stream")
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+
+    def append(self, key: str, data: bytes) -> None:
+        self._single_files[key] = self._single_files.get(key, b"") + data
+        self.put(key, self._single_files[key])
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+class ChannelEmulator:
+    """Writes the HLS output of one output group of a synthesized AWS::MediaLive::Channel.
+
+    Group 0 is the live output, group 1 the archive output when the channel has one.
+    """
+
+    def __init__(self, channel: dict, properties: dict, store, group: int = 0):
+        encoder = properties["EncoderSettings"]
+        hls_group = encoder["OutputGroups"][group]
+        self.hls = hls_group["OutputGroupSettings"]["HlsGroupSettings"]
+        self.store = store
+        archive = group > 0
+        self.name = f"{channel['name']}-archive" if archive else channel["name"]
+        self.segment_length = self.hls["SegmentLength"]
+        self.single_file = self.hls["TsFileMode"] == "SINGLE_FILE"
+        self.vod = self.hls["Mode"] == "VOD"
+        self.program_date_time = self.hls["ProgramDateTime"] == "INCLUDE"
+        self.program_date_time_period = self.hls.get("ProgramDateTimePeriod", 600)
+        self.iframes = self.hls.get("IFrameOnlyPlaylists") == "STANDARD"
+        # SUBDIRECTORY_PER_STREAM rolls segments into numbered subdirectories of the destination folder
+        self.segments_per_subdirectory = self.hls["SegmentsPerSubdirectory"] \
+            if self.hls.get("DirectoryStructure") == "SUBDIRECTORY_PER_STREAM" else None
+
+        # Same destinations as MediaLive: the second pipeline writes under the secondary destination
+        pipelines = ["primary", "secondary"] if properties.get("ChannelClass") == "STANDARD" else ["primary"]
+        self.destinations = [channel["media_destinations"][f"archive_{pipeline}" if archive else pipeline].lstrip("/") for pipeline in pipelines]
+
+        videos = {video["Name"]: video for video in encoder["VideoDescriptions"]}
+        self.outputs = []
+        for output in hls_group["Outputs"]:
+            hls_settings = output["OutputSettings"]["HlsOutputSettings"]
+            video = videos.get(output.get("VideoDescriptionName"))
+            fmp4 = "Fmp4HlsSettings" in hls_settings["HlsSettings"] or \
+                hls_settings["HlsSettings"].get("AudioOnlyHlsSettings", {}).get("SegmentType") == "FMP4"
+            self.outputs.append({
+                "modifier": hls_settings["NameModifier"],
+                "video": video,
+                "bitrate": (peak_bitrate(video["CodecSettings"]["H264Settings"]) if video else 0)
+                    + (AUDIO_BITRATE if output.get("AudioDescriptionNames") else 0),
+                "extension": ".mp4" if fmp4 else ".ts",
+                "fmp4": fmp4,
+            })
+        self.sequence = 1
+        self.history = {output["modifier"]: [] for output in self.outputs}
+
+    def write_master(self) -> None:
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS"]
+        audio_group = ""
+        for output in self.outputs:
+            if output["video"] is None:
+                audio_group = ',AUDIO="program_audio"'
+                lines.append(f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="program_audio",NAME="audio",DEFAULT=YES,AUTOSELECT=YES,URI="{{destination}}{output["modifier"]}.m3u8"')
+        for output in self.outputs:
+            if output["video"] is None:
+                continue
+            bandwidth = output["bitrate"] + (AUDIO_BITRATE if audio_group else 0)
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={output["video"]["Width"]}x{output["video"]["Height"]},'
+                f'CODECS="avc1.4d401f,mp4a.40.2"{audio_group}')
+            lines.append(f'{{destination}}{output["modifier"]}.m3u8')
+            if self.iframes:
+                lines.append(f'#EXT-X-I-FRAME-STREAM-INF:BANDWIDTH={IFRAME_PACKETS * len(TS_NULL_PACKET) * 8 // self.segment_length},'
+                    f'RESOLUTION={output["video"]["Width"]}x{output["video"]["Height"]},CODECS="avc1.4d401f",'
+                    f'URI="{{destination}}{output["modifier"]}{IFRAME_PLAYLIST_SUFFIX}.m3u8"')
+        for destination in self.destinations:
+            name = os.path.basename(destination)
+            self.store.put(f"{destination}.m3u8", "\n".join(lines).replace("{destination}", name).encode() + b"\n")
+
+    def write_segment(self) -> None:
+        """Writes the next segment of every output and rolls the playlists, like MediaLive does once per segment."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for output in self.outputs:
+            size = max(1, output["bitrate"] * self.segment_length // 8 // len(TS_NULL_PACKET))
+            data = TS_NULL_PACKET * size
+            history = self.history[output["modifier"]]
+            for destination in self.destinations:
+                if self.single_file:
+                    # One growing file per rendition, the playlist indexes it with byte ranges
+                    key = f"{destination}{output['modifier']}{output['extension']}"
+                    self.store.append(key, data)
+                else:
+                    self.store.put(self._segment_key(destination, output, self.sequence), data)
+                if output["fmp4"] and self.sequence == 1:
+                    self.store.put(f"{destination}{output['modifier']}_init.mp4", b"\x00" * 1024)
+            offset = history[-1]["offset"] + history[-1]["length"] if history and self.single_file else 0
+            history.append({"sequence": self.sequence, "time": now, "offset": offset, "length": len(data)})
+
+            # LIVE mode keeps keep_segments segments in the destination, VOD mode keeps everything
+            if not self.vod:
+                while len(history) > self.hls["KeepSegments"]:
+                    expired = history.pop(0)
+                    for destination in self.destinations:
+                        self.store.delete(self._segment_key(destination, output, expired["sequence"]))
+            for destination in self.destinations:
+                self.store.put(f"{destination}{output['modifier']}.m3u8", self._media_playlist(destination, output, history))
+                if self.iframes and output["video"]:
+                    self.store.put(f"{destination}{output['modifier']}{IFRAME_PLAYLIST_SUFFIX}.m3u8",
+                        self._media_playlist(destination, output, history, iframe=True))
+        self.sequence += 1
+
+    def _media_playlist(self, destination: str, output: dict, history: list, iframe: bool = False) -> bytes:
+        """Media playlist of one output, or with iframe its I-frame only playlist: one I-frame at the start of each segment."""
+        indexed = history if self.vod else history[-self.hls["IndexNSegments"]:]
+        name = os.path.basename(destination)
+        lines = [
+            "#EXTM3U",
+            f"#EXT-X-VERSION:{6 if output['fmp4'] else 4 if self.single_file or iframe else 3}",
+            "#EXT-X-INDEPENDENT-SEGMENTS",
+            f"#EXT-X-TARGETDURATION:{self.segment_length}",
+            f"#EXT-X-MEDIA-SEQUENCE:{indexed[0]['sequence']}",
+        ]
+        if iframe:
+            lines.append("#EXT-X-I-FRAMES-ONLY")
+        if self.vod:
+            lines.append("#EXT-X-PLAYLIST-TYPE:EVENT")     # Becomes VOD with EXT-X-ENDLIST when the channel stops
+        if output["fmp4"]:
+            lines.append(f'#EXT-X-MAP:URI="{name}{output["modifier"]}_init.mp4"')
+        last_date_time = None
+        for segment in indexed:
+            if self.program_date_time and (last_date_time is None or
+                    (segment["time"] - last_date_time).total_seconds() >= self.program_date_time_period):
+                lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{segment['time'].isoformat(timespec='milliseconds').replace('+00:00', 'Z')}")
+                last_date_time = segment["time"]
+            lines.append(f"#EXTINF:{self.segment_length:.3f},")
+            # One byte range per entry: the I-frame at the start of the segment, or the whole segment in the single file
+            if iframe:
+                lines.append(f"#EXT-X-BYTERANGE:{min(segment['length'], IFRAME_PACKETS * len(TS_NULL_PACKET))}@{segment['offset']}")
+            elif self.single_file:
+                lines.append(f"#EXT-X-BYTERANGE:{segment['length']}@{segment['offset']}")
+            if self.single_file:
+                lines.append(f"{name}{output['modifier']}{output['extension']}")
+            else:
+                lines.append(self._segment_name(name, output, segment["sequence"]))
+        return "\n".join(lines).encode() + b"\n"
+
+    def _segment_name(self, name: str, output: dict, sequence: int) -> str:
+        """Segment URI relative to the playlist, e.g. media_720p_00001.ts or 0001/media_720p_00001.ts."""
+        subdirectory = f"{(sequence - 1) // self.segments_per_subdirectory + 1:04d}/" if self.segments_per_subdirectory else ""
+        return f"{subdirectory}{name}{output['modifier']}_{sequence:05d}{output['extension']}"
+
+    def _segment_key(self, destination: str, output: dict, sequence: int) -> str:
+        return f"{os.path.dirname(destination)}/{self._segment_name(os.path.basename(destination), output, sequence)}".lstrip("/")
+
+
+def http_handler(root: str, stage: str, minimum_compression_size: int = None):
+    """Serves root under /<stage>/, with byte range support for single file renditions.
+
+    Like the API, playlists of at least minimum_compression_size bytes are gzipped for clients that accept it.
+    """
+
+    class Handler(SimpleHTTPRequestHandler):
+        extensions_map = {**SimpleHTTPRequestHandler.extensions_map, **CONTENT_TYPES}
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=root, **kwargs)
+
+        def translate_path(self, path):
+            prefix = f"/{stage}"
+            return super().translate_path(path[len(prefix):] if path.startswith(prefix + "/") else "/__outside_stage__")
+
+        def end_headers(self):
+            self.send_header("Accept-Ranges", "bytes")
+            super().end_headers()
+
+        def do_GET(self):
+            match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            path = self.translate_path(self.path)
+            if path.endswith(".m3u8") and minimum_compression_size is not None and os.path.isfile(path):
+                return self._send_playlist(path)
+            if not match or not os.path.isfile(path):
+                return super().do_GET()
+            with open(path, "rb") as media_file:
+                data = media_file.read()
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+            if start > end:
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            self.wfile.write(data[start:end + 1])
+
+        def _send_playlist(self, path):
+            with open(path, "rb") as playlist_file:
+                data = playlist_file.read()
+            self.send_response(200)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Vary", "Accept-Encoding")
+            if len(data) >= minimum_compression_size and "gzip" in self.headers.get("Accept-Encoding", ""):
+                data = gzip.compress(data)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Emulate the configured MediaLive channels locally.")
+    parser.add_argument("--channels-config", default=os.path.join(os.path.dirname(__file__), "channels.json"))
+    parser.add_argument("--output-dir", default="emulator-output", help="local directory the segments are written to")
+    parser.add_argument("--s3-bucket", help="write to this bucket of an S3 compatible store instead of a local directory")
+    parser.add_argument("--s3-endpoint-url", help="endpoint of the S3 compatible store")
+    parser.add_argument("--port", type=int, default=8080, help="HTTP port for the local directory, 0 disables the server")
+    parser.add_argument("--stage", default="prod", help="API stage name used as the first path segment")
+    parser.add_argument("--min-compression-size", type=int, default=1024, help="gzip playlists of at least this many bytes, -1 disables")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run, 0 runs until interrupted")
+    args = parser.parse_args()
+
+    store = S3Store(args.s3_bucket, args.s3_endpoint_url) if args.s3_bucket else LocalStore(args.output_dir)
+    emulators = [
+        ChannelEmulator(channel, properties, store, group)
+        for channel, properties in synthesize_channels(args.channels_config)
+        for group in range(len(properties["EncoderSettings"]["OutputGroups"]))
+    ]
+    for emulator in emulators:
+        emulator.write_master()
+
+    if args.port and not args.s3_bucket:
+        server = ThreadingHTTPServer(("", args.port), http_handler(os.path.abspath(args.output_dir), args.stage,
+            args.min_compression_size if args.min_compression_size >= 0 else None))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        for emulator in emulators:
+            for destination in emulator.destinations:
+                print(f"{emulator.name}: http://localhost:{args.port}/{args.stage}/{destination}.m3u8")
+
+    # Each channel writes a segment every segment_length seconds on its own schedule
+    started = time.monotonic()
+    due = {emulator.name: started for emulator in emulators}
+    try:
+        while not args.duration or time.monotonic() - started < args.duration:
+            for emulator in emulators:
+                if time.monotonic() >= due[emulator.name]:
+                    emulator.write_segment()
+                    due[emulator.name] += emulator.segment_length
+            time.sleep(max(0.0, min(due.values()) - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Writes the video player configuration (player-config.json) from the PlayerConfig output of the deployed stack.
+
+Upload the file next to index.html of the player bundle. Options given here are merged into the stack output.
+
+    python3 player_config.py --output ../videoplayer/dist/player-config.json
+    python3 player_config.py --channel town_hall --preset low-latency --debug --output ../videoplayer/dist/player-config.json
+"""
+import argparse
+import json
+import os
+
+ROOT_STACK_NAME = "ProtectedStreaming"
+GATEWAY_STACK_ID = "Gateway"
+PRESETS = ["standard", "low-latency"]   # Defined in videoplayer/src/config.js
+
+
+def stack_player_config(root_stack_name: str, region: str = None) -> dict:
+    """Reads PlayerConfig from the outputs of the Gateway nested stack of the deployed root stack."""
+    import boto3        # Only needed here, so the rest of the tooling runs without AWS libraries
+
+    cloudformation = boto3.client("cloudformation", region_name=region)
+    nested_stacks = [
+        resource["PhysicalResourceId"]
+        for resource in cloudformation.describe_stack_resources(StackName=root_stack_name)["StackResources"]
+        if resource["ResourceType"] == "AWS::CloudFormation::Stack" and resource["LogicalResourceId"].startswith(GATEWAY_STACK_ID)
+    ]
+    if not nested_stacks:
+        raise SystemExit(f"No {GATEWAY_STACK_ID} nested stack found in {root_stack_name}")
+    outputs = cloudformation.describe_stacks(StackName=nested_stacks[0])["Stacks"][0].get("Outputs", [])
+    for output in outputs:
+        if output["OutputKey"].startswith("PlayerConfig"):
+            return json.loads(output["OutputValue"])
+    raise SystemExit(f"The {GATEWAY_STACK_ID} stack has no PlayerConfig output, deploy the current version of the app first")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Write player-config.json for the video player.")
+    parser.add_argument("--stack", default=ROOT_STACK_NAME, help="name of the deployed root stack")
+    parser.add_argument("--region", default=os.environ.get("CDK_DEFAULT_REGION"))
+    parser.add_argument("--channel", help="channel the player opens by default")
+    parser.add_argument("--preset", choices=PRESETS, help="player tuning preset for every channel, default from the segment length")
+    parser.add_argument("--vhs", type=json.loads, default={}, help='JSON overrides of the preset, e.g. \'{"goal_buffer": 12}\'')
+    parser.add_argument("--no-limit-rendition", action="store_true", help="let players pick renditions larger than the player")
+    parser.add_argument("--segment-cache-mb", type=int, default=0, help="size of the service worker segment cache, 0 turns it off")
+    parser.add_argument("--debug", action="store_true", help="debug logging in every player")
+    parser.add_argument("--output", default="player-config.json")
+    args = parser.parse_args()
+
+    config = stack_player_config(args.stack, args.region)
+    names = [channel["name"] for channel in config["channels"]]
+    if args.channel and args.channel not in names:
+        parser.error(f"unknown channel {args.channel}, the stack has {names}")
+    config.update({
+        "channel": args.channel or names[0],
+        "vhs": args.vhs,
+        "limit_rendition_to_player_size": not args.no_limit_rendition,
+        "segment_cache_mb": args.segment_cache_mb,
+        "debug": args.debug
+    })
+    if args.preset:
+        config["preset"] = args.preset
+    with open(args.output, "w") as config_file:
+        json.dump(config, config_file, indent=2)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Times the synth of the CDK app for several channel configurations and checks the templates against snapshots.
+
+Each configuration is synthesized in its own process, the way cdk synth runs app.py, with dummy certificate ARNs.
+The report has the time app.synth() took, the time of the whole run, and the size and resource count of the
+template of every nested stack. Use it in CI to catch slower synths and growing templates:
+
+    python3 synth_benchmark.py --update --baseline synth-baseline.json    # on main
+    python3 synth_benchmark.py --baseline synth-baseline.json             # on a branch
+
+Compare runs fail (exit code 1) when synth is more than --time-tolerance slower or a template more than
+--size-tolerance larger than the baseline, or when a template differs from its snapshot. Asset hashes are left
+out of the snapshots, so a change to Lambda code alone does not fail them.
+
+The snapshots are committed under tests/snapshots and checked by tests/unit/test_synth_snapshots.py. After a
+change to the templates that is meant, or an upgrade of aws-cdk-lib, write them again and review the diff:
+
+    python3 synth_benchmark.py --update --repeat 1
+"""
+import argparse
+import difflib
+import json
+import os
+import re
+import runpy
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+SNAPSHOTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "snapshots")
+CERT_ARN = "arn:aws:acm:us-east-1:123456789012:certificate/00000000-0000-0000-0000-000000000000"
+
+# Channel configurations to synthesize, channels.json format. None is the channels.json next to app.py.
+# CONTEXTS below adds API settings to some of them.
+CONFIGS = {
+    "default": None,
+    # Several channels sharing the VPC and the API, each with its own latency profile, container and prefix
+    "fleet": {"channels": [
+        {"name": "town_hall", "prefix": "/town-hall", "latency_profile": "low", "rate_control": "camera"},
+        {"name": "all_hands", "prefix": "/all-hands", "container": "FMP4",
+         "renditions": [{"name": "720p", "width": 1280, "height": 720, "bitrate": 3000000}]},
+        {"name": "lobby", "prefix": "/lobby", "rate_control": "slides", "directory_structure": "SUBDIRECTORY_PER_STREAM"}
+    ]},
+    # Both pipelines with SRT failover inputs, a DVR window, I-frame playlists and the archive output group
+    "redundant": {"channels": [
+        {"name": "keynote", "prefix": "/keynote", "redundant": True, "archive": True, "dvr_window_minutes": 30,
+         "i_frame_only_playlists": True, "lifecycle": {"expire_days": 2, "manifest_expire_days": 7, "max_run_days": 3}, "archive_lifecycle": {"expire_days": 90},
+         "ingest": {"type": "SRT_LISTENER", "latency_ms": 800, "failover": {"input_loss_ms": 1000}}},
+        {"name": "studio", "prefix": "/studio", "ingest": {"type": "SRT_CALLER",
+         "sources": [{"address": "10.20.0.15", "port": 9000}],
+         "failover": {"input_loss_ms": 2000, "sources": [{"address": "10.20.0.16", "port": 9000}]}}}
+    ]},
+    "cached": None,
+    "secured": None,
+}
+
+# API settings passed as context to app.py, the API of the other configurations keeps the app.py defaults
+THROTTLES = {
+    "stage_throttle": {"rate_limit": 2000, "burst_limit": 4000},
+    "manifest_throttle": {"rate_limit": 500, "burst_limit": 1000},
+    "segment_throttle": {"rate_limit": 1500, "burst_limit": 3000},
+}
+CONTEXTS = {
+    # Playlists and small segments from the stage cache, playlists refreshed as MediaLive writes them
+    "cached": {"cache_cluster_size": "0.5", "manifest_origin": True, **THROTTLES},
+    # Segments straight from S3 with presigned URLs, every request with a viewer token
+    "secured": {"cache_cluster_size": "0.5", "delivery_mode": "redirect", "viewer_auth": True, **THROTTLES},
+}
+
+ASSET_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def run_app() -> dict:
+    """Child process: runs app.py with app.synth() timed, returns the timings.
+
+    The configuration, output directory and cdk_nag switch come from CDK_CONTEXT_JSON and CDK_OUTDIR.
+    """
+    import aws_cdk as cdk
+
+    timings = {}
+    synth = cdk.App.synth
+
+    def timed_synth(app, *args, **kwargs):
+        started = time.perf_counter()
+        result = synth(app, *args, **kwargs)
+        timings["synth_seconds"] = time.perf_counter() - started
+        return result
+
+    cdk.App.synth = timed_synth
+    started = time.perf_counter()
+    sys.path.insert(0, os.path.dirname(APP))
+    runpy.run_path(APP, run_name="__main__")
+    timings["run_seconds"] = time.perf_counter() - started
+    return timings
+
+
+def synth_once(config_path: str, context: dict, output_dir: str, nag: bool) -> dict:
+    env = dict(os.environ,
+        CDK_OUTDIR=output_dir,
+        CDK_CONTEXT_JSON=json.dumps({
+            **({"channels_config": config_path} if config_path else {}),
+            **context,
+            "client_vpn_cert": CERT_ARN,
+            "server_vpn_cert": CERT_ARN,
+            "nag": nag
+        }),
+        # The same account and region everywhere, so the snapshots do not depend on who runs them
+        CDK_DEFAULT_ACCOUNT="123456789012",
+        CDK_DEFAULT_REGION="us-east-1",
+        JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1")
+    started = time.perf_counter()
+    child = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+        env=env, capture_output=True, text=True)
+    if child.returncode != 0:
+        raise SystemExit(f"Synth failed:\n{child.stdout}\n{child.stderr}")
+    timings = json.loads(child.stdout.strip().splitlines()[-1])
+    timings["process_seconds"] = time.perf_counter() - started     # Including the Python and jsii start up
+    return timings
+
+
+def templates(output_dir: str) -> dict:
+    """Templates of the root and nested stacks by stack name, with asset hashes replaced."""
+    found = {}
+    for file_name in sorted(os.listdir(output_dir)):
+        if file_name.endswith(".template.json"):
+            with open(os.path.join(output_dir, file_name)) as template_file:
+                text = template_file.read()
+            # Nested stack file names end in a hash of the construct path, e.g. ProtectedStreamingGateway9C62583A
+            name = re.sub(r"[0-9A-F]{8}\.nested$", "", file_name[:-len(".template.json")])
+            found[name] = {"bytes": len(text.encode()), "template": json.loads(ASSET_HASH.sub("<asset-hash>", text))}
+    return found
+
+
+def benchmark(name: str, config, repeat: int, nag: bool, work_dir: str) -> dict:
+    config_path = None
+    if config is not None:
+        config_path = os.path.join(work_dir, f"{name}.json")
+        with open(config_path, "w") as config_file:
+            json.dump(config, config_file)
+    runs = []
+    for run in range(repeat):
+        output_dir = os.path.join(work_dir, f"{name}-{run}")
+        runs.append(synth_once(config_path, CONTEXTS.get(name, {}), output_dir, nag))
+    stacks = templates(output_dir)
+    return {
+        "synth_seconds": round(statistics.median(run["synth_seconds"] for run in runs), 3),
+        "run_seconds": round(statistics.median(run["run_seconds"] for run in runs), 3),
+        "process_seconds": round(statistics.median(run["process_seconds"] for run in runs), 3),
+        "stacks": {stack: {"bytes": found["bytes"], "resources": len(found["template"].get("Resources", {}))}
+                   for stack, found in stacks.items()},
+        "templates": {stack: found["template"] for stack, found in stacks.items()}
+    }
+
+
+def compare(name: str, result: dict, baseline: dict, time_tolerance: float, size_tolerance: float) -> list:
+    problems = []
+    if name not in baseline:
+        return [f"{name}: not in the baseline, run with --update"]
+    previous = baseline[name]
+    if result["synth_seconds"] > previous["synth_seconds"] * (1 + time_tolerance):
+        problems.append(f"{name}: synth took {result['synth_seconds']} s, baseline {previous['synth_seconds']} s")
+    for stack, size in result["stacks"].items():
+        before = previous["stacks"].get(stack)
+        if before is None:
+            problems.append(f"{name}: new stack {stack} ({size['bytes']} bytes)")
+        elif size["bytes"] > before["bytes"] * (1 + size_tolerance):
+            problems.append(f"{name}: {stack} template is {size['bytes']} bytes, baseline {before['bytes']} bytes")
+    return problems
+
+
+def compare_snapshot(name: str, result: dict, snapshot_dir: str) -> list:
+    problems = []
+    if os.path.isdir(os.path.join(snapshot_dir, name)):
+        removed = {file_name[:-len(".json")] for file_name in os.listdir(os.path.join(snapshot_dir, name))} - set(result["templates"])
+        problems += [f"{name}: {stack} has a snapshot but was not synthesized" for stack in sorted(removed)]
+    for stack, template in result["templates"].items():
+        path = os.path.join(snapshot_dir, name, f"{stack}.json")
+        current = json.dumps(template, indent=1, sort_keys=True).splitlines()
+        if not os.path.exists(path):
+            problems.append(f"{name}: no snapshot of {stack}, run with --update")
+            continue
+        with open(path) as snapshot_file:
+            snapshot = snapshot_file.read().splitlines()
+        if current != snapshot:
+            diff = list(difflib.unified_diff(snapshot, current, f"snapshot/{stack}", f"synth/{stack}", lineterm="", n=1))
+            problems.append(f"{name}: {stack} differs from its snapshot\n" + "\n".join(diff[:40]) + ("\n..." if len(diff) > 40 else ""))
+    return problems
+
+
+def write_snapshot(name: str, result: dict, snapshot_dir: str) -> None:
+    os.makedirs(os.path.join(snapshot_dir, name), exist_ok=True)
+    for stack, template in result["templates"].items():
+        with open(os.path.join(snapshot_dir, name, f"{stack}.json"), "w") as snapshot_file:
+            snapshot_file.write(json.dumps(template, indent=1, sort_keys=True) + "\n")
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(run_app()))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Time the CDK synth and check template sizes and snapshots.")
+    parser.add_argument("--config", action="append", choices=list(CONFIGS), help="configurations to run, default all")
+    parser.add_argument("--repeat", type=int, default=3, help="synths per configuration, the report has the median")
+    parser.add_argument("--nag", action="store_true", help="run the cdk_nag checks as well, as a deploy does")
+    parser.add_argument("--baseline", help="JSON file with the timings and template sizes to compare with")
+    parser.add_argument("--snapshots", default=SNAPSHOTS, help="directory with the template snapshots to compare with")
+    parser.add_argument("--update", action="store_true", help="write the baseline and snapshots instead of comparing")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="fraction synth may be slower than the baseline")
+    parser.add_argument("--size-tolerance", type=float, default=0.02, help="fraction a template may be larger than the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline and not args.update:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {}
+    problems = []
+    with tempfile.TemporaryDirectory(prefix="synth-benchmark-") as work_dir:
+        for name in args.config or list(CONFIGS):
+            result = benchmark(name, CONFIGS[name], args.repeat, args.nag, work_dir)
+            results[name] = result
+            print(f"{name}: synth {result['synth_seconds']} s, app.py {result['run_seconds']} s, process {result['process_seconds']} s")
+            for stack, size in result["stacks"].items():
+                print(f"  {stack:<40} {size['bytes']:>9} bytes {size['resources']:>5} resources")
+            if args.update:
+                write_snapshot(name, result, args.snapshots)
+            else:
+                if args.baseline:
+                    problems += compare(name, result, baseline, args.time_tolerance, args.size_tolerance)
+                problems += compare_snapshot(name, result, args.snapshots)
+
+    if args.update and args.baseline:
+        # Configurations not run this time keep their previous baseline
+        previous = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                previous = json.load(baseline_file)
+        previous.update({name: {key: value for key, value in result.items() if key != "templates"} for name, result in results.items()})
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(previous, baseline_file, indent=2)
+        print(f"Wrote {args.baseline}")
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
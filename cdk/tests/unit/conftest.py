@@ -0,0 +1,81 @@
+import aws_cdk as cdk
+import pytest
+from app.iam_nested_stack import IamNestedStack
+from app.network_nested_stack import NetworkNestedStack
+from app.storage_nested_stack import StorageNestedStack
+from app.medialive_nested_stack import MediaLiveNestedStack
+from app.api_nested_stack import ApiNestedStack
+from app.monitoring_nested_stack import MonitoringNestedStack
+from app.protected_streaming_root_stack import ProtectedStreamingRoot
+
+# The templates are never deployed, the certificates only need to look like ARNs
+PLACEHOLDER_CERT = "arn:aws:acm:us-east-1:123456789012:certificate/unit-test"
+STACK_NAME = "unit_test"
+MEDIA_DESTINATIONS = {
+    "primary": "/pipe-1/media",
+    "secondary": "/pipe-2/media",
+    "archive_primary": "/archive/pipe-1/media",
+    "archive_secondary": "/archive/pipe-2/media"
+}
+
+
+class Stacks:
+    """The stacks every channel needs, the way app.py builds them."""
+
+    def __init__(self, event_bridge_enabled: bool = False, s3_interface_endpoint: bool = False):
+        self.app = cdk.App()
+        self.root = ProtectedStreamingRoot(self.app, "ProtectedStreaming")
+        self.network = NetworkNestedStack(self.root, "Network",
+            client_vpn_cert=PLACEHOLDER_CERT,
+            server_vpn_cert=PLACEHOLDER_CERT,
+            s3_interface_endpoint=s3_interface_endpoint,
+            stack_name=STACK_NAME)
+        self.security = IamNestedStack(self.root, "Security")
+        self.storage = StorageNestedStack(self.root, "Storage",
+            security=self.security,
+            network=self.network,
+            event_bridge_enabled=event_bridge_enabled,
+            stack_name=STACK_NAME)
+
+    def channel(self, channel_name: str = "protected_stream", **settings) -> MediaLiveNestedStack:
+        return MediaLiveNestedStack(self.root, f"MediaLive-{channel_name}",
+            network=self.network,
+            storage=self.storage,
+            media_destinations=MEDIA_DESTINATIONS,
+            channel_name=channel_name,
+            stack_name=STACK_NAME,
+            **settings)
+
+    def gateway(self, channels: list, **settings) -> ApiNestedStack:
+        return ApiNestedStack(self.root, "Gateway",
+            security=self.security,
+            network=self.network,
+            storage=self.storage,
+            channels=channels,
+            stack_name=STACK_NAME,
+            **settings)
+
+    def monitoring(self, gateway: ApiNestedStack, channels: list, alarm_thresholds: dict = None) -> MonitoringNestedStack:
+        return MonitoringNestedStack(self.root, "Monitoring",
+            gateway=gateway,
+            storage=self.storage,
+            channels=channels,
+            alarm_thresholds=alarm_thresholds,
+            stack_name=STACK_NAME)
+
+
+@pytest.fixture
+def stacks() -> Stacks:
+    return Stacks()
+
+
+@pytest.fixture
+def event_stacks() -> Stacks:
+    # Object created events of the media bucket, needed by the manifest origin
+    return Stacks(event_bridge_enabled=True)
+
+
+@pytest.fixture
+def redirect_stacks() -> Stacks:
+    # The S3 interface endpoint, needed by the redirect delivery mode
+    return Stacks(s3_interface_endpoint=True)
@@ -0,0 +1,12 @@
+import importlib.util
+import os
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "lambda")
+
+
+def load_lambda(name: str):
+    """The index.py of a function under cdk/lambda, as its own module, every function names its handler module index."""
+    spec = importlib.util.spec_from_file_location(f"lambda_{name}", os.path.join(LAMBDA_DIR, name, "index.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,243 @@
+import pytest
+from aws_cdk.assertions import Annotations, Match, Template
+from app.api_nested_stack import (
+    API_KEY_HEADER,
+    FORWARDED_REQUEST_HEADERS,
+    MAX_SEGMENT_CACHE_TTL,
+    STAGE_CACHE_MAX_SEGMENT_BYTES,
+    THROTTLE_RETRY_AFTER
+)
+
+CLIENT_THROTTLE = {"rate_limit": 50, "burst_limit": 100}
+# One rung small enough for its 6 s segments to fit in the stage cache
+SMALL_LADDER = [{"name": "360p", "width": 640, "height": 360, "bitrate": 800000, "profile": "BASELINE"}]
+
+
+def method_settings(template: Template) -> dict:
+    """Stage method settings by resource path, e.g. /pipe-1/{proxy+}, the stage escapes "/" in paths as "~1"."""
+    (stage,) = template.find_resources("AWS::ApiGateway::Stage").values()
+    return {setting["ResourcePath"][1:].replace("~1", "/"): setting for setting in stage["Properties"]["MethodSettings"]
+            if setting["HttpMethod"] == "GET"}
+
+
+def s3_method(template: Template, logical_id_prefix: str) -> dict:
+    """Integration of the GET method whose logical ID starts with logical_id_prefix, e.g. privatestreamapipipe1proxyGET."""
+    methods = {logical_id: method for logical_id, method in template.find_resources("AWS::ApiGateway::Method").items()
+               if logical_id.startswith(logical_id_prefix)}
+    assert len(methods) == 1, sorted(methods)
+    return next(iter(methods.values()))["Properties"]["Integration"]
+
+
+def test_segment_and_manifest_cache_ttls(stacks):
+    gateway = stacks.gateway([stacks.channel(renditions=SMALL_LADDER)], cache_cluster_size="0.5", segment_cache_ttl=30)
+
+    settings = method_settings(Template.from_stack(gateway))
+
+    # Playlists of the 6 s segments of the standard profile are rewritten every segment, half of it is cached
+    for path in ["/pipe-1/media.m3u8", "/pipe-1/media_360p.m3u8"]:
+        assert (settings[path]["CachingEnabled"], settings[path]["CacheTtlInSeconds"], settings[path]["CacheDataEncrypted"]) == (True, 3, True)
+    assert (settings["/pipe-1/{proxy+}"]["CachingEnabled"], settings["/pipe-1/{proxy+}"]["CacheTtlInSeconds"]) == (True, 30)
+
+
+def test_manifest_origin_keeps_playlists_until_refreshed(event_stacks):
+    gateway = event_stacks.gateway([event_stacks.channel(renditions=SMALL_LADDER)], cache_cluster_size="0.5", manifest_origin=True)
+    template = Template.from_stack(gateway)
+
+    assert method_settings(template)["/pipe-1/media_360p.m3u8"]["CacheTtlInSeconds"] == 18
+    # Every viewer shares the one cache entry the refresher replaces, validators and ranges would split it
+    integration = s3_method(template, "privatestreamapipipe1media360pm3u8GET")
+    assert integration.get("RequestParameters", {}) == {}
+    assert integration["CacheKeyParameters"] == []
+
+
+def test_no_method_settings_without_cache(stacks):
+    template = Template.from_stack(stacks.gateway([stacks.channel(renditions=SMALL_LADDER)]))
+
+    assert method_settings(template) == {}
+    assert "CacheKeyParameters" not in s3_method(template, "privatestreamapipipe1proxyGET")
+
+
+@pytest.mark.parametrize("bitrate, cacheable", [(800000, True), (1500000, False)])
+def test_segments_larger_than_the_stage_cache_limit_are_not_cached(stacks, bitrate, cacheable):
+    channel = stacks.channel(renditions=[{**SMALL_LADDER[0], "bitrate": bitrate}])
+    assert (channel.segment_bytes["360p"] <= STAGE_CACHE_MAX_SEGMENT_BYTES) == cacheable
+    gateway = stacks.gateway([channel], cache_cluster_size="0.5")
+
+    settings = method_settings(Template.from_stack(gateway))
+
+    assert settings["/pipe-1/{proxy+}"]["CachingEnabled"] == cacheable
+    assert settings["/pipe-1/media_360p.m3u8"]["CachingEnabled"]
+    # Nested stacks report their annotations in the assembly of the root stack
+    warnings = Annotations.from_stack(stacks.root).find_warning("*", Match.string_like_regexp("larger than the 900 KB"))
+    assert len(warnings) == (0 if cacheable else 1)
+
+
+def test_segment_cache_ttl_is_bounded(stacks):
+    channel = stacks.channel(renditions=SMALL_LADDER)
+    with pytest.raises(ValueError, match="segment_cache_ttl"):
+        stacks.gateway([channel], cache_cluster_size="0.5", segment_cache_ttl=MAX_SEGMENT_CACHE_TTL + 1)
+
+
+def test_validators_and_ranges_are_forwarded_and_part_of_the_cache_key(stacks):
+    template = Template.from_stack(stacks.gateway([stacks.channel(renditions=SMALL_LADDER)], cache_cluster_size="0.5"))
+
+    forwarded = {f"integration.request.header.{header}": f"method.request.header.{header}" for header in FORWARDED_REQUEST_HEADERS}
+    header_keys = [f"method.request.header.{header}" for header in FORWARDED_REQUEST_HEADERS]
+    segments = s3_method(template, "privatestreamapipipe1proxyGET")
+    assert segments["RequestParameters"] == {**forwarded, "integration.request.path.proxy": "method.request.path.proxy"}
+    assert segments["CacheKeyParameters"] == header_keys + ["method.request.path.proxy"]
+    manifest = s3_method(template, "privatestreamapipipe1media360pm3u8GET")
+    assert manifest["RequestParameters"] == forwarded
+    assert manifest["CacheKeyParameters"] == header_keys
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+        "HttpMethod": "GET",
+        "RequestParameters": {
+            "method.request.path.proxy": True,
+            **{f"method.request.header.{header}": False for header in FORWARDED_REQUEST_HEADERS}
+        }
+    })
+
+
+def test_not_modified_and_partial_content_responses(stacks):
+    template = Template.from_stack(stacks.gateway([stacks.channel(renditions=SMALL_LADDER)], cache_cluster_size="0.5"))
+
+    responses = {response["StatusCode"]: response for response in s3_method(template, "privatestreamapipipe1proxyGET")["IntegrationResponses"]}
+    assert sorted(responses) == ["200", "206", "304"]
+    assert (responses["206"]["SelectionPattern"], responses["304"]["SelectionPattern"]) == ("206", "304")
+    for status in ["206", "304"]:
+        parameters = responses[status]["ResponseParameters"]
+        assert parameters["method.response.header.ETag"] == "integration.response.header.ETag"
+        assert parameters["method.response.header.Cache-Control"] == "'private, max-age=60'"
+    assert responses["206"]["ResponseParameters"]["method.response.header.Content-Range"] == "integration.response.header.Content-Range"
+    # A 304 has no body, so no Content-Type
+    assert "method.response.header.Content-Type" not in responses["304"]["ResponseParameters"]
+
+
+def test_single_file_byte_ranges_keep_the_segment_ttl(stacks):
+    template = Template.from_stack(stacks.gateway([stacks.channel(renditions=SMALL_LADDER, ts_file_mode="SINGLE_FILE")]))
+
+    responses = {response["StatusCode"]: response["ResponseParameters"] for response in s3_method(template, "privatestreamapipipe1proxyGET")["IntegrationResponses"]}
+    # The growing .ts file itself is cached like a playlist, the byte ranges listed in the playlist are final
+    assert responses["200"]["method.response.header.Cache-Control"] == "'private, max-age=3'"
+    assert responses["206"]["method.response.header.Cache-Control"] == "'private, max-age=60'"
+
+
+def test_segments_are_not_compressed_and_playlists_vary_by_encoding(stacks):
+    template = Template.from_stack(stacks.gateway([stacks.channel(renditions=SMALL_LADDER)]))
+
+    template.has_resource_properties("AWS::ApiGateway::RestApi", {"MinimumCompressionSize": 1024})
+    for response in s3_method(template, "privatestreamapipipe1proxyGET")["IntegrationResponses"]:
+        assert response["ResponseParameters"]["method.response.header.Content-Encoding"] == "'identity'"
+        assert "method.response.header.Vary" not in response["ResponseParameters"]
+    for response in s3_method(template, "privatestreamapipipe1media360pm3u8GET")["IntegrationResponses"]:
+        assert response["ResponseParameters"]["method.response.header.Vary"] == "'Accept-Encoding'"
+        assert response["ResponseParameters"]["method.response.header.Cache-Control"] == "'private, max-age=3, must-revalidate'"
+        assert "method.response.header.Content-Encoding" not in response["ResponseParameters"]
+
+
+def test_no_encoding_headers_without_compression(stacks):
+    template = Template.from_stack(stacks.gateway([stacks.channel(renditions=SMALL_LADDER)], minimum_compression_size=None))
+
+    for prefix in ["privatestreamapipipe1proxyGET", "privatestreamapipipe1media360pm3u8GET"]:
+        for response in s3_method(template, prefix)["IntegrationResponses"]:
+            assert not {"method.response.header.Vary", "method.response.header.Content-Encoding"} & set(response["ResponseParameters"])
+
+
+STAGE_THROTTLE = {"rate_limit": 500, "burst_limit": 1000}
+MANIFEST_THROTTLE = {"rate_limit": 100, "burst_limit": 200}
+SEGMENT_THROTTLE = {"rate_limit": 300, "burst_limit": 600}
+
+
+def test_method_throttles(stacks):
+    gateway = stacks.gateway([stacks.channel(renditions=SMALL_LADDER)],
+        stage_throttle=STAGE_THROTTLE, manifest_throttle=MANIFEST_THROTTLE, segment_throttle=SEGMENT_THROTTLE)
+    template = Template.from_stack(gateway)
+
+    template.has_resource_properties("AWS::ApiGateway::Stage", {
+        "MethodSettings": Match.array_with([Match.object_like({"ResourcePath": "/*", "HttpMethod": "*",
+            "ThrottlingRateLimit": 500, "ThrottlingBurstLimit": 1000})])
+    })
+    settings = method_settings(template)
+    throttles = {path: (setting.get("ThrottlingRateLimit"), setting.get("ThrottlingBurstLimit")) for path, setting in settings.items()}
+    # The player bundle only has the stage throttle, playlists and segments their own on top of it
+    assert throttles == {
+        "/{proxy+}": (None, None),
+        "/pipe-1/{proxy+}": (300, 600),
+        "/pipe-1/media.m3u8": (100, 200),
+        "/pipe-1/media_360p.m3u8": (100, 200),
+    }
+    assert not any(setting["CachingEnabled"] for setting in settings.values())
+    assert gateway.player_config["retry_throttled"]
+
+
+def test_throttled_requests_get_retry_after(stacks):
+    template = Template.from_stack(stacks.gateway([stacks.channel(renditions=SMALL_LADDER)], stage_throttle=STAGE_THROTTLE))
+
+    template.has_resource_properties("AWS::ApiGateway::GatewayResponse", {
+        "ResponseType": "THROTTLED",
+        "StatusCode": "429",
+        "ResponseParameters": {"gatewayresponse.header.Retry-After": f"'{THROTTLE_RETRY_AFTER}'"}
+    })
+
+
+def test_usage_plan_and_api_keys(stacks):
+    gateway = stacks.gateway([stacks.channel(renditions=SMALL_LADDER)], usage_plan_clients=["lobby", "kiosk"], client_throttle=CLIENT_THROTTLE)
+    template = Template.from_stack(gateway)
+
+    template.has_resource_properties("AWS::ApiGateway::UsagePlan", {
+        "UsagePlanName": "unit_test_viewers",
+        "Throttle": {"RateLimit": 50, "BurstLimit": 100},
+        "ApiStages": [Match.object_like({"Stage": Match.any_value()})]
+    })
+    for client in ["lobby", "kiosk"]:
+        template.has_resource_properties("AWS::ApiGateway::ApiKey", {"Name": f"unit_test_{client}", "Enabled": True})
+    template.resource_count_is("AWS::ApiGateway::ApiKey", 2)
+    template.resource_count_is("AWS::ApiGateway::UsagePlanKey", 2)
+
+    # Playlists and segments need a key, the player bundle the browser loads first does not
+    methods = {logical_id: method["Properties"]["ApiKeyRequired"] for logical_id, method in template.find_resources("AWS::ApiGateway::Method").items()
+               if method["Properties"]["HttpMethod"] == "GET"}
+    assert [logical_id for logical_id, required in methods.items() if not required] == \
+        [logical_id for logical_id in methods if logical_id.startswith("privatestreamapiproxyGET")]
+    assert gateway.player_config["api_key_header"] == API_KEY_HEADER
+
+
+@pytest.mark.parametrize("throttle, error", [
+    ({"rate_limit": 100}, "needs rate_limit and burst_limit"),
+    ({"rate_limit": 100, "burst_limit": 200, "period": "DAY"}, "needs rate_limit and burst_limit"),
+    ({"rate_limit": 0, "burst_limit": 200}, "rate_limit must be a positive number"),
+    ({"rate_limit": "100", "burst_limit": 200}, "rate_limit must be a positive number"),
+    ({"rate_limit": 100, "burst_limit": 0}, "burst_limit must be a positive whole number"),
+    ({"rate_limit": 100, "burst_limit": 2.5}, "burst_limit must be a positive whole number"),
+])
+def test_invalid_throttles(stacks, throttle, error):
+    channel = stacks.channel(renditions=SMALL_LADDER)
+    with pytest.raises(ValueError, match=f"stage_throttle {error}"):
+        stacks.gateway([channel], stage_throttle=throttle)
+
+
+@pytest.mark.parametrize("name", ["manifest_throttle", "segment_throttle"])
+def test_method_throttle_above_the_stage_throttle(stacks, name):
+    channel = stacks.channel(renditions=SMALL_LADDER)
+    with pytest.raises(ValueError, match=f"{name} rate_limit must not be above the stage_throttle rate_limit"):
+        stacks.gateway([channel], stage_throttle=MANIFEST_THROTTLE, **{name: SEGMENT_THROTTLE})
+
+
+@pytest.mark.parametrize("clients", ["lobby", ["lobby", ""], [{"name": "lobby"}]])
+def test_usage_plan_clients_are_names(stacks, clients):
+    channel = stacks.channel(renditions=SMALL_LADDER)
+    with pytest.raises(ValueError, match="usage_plan_clients must be a list of client names"):
+        stacks.gateway([channel], usage_plan_clients=clients, client_throttle=CLIENT_THROTTLE)
+
+
+def test_usage_plans_need_client_throttle(stacks):
+    channel = stacks.channel(renditions=SMALL_LADDER)
+    with pytest.raises(ValueError, match="usage_plan_clients needs client_throttle"):
+        stacks.gateway([channel], usage_plan_clients=["lobby"])
+
+
+def test_usage_plans_need_the_proxy_delivery_mode(redirect_stacks):
+    channel = redirect_stacks.channel()
+    with pytest.raises(ValueError, match="usage_plan_clients needs the proxy delivery mode"):
+        redirect_stacks.gateway([channel], delivery_mode="redirect", usage_plan_clients=["lobby"], client_throttle=CLIENT_THROTTLE)
@@ -0,0 +1,38 @@
+import pytest
+from aws_cdk.assertions import Template
+from app.api_nested_stack import STAGE_CACHE_MAX_SEGMENT_BYTES
+from app.capacity import channel_profile, plan
+
+LADDER = [
+    {"name": "720p", "width": 1280, "height": 720, "bitrate": 3000000, "profile": "MAIN"},
+    {"name": "360p", "width": 640, "height": 360, "bitrate": 800000, "profile": "BASELINE"},
+]
+
+
+def profile(stack, source_frame_rate: float = 30) -> dict:
+    (channel,) = Template.from_stack(stack).find_resources("AWS::MediaLive::Channel").values()
+    return channel_profile(channel["Properties"], source_frame_rate)
+
+
+@pytest.mark.parametrize("settings", [
+    {},
+    {"container": "FMP4"},
+    {"source_frame_rate": 60},
+    {"rate_control": {"mode": "QVBR", "quality_level": 7}},
+])
+def test_largest_segment_matches_the_stack(stacks, settings):
+    stack = stacks.channel(renditions=LADDER, **settings)
+
+    metrics = plan(profile(stack, settings.get("source_frame_rate", 30)), viewers=100)["metrics"]
+
+    assert metrics["largest_segment_mb"] == round(max(stack.segment_bytes.values()) / 10**6, 2)
+
+
+@pytest.mark.parametrize("bitrate", [800000, 1000000, 1500000])
+def test_cached_segments_match_the_stack(stacks, bitrate):
+    # 1 Mbps at 6 s is under the limit without its audio and container overhead, over it with them
+    stack = stacks.channel(renditions=[{**LADDER[1], "bitrate": bitrate}])
+
+    metrics = plan(profile(stack), viewers=100, api_cache=True)["metrics"]
+
+    assert metrics["api_cached_segments"] == (max(stack.segment_bytes.values()) <= STAGE_CACHE_MAX_SEGMENT_BYTES)
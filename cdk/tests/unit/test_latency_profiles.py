@@ -0,0 +1,38 @@
+import pytest
+from app.latency_profiles import LATENCY_PROFILES, resolve_latency_profile
+
+CUSTOM = {**LATENCY_PROFILES["low"], "segment_length": 4, "gop_size": 60, "gop_size_units": "FRAMES"}
+
+
+def test_named_profiles_are_copies():
+    settings = resolve_latency_profile("standard")
+    settings["segment_length"] = 1
+    assert resolve_latency_profile("standard") == LATENCY_PROFILES["standard"]
+
+
+def test_custom_profile():
+    assert resolve_latency_profile(CUSTOM) == CUSTOM
+    assert resolve_latency_profile({**CUSTOM, "gop_size": 0.5, "gop_size_units": "SECONDS"})["gop_size"] == 0.5
+
+
+@pytest.mark.parametrize("changes, message", [
+    ({"gop_size_units": "MILLISECONDS"}, "gop_size_units must be one of"),
+    ({"gop_size_units": "seconds"}, "gop_size_units must be one of"),
+    ({"gop_size": 0}, "positive gop_size"),
+    ({"gop_size": -2}, "positive gop_size"),
+    ({"gop_size": "2"}, "positive gop_size"),
+    ({"gop_size": True}, "positive gop_size"),
+    ({"segment_length": 1.5}, "whole number of seconds"),
+    ({"keep_segments": 6}, "keep_segments must be greater"),
+    ({"look_ahead_rate_control": "NONE"}, "look_ahead_rate_control must be one of"),
+])
+def test_invalid_custom_profiles(changes, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_latency_profile({**CUSTOM, **changes})
+
+
+def test_unknown_profile_and_missing_settings():
+    with pytest.raises(ValueError, match="Unknown latency profile"):
+        resolve_latency_profile("lowest")
+    with pytest.raises(ValueError, match=r"missing \['gop_size_units'\]"):
+        resolve_latency_profile({key: value for key, value in CUSTOM.items() if key != "gop_size_units"})
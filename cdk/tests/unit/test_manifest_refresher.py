@@ -0,0 +1,90 @@
+import pytest
+from tests.unit.functions import load_lambda
+
+manifest_refresher = load_lambda("manifest_refresher")
+
+API_URL = "https://abc123.execute-api.eu-west-1.amazonaws.com/prod/"
+ETAG = "9b2cf535f27731c974343645a3985328"
+
+
+def object_created(key: str, etag: str = ETAG) -> dict:
+    return {"detail-type": "Object Created", "detail": {"bucket": {"name": "media-bucket"}, "object": {"key": key, "etag": etag}}}
+
+
+class StubClient:
+    """Stands in for the stage, answers every request with the same ETag and keeps the requests sent."""
+
+    def __init__(self, etag: str):
+        self.etag = etag
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        return f'"{self.etag}"'
+
+
+def test_refresh_with_matching_etag():
+    client = StubClient(ETAG)
+
+    assert manifest_refresher.refresh(object_created("pipe-1/media_720p.m3u8"), API_URL, client) == \
+        [f"{API_URL}pipe-1/media_720p.m3u8"]
+    assert [request.get_header("Cache-control") for request in client.requests] == ["max-age=0"]
+
+
+def test_refresh_with_mismatched_etag():
+    client = StubClient("0f343b0931126a20f133d67c2b018a3b")
+
+    with pytest.raises(manifest_refresher.StaleRefresh, match=ETAG):
+        manifest_refresher.refresh(object_created("pipe-1/media_720p.m3u8"), API_URL, client)
+
+
+def test_refresh_without_etag_in_event():
+    client = StubClient("0f343b0931126a20f133d67c2b018a3b")
+
+    assert manifest_refresher.refresh(object_created("pipe-1/media_720p.m3u8", etag=""), API_URL, client) == \
+        [f"{API_URL}pipe-1/media_720p.m3u8"]
+
+
+def test_segments_are_not_refreshed():
+    client = StubClient(ETAG)
+
+    assert manifest_refresher.refresh(object_created("pipe-1/media_720p_00001.ts"), API_URL, client) == []
+    assert client.requests == []
+
+
+def test_handler_sends_signed_refresh(monkeypatch):
+    client = StubClient(ETAG)
+    signed = []
+
+    def sign(request, region):
+        signed.append(region)
+        request.add_header("Authorization", "AWS4-HMAC-SHA256 stub")
+        return request
+
+    monkeypatch.setenv("AWS_REGION", "eu-west-1")
+    monkeypatch.setenv("API_URL", API_URL)
+    monkeypatch.setattr(manifest_refresher, "sign", sign)
+    monkeypatch.setattr(manifest_refresher, "_send", client)
+
+    assert manifest_refresher.handler(object_created("pipe-1/media_720p.m3u8"), None) == \
+        {"refreshed": [f"{API_URL}pipe-1/media_720p.m3u8"]}
+    assert signed == ["eu-west-1"]
+    request = client.requests[0]
+    assert request.get_header("Cache-control") == "max-age=0"
+    assert request.get_header("Authorization") == "AWS4-HMAC-SHA256 stub"
+
+
+def test_sign_keeps_cache_control(monkeypatch):
+    # The Lambda runtime ships botocore, the signature itself needs it installed locally
+    pytest.importorskip("botocore")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "AKIDEXAMPLE")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY")
+    monkeypatch.delenv("AWS_SESSION_TOKEN", raising=False)
+
+    request = manifest_refresher.sign(manifest_refresher.refresh_request(API_URL, "pipe-1/media_720p.m3u8"), "eu-west-1")
+
+    headers = {name.lower(): value for name, value in request.header_items()}
+    assert headers["cache-control"] == "max-age=0"
+    assert headers["authorization"].startswith("AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/")
+    assert "/eu-west-1/execute-api/aws4_request" in headers["authorization"]
+    assert "cache-control" in headers["authorization"]
@@ -0,0 +1,95 @@
+import pytest
+from aws_cdk.assertions import Match, Template
+from app.renditions import DEFAULT_RENDITION_LADDER, MAX_RENDITIONS, validate_rendition_ladder
+
+LADDER = [
+    {"name": "720p", "width": 1280, "height": 720, "bitrate": 3000000},
+    {"name": "360p", "width": 640, "height": 360, "bitrate": 800000, "profile": "BASELINE", "gop_size": 60, "gop_size_units": "FRAMES"},
+]
+
+
+def channel_properties(stack) -> dict:
+    channels = Template.from_stack(stack).find_resources("AWS::MediaLive::Channel")
+    assert len(channels) == 1
+    return next(iter(channels.values()))["Properties"]
+
+
+def test_default_ladder_has_one_video_description_and_output_per_rung(stacks):
+    encoder_settings = channel_properties(stacks.channel())["EncoderSettings"]
+
+    descriptions = encoder_settings["VideoDescriptions"]
+    assert [(d["Name"], d["Width"], d["Height"]) for d in descriptions] == \
+        [(f"video_desc_{rung['name']}", rung["width"], rung["height"]) for rung in DEFAULT_RENDITION_LADDER]
+    for description, rung in zip(descriptions, DEFAULT_RENDITION_LADDER):
+        h264 = description["CodecSettings"]["H264Settings"]
+        assert (h264["Bitrate"], h264["Profile"], h264["RateControlMode"]) == (rung["bitrate"], rung["profile"], "CBR")
+
+    (hls_group,) = encoder_settings["OutputGroups"]
+    assert hls_group["Name"] == "HLS_stream"
+    assert [(o["OutputName"], o["VideoDescriptionName"], o["OutputSettings"]["HlsOutputSettings"]["NameModifier"]) for o in hls_group["Outputs"]] == \
+        [(f"video_{rung['name']}", f"video_desc_{rung['name']}", f"_{rung['name']}") for rung in DEFAULT_RENDITION_LADDER]
+
+
+def test_custom_ladder(stacks):
+    template = Template.from_stack(stacks.channel(renditions=LADDER))
+
+    template.has_resource_properties("AWS::MediaLive::Channel", {
+        "EncoderSettings": Match.object_like({
+            "VideoDescriptions": [
+                Match.object_like({"Name": "video_desc_720p", "Width": 1280, "Height": 720, "CodecSettings": {"H264Settings": Match.object_like({
+                    "Bitrate": 3000000, "Profile": "MAIN", "EntropyEncoding": "CABAC", "GopNumBFrames": 1,
+                    "GopSize": 2, "GopSizeUnits": "SECONDS"})}}),     # GOP of the standard latency profile
+                Match.object_like({"Name": "video_desc_360p", "Width": 640, "Height": 360, "CodecSettings": {"H264Settings": Match.object_like({
+                    "Bitrate": 800000, "Profile": "BASELINE", "EntropyEncoding": "CAVLC", "GopNumBFrames": 0,
+                    "GopSize": 60, "GopSizeUnits": "FRAMES"})}}),
+            ],
+            "OutputGroups": [Match.object_like({"Outputs": [
+                Match.object_like({"OutputName": "video_720p", "VideoDescriptionName": "video_desc_720p", "AudioDescriptionNames": ["audio_desc_private"]}),
+                Match.object_like({"OutputName": "video_360p", "VideoDescriptionName": "video_desc_360p", "AudioDescriptionNames": ["audio_desc_private"]}),
+            ]})]
+        })
+    })
+    template.has_output("ExpectedLatencySeconds", {"Value": Match.any_value()})
+    template.has_output("MediaLivePrimaryInput", {"Value": Match.any_value()})
+
+
+def test_archive_outputs_reuse_the_video_descriptions(stacks):
+    output_groups = channel_properties(stacks.channel(renditions=LADDER, archive=True))["EncoderSettings"]["OutputGroups"]
+
+    assert [group["Name"] for group in output_groups] == ["HLS_stream", "HLS_archive"]
+    assert [(o["OutputName"], o["VideoDescriptionName"]) for o in output_groups[1]["Outputs"]] == \
+        [("video_720p_archive", "video_desc_720p"), ("video_360p_archive", "video_desc_360p")]
+
+
+@pytest.mark.parametrize("settings, log_level", [({}, "ERROR"), ({"log_level": "DEBUG"}, "DEBUG")])
+def test_log_level(stacks, settings, log_level):
+    assert channel_properties(stacks.channel(**settings))["LogLevel"] == log_level
+
+
+def test_invalid_log_level(stacks):
+    with pytest.raises(ValueError, match="log_level must be one of"):
+        stacks.channel(log_level="VERBOSE")
+
+
+@pytest.mark.parametrize("renditions, message", [
+    ([{**LADDER[0], "name": f"r{n}", "bitrate": 3000000 - n} for n in range(MAX_RENDITIONS + 1)], "the maximum is"),
+    ([LADDER[0], {**LADDER[1], "name": "720p"}], "used more than once"),
+    ([{**LADDER[0], "name": "720p.hd"}], "may only contain"),
+    ([{**LADDER[0], "width": 1281}], "even numbers"),
+    ([{**LADDER[0], "bitrate": 0}], "positive integer bitrate"),
+    ([{**LADDER[0], "bitrate": 90000000}], "between"),
+    ([{**LADDER[0], "profile": "HIGH10"}], "profile must be one of"),
+    ([{**LADDER[0], "gop_size": 2}], "gop_size and gop_size_units together"),
+    ([LADDER[1], LADDER[0]], "lower bitrate"),
+    ([LADDER[0], {**LADDER[1], "width": 1920, "height": 1080}], "must not be larger"),
+    ([{**LADDER[0], "gop_size": 4, "gop_size_units": "SECONDS"}], "does not divide the 6s segment length"),
+])
+def test_invalid_ladder_fails_synth(stacks, renditions, message):
+    with pytest.raises(ValueError, match=message):
+        stacks.channel(renditions=renditions)
+
+
+def test_empty_ladder_is_rejected():
+    # The stack falls back to the default ladder when none is passed, an explicit empty one is an error
+    with pytest.raises(ValueError, match="at least one rung"):
+        validate_rendition_ladder([])
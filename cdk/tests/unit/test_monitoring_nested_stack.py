@@ -0,0 +1,122 @@
+import json
+import pytest
+from aws_cdk.assertions import Match, Template
+from app.monitoring_nested_stack import ALARM_THRESHOLDS
+
+
+def dashboard_body(template: Template) -> dict:
+    """The dashboard body with every CloudFormation reference replaced by a placeholder string."""
+    (dashboard,) = template.find_resources("AWS::CloudWatch::Dashboard").values()
+    body = dashboard["Properties"]["DashboardBody"]
+    parts = body["Fn::Join"][1] if isinstance(body, dict) else [body]
+    return json.loads("".join(part if isinstance(part, str) else "<ref>" for part in parts))
+
+
+def widget_titles(body: dict) -> list:
+    return [widget["properties"].get("title") or widget["properties"].get("markdown") for widget in body["widgets"]]
+
+
+def alarm_thresholds(template: Template) -> dict:
+    """Threshold of every alarm by the start of its logical ID."""
+    return {logical_id[:-8]: alarm["Properties"]["Threshold"]
+            for logical_id, alarm in template.find_resources("AWS::CloudWatch::Alarm").items()}
+
+
+def test_dashboard_and_default_alarms(stacks):
+    channel = stacks.channel()
+    gateway = stacks.gateway([channel])
+    template = Template.from_stack(stacks.monitoring(gateway, [channel]))
+
+    template.has_resource_properties("AWS::CloudWatch::Dashboard", {"DashboardName": "unit_test_streaming"})
+    titles = widget_titles(dashboard_body(template))
+    assert titles[:4] == ["## private-stream-api", "API latency (ms)", "API errors", "## Player QoE"]
+    assert "API cache hit ratio (%)" not in titles     # No stage cache
+    assert {"## protected_stream", "Input loss (seconds)", "Dropped frames", "Output errors",
+            "S3 requests /pipe-1/media", "S3 latency /pipe-1/media (ms)", "Alarms"} <= set(titles)
+
+    assert alarm_thresholds(template) == {
+        "ApiLatencyAlarm": ALARM_THRESHOLDS["api_latency_p99_ms"],
+        "Api4xxAlarm": ALARM_THRESHOLDS["api_4xx_errors"],
+        "Api5xxAlarm": ALARM_THRESHOLDS["api_5xx_errors"],
+        "InputLossAlarmprotectedstream0": ALARM_THRESHOLDS["medialive_input_loss_seconds"],
+        "DroppedFramesAlarmprotectedstream0": ALARM_THRESHOLDS["medialive_dropped_frames"],
+        "Output4xxErrorsAlarmprotectedstream0": ALARM_THRESHOLDS["medialive_output_errors"],
+        "Output5xxErrorsAlarmprotectedstream0": ALARM_THRESHOLDS["medialive_output_errors"],
+        "S35xxAlarmprotectedstreampipe1media": ALARM_THRESHOLDS["s3_5xx_errors"],
+    }
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "ComparisonOperator": "GreaterThanThreshold",
+        "TreatMissingData": "notBreaching",
+        "AlarmDescription": "protected_stream pipeline 0 lost its input for more than 0 seconds"
+    })
+
+
+def test_redundant_channel_and_stage_cache(stacks):
+    channel = stacks.channel(redundant=True)
+    gateway = stacks.gateway([channel], cache_cluster_size="0.5")
+    template = Template.from_stack(stacks.monitoring(gateway, [channel]))
+
+    titles = widget_titles(dashboard_body(template))
+    assert {"API cache hit ratio (%)", "S3 requests /pipe-1/media", "S3 requests /pipe-2/media"} <= set(titles)
+    thresholds = alarm_thresholds(template)
+    assert thresholds["ApiCacheHitRatioAlarm"] == ALARM_THRESHOLDS["api_cache_hit_ratio_percent"]
+    assert {"InputLossAlarmprotectedstream0", "InputLossAlarmprotectedstream1", "S35xxAlarmprotectedstreampipe2media"} <= set(thresholds)
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "ComparisonOperator": "LessThanThreshold",
+        "AlarmDescription": "API cache hit ratio below 80%"
+    })
+
+
+def test_archive_output_errors(stacks):
+    channel = stacks.channel(archive=True)
+    gateway = stacks.gateway([channel])
+    template = Template.from_stack(stacks.monitoring(gateway, [channel]))
+
+    thresholds = alarm_thresholds(template)
+    assert {"Output4xxErrorsAlarmprotectedstream0", "Output5xxErrorsAlarmprotectedstream0",
+            "Output4xxErrorsAlarmprotectedstreamarchive0", "Output5xxErrorsAlarmprotectedstreamarchive0"} <= set(thresholds)
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        # Labelled metrics end up in Metrics, not in MetricName and Dimensions
+        "Metrics": [Match.object_like({"MetricStat": Match.object_like({"Metric": {
+            "Namespace": "AWS/MediaLive",
+            "MetricName": "Output5xxErrors",
+            "Dimensions": Match.array_with([{"Name": "OutputGroupName", "Value": "HLS_archive"}])
+        }})})],
+        "AlarmDescription": "protected_stream pipeline 0 had more than 0 Output5xxErrors writing the archive to S3"
+    })
+    (output_errors,) = [widget for widget in dashboard_body(template)["widgets"] if widget["properties"].get("title") == "Output errors"]
+    assert [metric[-1]["label"] for metric in output_errors["properties"]["metrics"]] == [
+        "Output4xxErrors HLS_stream pipeline 0", "Output5xxErrors HLS_stream pipeline 0",
+        "Output4xxErrors HLS_archive pipeline 0", "Output5xxErrors HLS_archive pipeline 0",
+    ]
+
+
+def test_manifest_refresher_alarm(event_stacks):
+    stacks = event_stacks
+    channel = stacks.channel()
+    gateway = stacks.gateway([channel], cache_cluster_size="0.5", manifest_origin=True)
+    template = Template.from_stack(stacks.monitoring(gateway, [channel]))
+
+    assert "Playlist cache refreshes" in widget_titles(dashboard_body(template))
+    assert alarm_thresholds(template)["ManifestRefreshErrorsAlarm"] == ALARM_THRESHOLDS["manifest_refresh_errors"]
+
+
+def test_threshold_overrides(stacks):
+    channel = stacks.channel()
+    gateway = stacks.gateway([channel])
+    monitoring = stacks.monitoring(gateway, [channel], alarm_thresholds={"api_5xx_errors": 1, "medialive_dropped_frames": 30})
+    template = Template.from_stack(monitoring)
+
+    assert monitoring.thresholds == {**ALARM_THRESHOLDS, "api_5xx_errors": 1, "medialive_dropped_frames": 30}
+    thresholds = alarm_thresholds(template)
+    assert thresholds["Api5xxAlarm"] == 1
+    assert thresholds["DroppedFramesAlarmprotectedstream0"] == 30
+    assert thresholds["Api4xxAlarm"] == ALARM_THRESHOLDS["api_4xx_errors"]
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {"AlarmDescription": "More than 1 API 5xx errors in 5 minutes"})
+
+
+def test_unknown_threshold_fails_synth(stacks):
+    channel = stacks.channel()
+    gateway = stacks.gateway([channel])
+    with pytest.raises(ValueError, match=r"Unknown alarm thresholds \['api_5xx_error'\]"):
+        stacks.monitoring(gateway, [channel], alarm_thresholds={"api_5xx_error": 1})
@@ -0,0 +1,63 @@
+from aws_cdk.assertions import Template
+from origin_emulator import IFRAME_PACKETS, IFRAME_PLAYLIST_SUFFIX, TS_NULL_PACKET, ChannelEmulator, LocalStore
+
+LADDER = [{"name": "360p", "width": 640, "height": 360, "bitrate": 800000, "profile": "BASELINE"}]
+IFRAME_BYTES = IFRAME_PACKETS * len(TS_NULL_PACKET)
+
+
+def emulator(stacks, tmp_path, **settings) -> ChannelEmulator:
+    """Emulator of the live output group of a channel synthesized with settings, writing under tmp_path."""
+    stack = stacks.channel(renditions=LADDER, **settings)
+    (channel,) = Template.from_stack(stack).find_resources("AWS::MediaLive::Channel").values()
+    return ChannelEmulator({"name": stack.channel_name, "media_destinations": stack.media_destinations},
+        channel["Properties"], LocalStore(str(tmp_path)))
+
+
+def playlist(tmp_path, key: str) -> list:
+    return (tmp_path / key).read_text().splitlines()
+
+
+def entries(lines: list) -> list:
+    """Tags and URI following each EXTINF."""
+    result = []
+    for line in lines:
+        if line.startswith("#EXTINF"):
+            result.append([])
+        elif result and not line.startswith("#EXT-X-PROGRAM-DATE-TIME"):
+            result[-1].append(line)
+    return result
+
+
+def test_single_file_byte_ranges(stacks, tmp_path):
+    channel = emulator(stacks, tmp_path, ts_file_mode="SINGLE_FILE")
+    for _ in range(3):
+        channel.write_segment()
+
+    (length,) = {segment["length"] for segment in channel.history["_360p"]}
+    assert entries(playlist(tmp_path, "pipe-1/media_360p.m3u8")) == [
+        [f"#EXT-X-BYTERANGE:{length}@{n * length}", "media_360p.ts"] for n in range(3)
+    ]
+
+
+def test_single_file_iframe_playlist_has_one_byte_range_per_entry(stacks, tmp_path):
+    channel = emulator(stacks, tmp_path, ts_file_mode="SINGLE_FILE", i_frame_only_playlists=True)
+    for _ in range(3):
+        channel.write_segment()
+
+    (length,) = {segment["length"] for segment in channel.history["_360p"]}
+    lines = playlist(tmp_path, f"pipe-1/media_360p{IFRAME_PLAYLIST_SUFFIX}.m3u8")
+    assert "#EXT-X-I-FRAMES-ONLY" in lines
+    assert entries(lines) == [
+        [f"#EXT-X-BYTERANGE:{IFRAME_BYTES}@{n * length}", "media_360p.ts"] for n in range(3)
+    ]
+
+
+def test_segmented_iframe_playlist(stacks, tmp_path):
+    channel = emulator(stacks, tmp_path, i_frame_only_playlists=True)
+    for _ in range(2):
+        channel.write_segment()
+
+    assert entries(playlist(tmp_path, f"pipe-1/media_360p{IFRAME_PLAYLIST_SUFFIX}.m3u8")) == [
+        [f"#EXT-X-BYTERANGE:{IFRAME_BYTES}@0", f"media_360p_{n:05d}.ts"] for n in (1, 2)
+    ]
+    assert entries(playlist(tmp_path, "pipe-1/media_360p.m3u8")) == [[f"media_360p_{n:05d}.ts"] for n in (1, 2)]
@@ -0,0 +1,56 @@
+import pytest
+from tests.unit.functions import load_lambda
+
+presigned_delivery = load_lambda("presigned_delivery")
+
+
+def presign(object_key: str) -> str:
+    return f"https://bucket.vpce-local.s3.local.vpce.amazonaws.com/media-bucket/{object_key}?X-Amz-Expires=300"
+
+
+def test_segment_uris_are_presigned():
+    playlist = "#EXTM3U\n#EXTINF:6.000,\nmedia_720p_00001.ts\n#EXTINF:6.000,\n../pipe-1/media_720p_00002.ts\n"
+
+    assert presigned_delivery.rewrite_playlist(playlist, "pipe-1/media_720p.m3u8", presign) == \
+        f"#EXTM3U\n#EXTINF:6.000,\n{presign('pipe-1/media_720p_00001.ts')}\n#EXTINF:6.000,\n{presign('pipe-1/media_720p_00002.ts')}\n"
+
+
+def test_segments_in_subdirectories_and_channel_prefixes():
+    playlist = "#EXTM3U\n#EXTINF:6.000,\n0001/media_720p_00001.ts\n"
+
+    assert presigned_delivery.rewrite_playlist(playlist, "town-hall/pipe-1/media_720p.m3u8", presign) == \
+        f"#EXTM3U\n#EXTINF:6.000,\n{presign('town-hall/pipe-1/0001/media_720p_00001.ts')}\n"
+
+
+def test_initialization_section_and_byte_ranges():
+    playlist = '#EXTM3U\n#EXT-X-MAP:URI="media_720p_init.mp4",BYTERANGE="1000@0"\n#EXT-X-BYTERANGE:5000@1000\n#EXTINF:6.000,\nmedia_720p.mp4\n'
+
+    assert presigned_delivery.rewrite_playlist(playlist, "pipe-1/media_720p.m3u8", presign) == (
+        f'#EXTM3U\n#EXT-X-MAP:URI="{presign("pipe-1/media_720p_init.mp4")}",BYTERANGE="1000@0"\n'
+        f'#EXT-X-BYTERANGE:5000@1000\n#EXTINF:6.000,\n{presign("pipe-1/media_720p.mp4")}\n')
+
+
+def test_variant_playlists_stay_relative():
+    # Players keep loading rendition playlists through the API, which rewrites them in turn
+    playlist = "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=5000000\nmedia_1080p.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=900000\nmedia_360p.m3u8?v=1\n"
+
+    assert presigned_delivery.rewrite_playlist(playlist, "pipe-1/media.m3u8", presign) == playlist
+
+
+@pytest.mark.parametrize("uri", [
+    "https://cdn.example.com/pipe-1/media_720p_00001.ts",
+    "/prod/pipe-1/media_720p_00001.ts",
+])
+def test_absolute_uris_are_left_alone(uri):
+    playlist = f'#EXTM3U\n#EXT-X-MAP:URI="{uri}"\n#EXTINF:6.000,\n{uri}\n'
+
+    assert presigned_delivery.rewrite_playlist(playlist, "pipe-1/media_720p.m3u8", presign) == playlist
+
+
+@pytest.mark.parametrize("key, allowed", [
+    ("pipe-1/media_720p_00001.ts", True),
+    ("pipe-10/media.m3u8", False),          # Prefix of another channel folder
+    ("index.html", False),
+])
+def test_allowed_prefixes(key, allowed):
+    assert presigned_delivery.allowed(key, ["pipe-1"]) is allowed
@@ -0,0 +1,70 @@
+import json
+import pytest
+from aws_cdk.assertions import Match, Template
+from app.channel_config import load_channel_config
+from app.lifecycle import WRITE_ONCE_MAX_BYTES
+from app.storage_nested_stack import StorageNestedStack
+
+
+def channel_lifecycle_rules(tmp_path, **channel) -> list:
+    config = tmp_path / "channels.json"
+    config.write_text(json.dumps({"channels": [{"name": "keynote", **channel}]}))
+    (entry,) = load_channel_config(str(config))
+    return entry["lifecycle_rules"]
+
+
+def storage_template(stacks, lifecycle_rules: list) -> Template:
+    return Template.from_stack(StorageNestedStack(stacks.root, "ChannelStorage",
+        security=stacks.security,
+        network=stacks.network,
+        lifecycle_rules=lifecycle_rules,
+        stack_name="unit_test"))
+
+
+def test_live_expiry_skips_write_once_objects(stacks, tmp_path):
+    rules = channel_lifecycle_rules(tmp_path, redundant=True, archive=True,
+        lifecycle={"expire_days": 2}, archive_lifecycle={"expire_days": 90})
+
+    storage_template(stacks, rules).has_resource_properties("AWS::S3::Bucket", {"LifecycleConfiguration": {"Rules": [
+        Match.object_like({"Id": "AbortIncompleteUploads"}),
+        # Initialization segments and the master playlist are written once per channel run, only segments expire
+        {"Id": "Media-keynote-pipe-1", "Prefix": "keynote/pipe-1/", "ExpirationInDays": 2, "ObjectSizeGreaterThan": WRITE_ONCE_MAX_BYTES, "Status": "Enabled"},
+        {"Id": "Media-keynote-pipe-2", "Prefix": "keynote/pipe-2/", "ExpirationInDays": 2, "ObjectSizeGreaterThan": WRITE_ONCE_MAX_BYTES, "Status": "Enabled"},
+        {"Id": "Media-keynote-archive", "Prefix": "keynote/archive/", "ExpirationInDays": 90, "Status": "Enabled"},
+    ]}})
+
+
+def test_manifests_of_stopped_channels_expire(stacks, tmp_path):
+    rules = channel_lifecycle_rules(tmp_path, redundant=True,
+        lifecycle={"expire_days": 7, "manifest_expire_days": 30, "max_run_days": 14})
+
+    storage_template(stacks, rules).has_resource_properties("AWS::S3::Bucket", {"LifecycleConfiguration": {"Rules": [
+        Match.object_like({"Id": "AbortIncompleteUploads"}),
+        {"Id": "Media-keynote-pipe-1", "Prefix": "keynote/pipe-1/", "ExpirationInDays": 7, "ObjectSizeGreaterThan": WRITE_ONCE_MAX_BYTES, "Status": "Enabled"},
+        {"Id": "Media-keynote-pipe-2", "Prefix": "keynote/pipe-2/", "ExpirationInDays": 7, "ObjectSizeGreaterThan": WRITE_ONCE_MAX_BYTES, "Status": "Enabled"},
+        # No size filter, playlists and initialization segments included
+        {"Id": "Manifests-keynote-pipe-1", "Prefix": "keynote/pipe-1/", "ExpirationInDays": 30, "Status": "Enabled"},
+        {"Id": "Manifests-keynote-pipe-2", "Prefix": "keynote/pipe-2/", "ExpirationInDays": 30, "Status": "Enabled"},
+    ]}})
+
+
+def test_manifest_expiry_alone(stacks, tmp_path):
+    rules = channel_lifecycle_rules(tmp_path, lifecycle={"manifest_expire_days": 30, "max_run_days": 14})
+
+    storage_template(stacks, rules).has_resource_properties("AWS::S3::Bucket", {"LifecycleConfiguration": {"Rules": [
+        Match.object_like({"Id": "AbortIncompleteUploads"}),
+        {"Id": "Manifests-keynote-pipe-1", "Prefix": "keynote/pipe-1/", "ExpirationInDays": 30, "Status": "Enabled"},
+    ]}})
+
+
+@pytest.mark.parametrize("channel, message", [
+    ({"lifecycle": {"expire_days": 7, "manifest_expire_days": 30}}, "manifest_expire_days and max_run_days together"),
+    ({"lifecycle": {"manifest_expire_days": 14, "max_run_days": 14}}, "longer than max_run_days"),
+    ({"lifecycle": {"expire_days": 7, "manifest_expire_days": 5, "max_run_days": 2}}, "longer than expire_days"),
+    ({"dvr_window_minutes": 2880, "lifecycle": {"manifest_expire_days": 2, "max_run_days": 1}}, "longer than the 2880 minute DVR window"),
+    ({"lifecycle": {"manifest_expire_days": 0, "max_run_days": 1}}, "manifest_expire_days must be a positive integer"),
+    ({"archive": True, "archive_lifecycle": {"expire_days": 90, "manifest_expire_days": 120, "max_run_days": 1}}, "unknown settings"),
+])
+def test_invalid_manifest_expiry(tmp_path, channel, message):
+    with pytest.raises(ValueError, match=message):
+        channel_lifecycle_rules(tmp_path, **channel)
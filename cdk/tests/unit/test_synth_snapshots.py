@@ -0,0 +1,10 @@
+import pytest
+import synth_benchmark
+
+
+@pytest.mark.parametrize("name", list(synth_benchmark.CONFIGS))
+def test_templates_match_snapshots(name, tmp_path):
+    # Synthesizes app.py in a child process, the way cdk synth runs it, see synth_benchmark.py to update the snapshots
+    result = synth_benchmark.benchmark(name, synth_benchmark.CONFIGS[name], repeat=1, nag=False, work_dir=str(tmp_path))
+    problems = synth_benchmark.compare_snapshot(name, result, synth_benchmark.SNAPSHOTS)
+    assert not problems, "\n".join(problems)
@@ -0,0 +1,130 @@
+import json
+import sys
+import types
+
+import pytest
+from tests.unit.functions import load_lambda
+
+viewer_authorizer = load_lambda("viewer_authorizer")
+
+KEY = "unit-test-signing-key"
+NOW = 1_700_000_000
+METHOD_ARN = "arn:aws:execute-api:eu-west-1:123456789012:abc123/prod/GET/pipe-1/media_720p.m3u8"
+CHANNEL_FOLDERS = {"protected_stream": ["/pipe-1"], "town_hall": ["/town-hall/pipe-1", "/town-hall/pipe-2"]}
+
+
+def token(channels=("protected_stream",), expires=NOW + 3600, viewer="viewer-1", key=KEY) -> str:
+    return viewer_authorizer.mint(key, viewer, list(channels), expires)
+
+
+def test_valid_token():
+    assert viewer_authorizer.verify(f"Bearer {token()}", KEY, [], NOW) == \
+        {"sub": "viewer-1", "ch": ["protected_stream"], "exp": NOW + 3600}
+
+
+@pytest.mark.parametrize("bearer, revoked, error", [
+    (token(expires=NOW), [], "token expired"),
+    (token(key="another-key"), [], "bad signature"),
+    (token().replace(".", "x."), [], "bad signature"),
+    (token(channels=["town_hall"]).split(".")[0] + "." + token().split(".")[1], [], "bad signature"),
+    (token(), ["viewer-1"], "viewer revoked"),
+    ("", [], "bad signature"),
+])
+def test_invalid_tokens(bearer, revoked, error):
+    with pytest.raises(ValueError, match=error):
+        viewer_authorizer.verify(f"Bearer {bearer}", KEY, revoked, NOW)
+
+
+def test_policy_allows_the_folders_of_the_token_channels():
+    claims = viewer_authorizer.verify(token(channels=["town_hall"]), KEY, [], NOW)
+
+    result = viewer_authorizer.policy(claims, METHOD_ARN, CHANNEL_FOLDERS)
+
+    assert result["principalId"] == "viewer-1"
+    assert result["context"] == {"viewer": "viewer-1"}
+    assert result["policyDocument"]["Statement"] == [{
+        "Action": "execute-api:Invoke",
+        "Effect": "Allow",
+        "Resource": [
+            "arn:aws:execute-api:eu-west-1:123456789012:abc123/prod/GET/town-hall/pipe-1/*",
+            "arn:aws:execute-api:eu-west-1:123456789012:abc123/prod/GET/town-hall/pipe-2/*",
+        ]
+    }]
+
+
+def test_policy_denies_channels_without_folders():
+    claims = viewer_authorizer.verify(token(channels=["another_channel"]), KEY, [], NOW)
+
+    assert viewer_authorizer.policy(claims, METHOD_ARN, CHANNEL_FOLDERS)["policyDocument"]["Statement"] == \
+        [{"Action": "execute-api:Invoke", "Effect": "Deny", "Resource": METHOD_ARN}]
+
+
+class StubSecretsManager:
+    """Stands in for the boto3 Secrets Manager client and counts the secret fetches."""
+
+    def __init__(self):
+        self.fetches = 0
+        self.secret = {"signing_key": KEY, "revoked": []}
+
+    def get_secret_value(self, SecretId):
+        self.fetches += 1
+        return {"SecretString": json.dumps(self.secret)}
+
+
+@pytest.fixture
+def secrets_manager(monkeypatch):
+    client = StubSecretsManager()
+    monkeypatch.setitem(sys.modules, "boto3", types.SimpleNamespace(client=lambda service: client))
+    monkeypatch.setitem(viewer_authorizer._secret, "value", None)
+    monkeypatch.setitem(viewer_authorizer._secret, "loaded", 0)
+    monkeypatch.setenv("SECRET_ARN", "arn:aws:secretsmanager:eu-west-1:123456789012:secret:ViewerTokens")
+    monkeypatch.setenv("CHANNEL_FOLDERS", json.dumps(CHANNEL_FOLDERS))
+    return client
+
+
+def test_secret_is_cached(monkeypatch, secrets_manager):
+    clock = [NOW]
+    monkeypatch.setattr(viewer_authorizer.time, "time", lambda: clock[0])
+
+    viewer_authorizer._signing_secret()
+    clock[0] += viewer_authorizer.SECRET_CACHE_SECONDS
+    assert viewer_authorizer._signing_secret() == {"signing_key": KEY, "revoked": []}
+    assert secrets_manager.fetches == 1
+
+    secrets_manager.secret = {"signing_key": KEY, "revoked": ["viewer-1"]}
+    clock[0] += 1
+    assert viewer_authorizer._signing_secret() == {"signing_key": KEY, "revoked": ["viewer-1"]}
+    assert secrets_manager.fetches == 2
+
+
+def test_handler(monkeypatch, secrets_manager):
+    monkeypatch.setattr(viewer_authorizer.time, "time", lambda: NOW)
+
+    result = viewer_authorizer.handler({"authorizationToken": f"Bearer {token()}", "methodArn": METHOD_ARN}, None)
+
+    assert result["policyDocument"]["Statement"][0]["Resource"] == \
+        ["arn:aws:execute-api:eu-west-1:123456789012:abc123/prod/GET/pipe-1/*"]
+    with pytest.raises(Exception, match="Unauthorized"):
+        viewer_authorizer.handler({"authorizationToken": "Bearer not-a-token", "methodArn": METHOD_ARN}, None)
+
+
+def test_simulate_cache_hit_rate(monkeypatch):
+    # The simulation sets the secret and the channel folders itself, restore both afterwards
+    monkeypatch.setitem(viewer_authorizer._secret, "value", None)
+    monkeypatch.setenv("CHANNEL_FOLDERS", "{}")
+    result = viewer_authorizer.simulate(viewers=10, minutes=1, segment_length=6, cache_ttl=300)
+
+    assert result["requests"] == 10 * (2 + 2 * 9)
+    assert result["authorizer_invocations"] == 10
+
+
+@pytest.mark.parametrize("settings", [
+    {"viewers": 0},
+    {"viewers": -1},
+    {"segment_length": 0},
+    {"minutes": 0.05},
+    {"cache_ttl": -1},
+])
+def test_invalid_simulations(settings):
+    with pytest.raises(ValueError):
+        viewer_authorizer.simulate(**{"viewers": 10, "minutes": 1, "segment_length": 6, "cache_ttl": 300, **settings})
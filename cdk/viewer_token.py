@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Mints and revokes the viewer tokens checked by the viewer authorizer (my_viewer_auth in app.py).
+
+Tokens are signed with the key in the ViewerTokens secret. Viewers open the player with ?token=<token>.
+A revoked viewer keeps access until the cached authorization expires (auth_cache_ttl), a rotated key
+invalidates every token handed out.
+
+    python3 viewer_token.py mint --viewer lobby-screen --channel protected_stream --hours 12
+    python3 viewer_token.py revoke --viewer lobby-screen
+    python3 viewer_token.py rotate
+"""
+import argparse
+import importlib.util
+import json
+import os
+import secrets
+import time
+
+SECRET_NAME = "protected_streaming_viewer_tokens"     # <my_stack_name>_viewer_tokens
+
+
+def authorizer_module():
+    """The viewer authorizer function, which also signs the tokens."""
+    path = os.path.join(os.path.dirname(__file__), "lambda", "viewer_authorizer", "index.py")
+    spec = importlib.util.spec_from_file_location("viewer_authorizer", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Mint, revoke and rotate viewer tokens.")
+    parser.add_argument("--secret", default=SECRET_NAME, help="name or ARN of the ViewerTokens secret (ViewerTokensSecretArn output)")
+    parser.add_argument("--region", default=os.environ.get("CDK_DEFAULT_REGION"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    mint = commands.add_parser("mint", help="print a token for a viewer")
+    mint.add_argument("--viewer", required=True, help="name of the viewer, used to revoke it and in the access logs")
+    mint.add_argument("--channel", action="append", required=True, help="channel the token allows, repeat for more channels")
+    mint.add_argument("--hours", type=float, default=24, help="hours until the token expires")
+    revoke = commands.add_parser("revoke", help="refuse every token of a viewer")
+    revoke.add_argument("--viewer", required=True)
+    commands.add_parser("rotate", help="replace the signing key, which invalidates every token and clears the revoked viewers")
+    args = parser.parse_args()
+
+    import boto3        # Only needed here, so the rest of the tooling runs without AWS libraries
+    secretsmanager = boto3.client("secretsmanager", region_name=args.region)
+    secret = json.loads(secretsmanager.get_secret_value(SecretId=args.secret)["SecretString"])
+
+    if args.command == "mint":
+        expires = int(time.time() + args.hours * 3600)
+        print(authorizer_module().mint(secret["signing_key"], args.viewer, args.channel, expires))
+        return 0
+    if args.command == "revoke":
+        secret["revoked"] = sorted(set(secret.get("revoked", [])) | {args.viewer})
+    else:
+        secret = {"signing_key": secrets.token_urlsafe(48), "revoked": []}
+    secretsmanager.put_secret_value(SecretId=args.secret, SecretString=json.dumps(secret))
+    print(f"Updated {args.secret}, the authorizer picks it up within a minute, cached authorizations last until they expire")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
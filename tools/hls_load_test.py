@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Simulates concurrent live HLS viewers against a master playlist and reports origin latency.
+
+Each simulated player loads the master playlist, picks a rendition from its measured throughput,
+reloads the media playlist once per target duration and downloads every new segment, switching
+renditions as its throughput estimate changes. Works against the VideoManifestPrimaryURL stack
+output or any local HTTP server.
+
+    python3 hls_load_test.py https://<api-id>.execute-api.<region>.amazonaws.com/prod/pipe-1/media.m3u8 --viewers 200 --duration 120
+    python3 hls_load_test.py http://localhost:8080/prod/pipe-1/media.m3u8 --viewers 50 --json
+
+APIs with usage plans or viewer_auth need --api-key <key> or --token <viewer token>, other headers go in --header.
+They are only sent to the origin of the playlist URL, presigned segment URLs on S3 get none, like in the video player.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import urljoin, urlsplit
+
+try:
+    import aiohttp
+except ImportError:         # Only needed to run the load test, the playlist parsers work without it
+    aiohttp = None
+
+LIVE_EDGE_SEGMENTS = 3      # Players start this many segments back from the live edge
+BANDWIDTH_SAFETY = 0.8      # Only pick renditions that need less than this share of the measured throughput
+THROUGHPUT_SMOOTHING = 0.3  # Weight of the newest sample in the throughput estimate
+# Headers the API expects with usage plans and viewer_auth, see cdk/app/api_nested_stack.py
+API_KEY_HEADER = "x-api-key"
+AUTH_HEADER = "Authorization"
+
+
+def request_headers(headers: list, api_key: str = None, token: str = None) -> dict:
+    """Headers for the API from "Name: value" strings, the API key and the viewer token."""
+    result = {}
+    for header in headers:
+        name, separator, value = header.partition(":")
+        if not separator or not name.strip():
+            raise ValueError(f"Headers are given as 'Name: value', got {header!r}")
+        result[name.strip()] = value.strip()
+    if api_key:
+        result[API_KEY_HEADER] = api_key
+    if token:
+        result[AUTH_HEADER] = f"Bearer {token}"
+    return result
+
+
+def same_origin(url: str, other_url: str) -> bool:
+    """True when both URLs have the same scheme and host, presigned S3 URLs have another host than the API."""
+    return urlsplit(url)[:2] == urlsplit(other_url)[:2]
+
+
+def parse_master_playlist(text: str, base_url: str) -> list:
+    """Returns the variant streams of a master playlist, lowest bandwidth first."""
+    variants = []
+    attributes = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attributes = _parse_attributes(line.split(":", 1)[1])
+        elif line and not line.startswith("#") and attributes is not None:
+            variants.append({"bandwidth": int(attributes.get("BANDWIDTH", 0)), "url": urljoin(base_url, line)})
+            attributes = None
+    return sorted(variants, key=lambda variant: variant["bandwidth"])
+
+
+def parse_media_playlist(text: str, base_url: str) -> dict:
+    """Returns target duration, media sequence, end flag and segments (with byte ranges) of a media playlist."""
+    playlist = {"target_duration": 6.0, "media_sequence": 0, "ended": False, "segments": []}
+    duration = None
+    byte_range = None
+    next_offset = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            playlist["target_duration"] = float(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            playlist["media_sequence"] = int(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-ENDLIST"):
+            playlist["ended"] = True
+        elif line.startswith("#EXTINF:"):
+            duration = float(line.split(":", 1)[1].split(",")[0])
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            byte_range = line.split(":", 1)[1]
+        elif line and not line.startswith("#") and duration is not None:
+            url = urljoin(base_url, line)
+            segment = {"sequence": playlist["media_sequence"] + len(playlist["segments"]), "duration": duration, "url": url, "range": None}
+            if byte_range:
+                # EXT-X-BYTERANGE:<length>[@<offset>], without an offset the range follows the previous one
+                length, _, offset = byte_range.partition("@")
+                start = int(offset) if offset else next_offset.get(url, 0)
+                segment["range"] = f"bytes={start}-{start + int(length) - 1}"
+                next_offset[url] = start + int(length)
+            playlist["segments"].append(segment)
+            duration = None
+            byte_range = None
+    return playlist
+
+
+def _parse_attributes(text: str) -> dict:
+    attributes = {}
+    key, value, quoted = "", "", False
+    reading_key = True
+    for char in text + ",":
+        if reading_key:
+            if char == "=":
+                reading_key = False
+            else:
+                key += char
+        elif char == '"':
+            quoted = not quoted
+        elif char == "," and not quoted:
+            attributes[key.strip()] = value
+            key, value, reading_key = "", "", True
+        else:
+            value += char
+    return attributes
+
+
+class Stats:
+    """Collects request latencies, bytes, errors and stalls across every simulated player."""
+
+    def __init__(self):
+        self.latencies = {"master": [], "manifest": [], "segment": []}
+        self.errors = {"master": 0, "manifest": 0, "segment": 0}
+        self.segment_bytes = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self.switches = 0
+
+    def report(self, elapsed: float, viewers: int) -> dict:
+        report = {"viewers": viewers, "elapsed_seconds": round(elapsed, 1)}
+        for kind, latencies in self.latencies.items():
+            requests = len(latencies) + self.errors[kind]
+            report[kind] = {
+                "requests": requests,
+                "errors": self.errors[kind],
+                "error_rate": round(self.errors[kind] / requests, 4) if requests else 0.0,
+                **_percentiles(latencies),
+            }
+        report["throughput_mbps"] = round(self.segment_bytes * 8 / elapsed / 10**6, 2) if elapsed else 0.0
+        report["requests_per_second"] = round(sum(item["requests"] for item in (report["manifest"], report["segment"])) / elapsed, 1) if elapsed else 0.0
+        report["stalls"] = self.stalls
+        report["stall_seconds"] = round(self.stall_seconds, 2)
+        report["rendition_switches"] = self.switches
+        return report
+
+
+def _percentiles(latencies: list) -> dict:
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    if len(latencies) == 1:
+        return {name: round(latencies[0] * 1000, 1) for name in ("p50_ms", "p95_ms", "p99_ms")}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_ms": round(cuts[49] * 1000, 1), "p95_ms": round(cuts[94] * 1000, 1), "p99_ms": round(cuts[98] * 1000, 1)}
+
+
+async def _get(session, url: str, kind: str, stats: Stats, byte_range: str = None, api_headers: dict = None):
+    headers = dict(api_headers or {})
+    if byte_range:
+        headers["Range"] = byte_range
+    started = time.monotonic()
+    try:
+        async with session.get(url, headers=headers) as response:
+            body = await response.read()
+            if response.status >= 400:
+                stats.errors[kind] += 1
+                return None, 0.0
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        stats.errors[kind] += 1
+        return None, 0.0
+    elapsed = time.monotonic() - started
+    stats.latencies[kind].append(elapsed)
+    return body, elapsed
+
+
+async def simulate_player(session, master_url: str, stats: Stats, deadline: float, api_headers: dict = None) -> None:
+    def get(url: str, kind: str, byte_range: str = None):
+        return _get(session, url, kind, stats, byte_range, api_headers if same_origin(url, master_url) else None)
+
+    body, _ = await get(master_url, "master")
+    if body is None:
+        return
+    variants = parse_master_playlist(body.decode(errors="replace"), master_url)
+    if not variants:            # The URL already points at a media playlist
+        variants = [{"bandwidth": 0, "url": master_url}]
+
+    variant = variants[0]       # Start on the lowest rendition until there is a throughput sample
+    throughput = None
+    next_sequence = None
+    buffered = 0.0              # Seconds of media downloaded but not played yet
+    playing_since = None
+
+    while time.monotonic() < deadline:
+        reload_started = time.monotonic()
+        body, _ = await get(variant["url"], "manifest")
+        if body is None:
+            await asyncio.sleep(1)
+            continue
+        playlist = parse_media_playlist(body.decode(errors="replace"), variant["url"])
+        segments = playlist["segments"]
+        if next_sequence is None:
+            next_sequence = segments[max(0, len(segments) - LIVE_EDGE_SEGMENTS)]["sequence"] if segments else 0
+
+        for segment in (segment for segment in segments if segment["sequence"] >= next_sequence):
+            if time.monotonic() >= deadline:
+                break
+            data, elapsed = await get(segment["url"], "segment", segment["range"])
+            next_sequence = segment["sequence"] + 1
+            if data is None:
+                continue
+            stats.segment_bytes += len(data)
+
+            # Drain the buffer for the time spent downloading, a stall is when it runs dry
+            now = time.monotonic()
+            if playing_since is not None:
+                buffered -= now - playing_since
+                if buffered < 0:
+                    stats.stalls += 1
+                    stats.stall_seconds += -buffered
+                    buffered = 0.0
+            playing_since = now
+            buffered += segment["duration"]
+
+            sample = len(data) * 8 / elapsed if elapsed > 0 else None
+            if sample:
+                throughput = sample if throughput is None else THROUGHPUT_SMOOTHING * sample + (1 - THROUGHPUT_SMOOTHING) * throughput
+
+        # Switch to the highest rendition the throughput estimate can sustain
+        if throughput is not None:
+            candidates = [candidate for candidate in variants if candidate["bandwidth"] <= throughput * BANDWIDTH_SAFETY] or variants[:1]
+            if candidates[-1]["url"] != variant["url"]:
+                variant = candidates[-1]
+                stats.switches += 1
+                # The new rendition has its own playlist, continue from the same media sequence
+
+        if playlist["ended"] and next_sequence > (segments[-1]["sequence"] if segments else -1):
+            break
+        # Reload the playlist once per target duration, as players do for live playlists
+        await asyncio.sleep(max(0.0, playlist["target_duration"] - (time.monotonic() - reload_started)))
+
+
+async def run(master_url: str, viewers: int, duration: float, ramp_up: float, connections: int, timeout: float,
+        api_headers: dict = None) -> dict:
+    stats = Stats()
+    connector = aiohttp.TCPConnector(limit=connections, keepalive_timeout=30)   # Connections are pooled and reused across players
+    started = time.monotonic()
+    deadline = started + duration
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def delayed_player(delay: float):
+            await asyncio.sleep(delay)
+            await simulate_player(session, master_url, stats, deadline, api_headers)
+        await asyncio.gather(*(delayed_player(random.uniform(0, ramp_up)) for _ in range(viewers)))
+    return stats.report(time.monotonic() - started, viewers)
+
+
+def print_report(report: dict) -> None:
+    print(f"viewers {report['viewers']}, {report['elapsed_seconds']}s, {report['requests_per_second']} requests/s, "
+        f"{report['throughput_mbps']} Mbps")
+    print(f"{'request':<10}{'count':>9}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind in ("master", "manifest", "segment"):
+        row = report[kind]
+        print(f"{kind:<10}{row['requests']:>9}{row['errors']:>9}{str(row['p50_ms']):>10}{str(row['p95_ms']):>10}{str(row['p99_ms']):>10}")
+    print(f"stalls {report['stalls']} ({report['stall_seconds']}s), rendition switches {report['rendition_switches']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Simulate concurrent live HLS viewers.")
+    parser.add_argument("url", help="master (or media) playlist URL")
+    parser.add_argument("--viewers", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--ramp-up", type=float, default=5, help="players start at random times within this many seconds")
+    parser.add_argument("--connections", type=int, default=100, help="size of the shared connection pool")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds before a request counts as an error")
+    parser.add_argument("--api-key", help=f"API key of a usage plan client, sent as {API_KEY_HEADER}")
+    parser.add_argument("--token", help="viewer token from cdk/viewer_token.py, sent as Authorization: Bearer <token>")
+    parser.add_argument("--header", action="append", default=[], metavar="'NAME: VALUE'",
+        help="extra request header for the API, can be repeated")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    if aiohttp is None:
+        parser.error("aiohttp is required, install it with: pip install -r requirements.txt")
+    try:
+        api_headers = request_headers(args.header, args.api_key, args.token)
+    except ValueError as error:
+        parser.error(str(error))
+    report = asyncio.run(run(args.url, args.viewers, args.duration, args.ramp_up, args.connections, args.timeout, api_headers))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
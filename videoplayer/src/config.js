@@ -0,0 +1,121 @@
+import videojs from 'video.js';
+import {apiHeaders, isApiRequest} from './request-headers.js';
+import {PRESETS, liveEdgeSeekBack} from './presets.js';
+
+// Player configuration, read at start up from player-config.json next to index.html.
+// Write it from the PlayerConfig output of the deployed stack with cdk/player_config.py.
+//
+// {
+//   "channels": [{"name": "protected_stream", "manifest": "/prod/pipe-1/media.m3u8", "segment_length": 6, "preset": "standard"}],
+//   "channel": "protected_stream",         default channel, ?channel=<name> overrides it
+//   "preset": "low-latency",               for every channel instead of the channel's own preset, ?preset=<name> overrides it
+//   "vhs": {},                             overrides of the preset, see presets.js
+//   "limit_rendition_to_player_size": true,
+//   "qoe_endpoint": "/prod/qoe",           null turns QoE beacons off
+//   "segment_cache_mb": 0,                 size of the service worker segment cache, 0 turns it off
+//   "retry_throttled": false,              retry requests the API throttled (429) after their Retry-After, in the service worker
+//   "api_key_header": null,                header for the API key of the viewer's client when the API has usage plans,
+//                                          each client opens the player with ?api_key=<key>
+//   "auth_header": null,                   header for the viewer's signed token when the API has viewer_auth,
+//                                          each viewer opens the player with ?token=<token> from viewer_token.py
+//   "debug": false                         ?debug=1 turns debug logging on for one page load
+// }
+
+var CONFIG_URL = 'player-config.json';
+
+// Used when there is no player-config.json, e.g. a player bundle uploaded before the config was written
+var DEFAULT_CONFIG = {
+    channels: [{name: 'protected_stream', manifest: '/prod/pipe-1/media.m3u8', segment_length: 6, preset: 'standard'}],
+    vhs: {},
+    limit_rendition_to_player_size: true,
+    qoe_endpoint: '/prod/qoe',
+    segment_cache_mb: 0,
+    retry_throttled: false,
+    api_key_header: null,
+    auth_header: null,
+    debug: false
+};
+
+export function loadConfig() {
+    return fetch(CONFIG_URL, {cache: 'no-cache'})
+        .then(function(response) { return response.ok ? response.json() : {}; })
+        .catch(function() { return {}; })
+        .then(function(config) { return resolveConfig(Object.assign({}, DEFAULT_CONFIG, config), new URLSearchParams(window.location.search)); });
+}
+
+function resolveConfig(config, query) {
+    var channelName = query.get('channel') || config.channel || config.channels[0].name;
+    var channel = config.channels.find(function(candidate) { return candidate.name === channelName; }) || config.channels[0];
+    var presetName = query.get('preset') || config.preset || channel.preset || 'standard';
+    var preset = PRESETS[presetName] || PRESETS['standard'];
+    return {
+        channel: channel,
+        preset: presetName,
+        tuning: Object.assign(preset(channel.segment_length), config.vhs),
+        limitRenditionToPlayerSize: config.limit_rendition_to_player_size,
+        qoeEndpoint: config.qoe_endpoint,
+        segmentCacheMb: Number(config.segment_cache_mb) || 0,
+        retryThrottled: config.retry_throttled === true,
+        apiKeyHeader: config.api_key_header,
+        apiKey: query.get('api_key'),        // Never from player-config.json, it is shared by every client
+        authHeader: config.auth_header,
+        token: query.get('token'),          // Never from player-config.json, tokens identify one viewer
+        debug: query.get('debug') === '1' || config.debug === true
+    };
+}
+
+// VHS reads its buffer goals from globals, so they apply to every player on the page
+export function applyTuning(config) {
+    var tuning = config.tuning;
+    videojs.Vhs.GOAL_BUFFER_LENGTH = tuning.goal_buffer;
+    videojs.Vhs.MAX_GOAL_BUFFER_LENGTH = tuning.max_goal_buffer;
+    videojs.Vhs.BANDWIDTH_VARIANCE = tuning.bandwidth_variance;
+    return {
+        liveui: true,
+        fluid: true,                // Sized by the page instead of a fixed 960x540
+        aspectRatio: '16:9',
+        liveTracker: {
+            liveTolerance: tuning.live_edge_segments * config.channel.segment_length + config.channel.segment_length
+        },
+        html5: {
+            vhs: {
+                overrideNative: true,
+                limitRenditionByPlayerDimensions: config.limitRenditionToPlayerSize,
+                useNetworkInformationApi: tuning.use_network_information_api,
+                experimentalBufferBasedABR: tuning.buffer_based_abr
+            }
+        }
+    };
+}
+
+// Sends the viewer's API key and token with the playlist and segment requests VHS makes to the API,
+// for APIs with usage plans and APIs with viewer_auth. Presigned S3 URLs are left alone, see request-headers.js.
+export function applyRequestHeaders(config) {
+    var result = apiHeaders(config);
+    result.warnings.forEach(function(warning) { videojs.log.warn(warning); });
+    var headers = result.headers;
+    if (Object.keys(headers).length === 0) {
+        return;
+    }
+    videojs.Vhs.xhr.beforeRequest = function(options) {
+        if (isApiRequest(options.uri || options.url, window.location.href)) {
+            options.headers = Object.assign({}, options.headers, headers);
+        }
+        return options;
+    };
+}
+
+// Moves playback to live_edge_segments behind the live edge once the live window is known
+export function seekToLiveEdge(player, config) {
+    var seekBack = liveEdgeSeekBack(config.tuning, config.channel.segment_length);
+    player.one('loadedmetadata', function() {
+        var seekable = player.seekable();
+        if (seekBack === 0 || player.duration() !== Infinity || seekable.length === 0) {
+            return;
+        }
+        var target = seekable.end(seekable.length - 1) - seekBack;
+        if (target > seekable.start(0)) {
+            player.currentTime(target);
+        }
+    });
+}
@@ -1,8 +1,9 @@
 import videojs from 'video.js';
+import { instrumentPlayer } from './qoe.js';
+import { loadConfig, applyTuning, applyRequestHeaders, seekToLiveEdge } from './config.js';
+import { registerSegmentCache, unregisterSegmentCache } from './segment-cache.js';
 
-videojs.log.level('debug');
-
-function videoplayerElem() {
+function videoplayerElem(manifest) {
     
     var video = document.createElement('video')
     var source = document.createElement('source')
@@ -10,33 +11,46 @@ function videoplayerElem() {
     video.setAttribute('id','protected-player');
     video.setAttribute('class','video-js');
     source.setAttribute('type', 'application/x-mpegURL');
-    source.setAttribute('src', '/prod/pipe-1/media.m3u8')
-
-    console.log(video);
+    source.setAttribute('src', manifest)
 
     video.appendChild(source);
 
     return video;
 }
 
-document.body.appendChild(videoplayerElem());
+loadConfig().then(function(config) {
+    // Debug logging costs CPU on weak clients, so it is only on when asked for
+    videojs.log.level(config.debug ? 'debug' : 'warn');
 
-
-var options = {liveui: true};
-var player = videojs('protected-player', options, 
-    function onPlayerReady(){
-        videojs.log('Video player loaded');
-        this.width(960);
-        this.height(540);
-        this.controls(true);
-        videojs.log('Duration after loading: '+this.duration())
+    // Segments downloaded once are served from the browser when the viewer seeks back, and throttled requests are retried.
+    // window.segmentCache.stats() resolves to the hit, miss and throttled counters of the worker.
+    if (config.segmentCacheMb > 0 || config.retryThrottled) {
+        window.segmentCache = registerSegmentCache(config.segmentCacheMb, config.retryThrottled);
+    } else {
+        unregisterSegmentCache();
     }
-);
-
-player.on('play', 
-    function onPlayerPlay(){
-        videojs.log('Play event triggered')
-        videojs.log('Duration when playing: '+this.duration())
+    applyRequestHeaders(config);
+
+    document.body.insertBefore(videoplayerElem(config.channel.manifest), document.body.firstChild);
+
+    var player = videojs('protected-player', applyTuning(config), 
+        function onPlayerReady(){
+            videojs.log('Video player loaded, channel ' + config.channel.name + ', preset ' + config.preset);
+            this.controls(true);
+            videojs.log('Duration after loading: '+this.duration())
+        }
+    );
+    seekToLiveEdge(player, config);
+
+    // Startup, rebuffering, bitrate switch and throughput metrics are sent to the QoE endpoint on the API
+    if (config.qoeEndpoint) {
+        instrumentPlayer(player, {endpoint: config.qoeEndpoint});
     }
-);
 
+    player.on('play', 
+        function onPlayerPlay(){
+            videojs.log('Play event triggered')
+            videojs.log('Duration when playing: '+this.duration())
+        }
+    );
+});
@@ -0,0 +1,44 @@
+// Player tuning presets, chosen per channel by the API stack (preset in player-config.json) from its latency profile.
+
+// VHS never plays closer to the live edge than this many target durations when the playlist has no HOLD-BACK,
+// which MediaLive HLS playlists do not have. Lower latency comes from shorter segments (the channel's latency_profile).
+export var MIN_LIVE_EDGE_SEGMENTS = 3;
+
+// Seconds the standard preset plays behind the live edge. The buffer ahead can never be longer than the distance to
+// the edge, so this is also the buffer goal: a player that close to the edge rides out a stall of that long.
+var STANDARD_LIVE_DELAY = 30;
+
+// Tuning per preset, from the segment length of the channel.
+//   live_edge_segments: how far behind the live edge playback starts, at least MIN_LIVE_EDGE_SEGMENTS
+//   goal_buffer / max_goal_buffer: seconds VHS buffers ahead, growing from the first to the second as playback continues
+//   bandwidth_variance: how much more bandwidth than a rendition's bitrate VHS wants before switching up
+//   buffer_based_abr: choose renditions from buffer level as well as measured bandwidth, which reacts faster with short buffers
+export var PRESETS = {
+    'standard': function(segmentLength) {
+        return {
+            // 5 segments of the 6 s standard profile, the 10 segment playlist leaves room to fall back
+            live_edge_segments: Math.max(MIN_LIVE_EDGE_SEGMENTS, Math.ceil(STANDARD_LIVE_DELAY / segmentLength)),
+            goal_buffer: STANDARD_LIVE_DELAY,
+            max_goal_buffer: 2 * STANDARD_LIVE_DELAY,
+            bandwidth_variance: 1.2,
+            buffer_based_abr: false,
+            use_network_information_api: false
+        };
+    },
+    'low-latency': function(segmentLength) {
+        return {
+            // As close to the edge as VHS plays, the 1 and 2 s segments of the low latency profiles keep that a few seconds
+            live_edge_segments: MIN_LIVE_EDGE_SEGMENTS,
+            goal_buffer: MIN_LIVE_EDGE_SEGMENTS * segmentLength,
+            max_goal_buffer: (MIN_LIVE_EDGE_SEGMENTS + 1) * segmentLength,
+            bandwidth_variance: 1.5,    // Little buffer to absorb a wrong guess, so switch up later
+            buffer_based_abr: true,
+            use_network_information_api: true
+        };
+    }
+};
+
+// Seconds to seek back from the end of the seekable range, which VHS already puts MIN_LIVE_EDGE_SEGMENTS behind the edge
+export function liveEdgeSeekBack(tuning, segmentLength) {
+    return Math.max(0, tuning.live_edge_segments - MIN_LIVE_EDGE_SEGMENTS) * segmentLength;
+}
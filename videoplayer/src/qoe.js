@@ -0,0 +1,136 @@
+import videojs from 'video.js';
+
+// Measures what viewers actually experience and sends it in batches to the QoE endpoint of private-stream-api:
+// startup time, time to first frame, rebuffers, bitrate switches and segment download throughput from VHS.
+
+var DEFAULTS = {
+    endpoint: '/prod/qoe',
+    flushInterval: 10000,       // Milliseconds between beacons
+    maxBatch: 50,               // Events per beacon, the batch is sent early when it is full
+    throughputInterval: 5000    // Milliseconds between segment throughput samples
+};
+
+function sessionId() {
+    if (window.crypto && window.crypto.randomUUID) {
+        return window.crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+export function instrumentPlayer(player, options) {
+    var settings = Object.assign({}, DEFAULTS, options);
+    var session = sessionId();
+    var queue = [];
+    var created = performance.now();
+    var playRequested = null;
+    var started = false;
+    var rebufferStarted = null;
+    var seeking = false;
+    var bandwidth = null;
+    var lastStats = null;
+
+    function record(event) {
+        event.t = Date.now();
+        queue.push(event);
+        if (queue.length >= settings.maxBatch) {
+            flush(false);
+        }
+    }
+
+    function flush(unloading) {
+        if (queue.length === 0) {
+            return;
+        }
+        var body = JSON.stringify({session: session, manifest: player.currentSrc(), events: queue.splice(0, queue.length)});
+        // sendBeacon survives the page closing, fetch is the fallback for browsers without it
+        if (navigator.sendBeacon && navigator.sendBeacon(settings.endpoint, new Blob([body], {type: 'application/json'}))) {
+            return;
+        }
+        fetch(settings.endpoint, {method: 'POST', body: body, headers: {'Content-Type': 'application/json'}, keepalive: unloading})
+            .catch(function(error) { videojs.log.debug('QoE beacon failed', error); });
+    }
+
+    function vhs() {
+        var tech = player.tech(true);
+        return tech && tech.vhs;
+    }
+
+    // Startup time counts from player creation, time to first frame from the play request to the first rendered frame
+    player.on('play', function() {
+        if (playRequested === null) {
+            playRequested = performance.now();
+        }
+    });
+    player.one('playing', function() {
+        var playingAt = performance.now();
+        var video = player.tech(true).el();
+        function firstFrame() {
+            started = true;
+            record({
+                type: 'startup',
+                startup_ms: Math.round(playingAt - created),
+                ttff_ms: Math.round(performance.now() - (playRequested === null ? created : playRequested))
+            });
+        }
+        if (video.requestVideoFrameCallback) {
+            video.requestVideoFrameCallback(firstFrame);
+        } else {
+            player.one('timeupdate', firstFrame);
+        }
+    });
+
+    // A rebuffer is the player waiting for data after playback started, not because the viewer seeked
+    player.on('seeking', function() { seeking = true; });
+    player.on('seeked', function() { seeking = false; });
+    player.on('waiting', function() {
+        if (started && !seeking && rebufferStarted === null) {
+            rebufferStarted = performance.now();
+        }
+    });
+    player.on('playing', function() {
+        if (rebufferStarted !== null) {
+            record({type: 'rebuffer', duration_ms: Math.round(performance.now() - rebufferStarted)});
+            rebufferStarted = null;
+        }
+    });
+
+    // Bitrate switches, from the rendition VHS selects
+    player.on('loadedmetadata', function() {
+        var tech = vhs();
+        if (!tech || !tech.playlists) {
+            return;
+        }
+        tech.playlists.on('mediachange', function() {
+            var media = tech.playlists.media();
+            var next = media && media.attributes ? media.attributes.BANDWIDTH : null;
+            if (bandwidth !== null && next !== bandwidth) {
+                record({type: 'bitrate_switch', from_bps: bandwidth, to_bps: next});
+            }
+            bandwidth = next;
+        });
+    });
+
+    // Segment throughput, from the bytes and transfer time VHS counted since the previous sample
+    setInterval(function() {
+        var tech = vhs();
+        if (!tech || !tech.stats) {
+            return;
+        }
+        var stats = {bytes: tech.stats.mediaBytesTransferred, ms: tech.stats.mediaTransferDuration, requests: tech.stats.mediaRequests};
+        if (lastStats !== null && stats.ms > lastStats.ms) {
+            var bytes = stats.bytes - lastStats.bytes;
+            var ms = stats.ms - lastStats.ms;
+            record({type: 'throughput', bytes: bytes, ms: ms, requests: stats.requests - lastStats.requests,
+                bps: Math.round(bytes * 8000 / ms), bitrate_bps: bandwidth});
+        }
+        lastStats = stats;
+    }, settings.throughputInterval);
+
+    setInterval(function() { flush(false); }, settings.flushInterval);
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') {
+            flush(true);
+        }
+    });
+    window.addEventListener('pagehide', function() { flush(true); });
+}
@@ -0,0 +1,30 @@
+// Headers the API needs on playlist and segment requests: the viewer's API key (usage plans) and token (viewer_auth).
+// They only go to the API itself. In the redirect delivery mode segments come straight from S3 with presigned URLs:
+// S3 rejects a presigned request that also carries an Authorization header, and the bucket CORS rules allow no
+// request header but Range.
+
+// Returns the headers for the config, and a warning for each one the viewer did not pass in the player URL
+export function apiHeaders(config) {
+    var headers = {};
+    var warnings = [];
+    if (config.apiKeyHeader) {
+        if (config.apiKey) {
+            headers[config.apiKeyHeader] = config.apiKey;
+        } else {
+            warnings.push('The API needs an API key, open the player with ?api_key=<key>');
+        }
+    }
+    if (config.authHeader) {
+        if (config.token) {
+            headers[config.authHeader] = 'Bearer ' + config.token;
+        } else {
+            warnings.push('The API needs a viewer token, open the player with ?token=<token>');
+        }
+    }
+    return {headers: headers, warnings: warnings};
+}
+
+// The player is served by the API, so requests to the API are the ones to the origin of the page
+export function isApiRequest(uri, pageUrl) {
+    return new URL(uri, pageUrl).origin === new URL(pageUrl).origin;
+}
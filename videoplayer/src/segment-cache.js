@@ -0,0 +1,59 @@
+import videojs from 'video.js';
+
+// Registers the segment caching service worker (sw.js) and gives the page access to its hit and miss counters.
+// The worker is built next to main.js, so its scope is the API stage and it sees every segment request of the player.
+// It also retries requests the API throttled, after their Retry-After, when retryThrottled is set.
+
+var WORKER_URL = 'sw.js';
+
+function ask(registration, message) {
+    return new Promise(function(resolve) {
+        var worker = registration.active;
+        if (!worker) {
+            resolve(null);
+            return;
+        }
+        var channel = new MessageChannel();
+        channel.port1.onmessage = function(event) { resolve(event.data); };
+        worker.postMessage(message, [channel.port2]);
+    });
+}
+
+// Returns {stats(), clear()}, or null when the browser has no service workers (or the page is not served over https).
+// maxMegabytes 0 caches nothing, the worker then only retries throttled requests.
+export function registerSegmentCache(maxMegabytes, retryThrottled) {
+    if (!('serviceWorker' in navigator)) {
+        return null;
+    }
+    var registered = navigator.serviceWorker.register(WORKER_URL + '?max_mb=' + encodeURIComponent(maxMegabytes) +
+            '&retry_throttled=' + (retryThrottled ? '1' : '0'))
+        .then(function() { return navigator.serviceWorker.ready; })
+        .catch(function(error) {
+            videojs.log.warn('Segment cache not available', error);
+            return null;
+        });
+    return {
+        // {hits, misses, hit_bytes, miss_bytes, throttled, entries, bytes, max_bytes}
+        stats: function() {
+            return registered.then(function(registration) { return registration ? ask(registration, 'stats') : null; });
+        },
+        clear: function() {
+            return registered.then(function(registration) { return registration ? ask(registration, 'clear') : null; });
+        }
+    };
+}
+
+// Removes a worker registered by an earlier page load, when the cache and retries have been turned off in the config
+export function unregisterSegmentCache() {
+    if (!('serviceWorker' in navigator)) {
+        return;
+    }
+    navigator.serviceWorker.getRegistrations().then(function(registrations) {
+        registrations.forEach(function(registration) {
+            var worker = registration.active || registration.waiting || registration.installing;
+            if (worker && new URL(worker.scriptURL).pathname.endsWith('/' + WORKER_URL)) {
+                registration.unregister();
+            }
+        });
+    });
+}
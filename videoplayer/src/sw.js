@@ -0,0 +1,215 @@
+// Service worker caching media segments, so seeking back within the live window does not fetch them again.
+// Registered by segment-cache.js as sw.js?max_mb=<size>&retry_throttled=<0|1>. Playlists always go to the network.
+// Segments are kept in a size bounded LRU keyed by segment URL (and byte range for single file renditions), max_mb=0 keeps none.
+// Entries expire after the max-age of the response: a restarted channel writes the same segment names again.
+// With retry_throttled=1 playlist and segment requests the API throttled (429) are retried after their Retry-After,
+// so VHS does not see the error and switch renditions because of it.
+
+var CACHE_NAME = 'segments-v1';
+var SEGMENT_PATTERN = /\.(ts|mp4|m4s|aac|m4a)$/i;
+var SIGNATURE_PARAM = /^X-Amz-/i;       // Presigned URLs change with every playlist refresh, the object does not
+var SIZE_HEADER = 'X-Segment-Cache-Size';
+var STATUS_HEADER = 'X-Segment-Cache-Status';
+var EXPIRES_HEADER = 'X-Segment-Cache-Expires';
+// Seconds a segment is kept when the response has no max-age, e.g. presigned S3 responses. Matches MAX_SEGMENT_CACHE_TTL of the API.
+var DEFAULT_MAX_AGE = 60;
+
+var PLAYLIST_PATTERN = /\.m3u8$/i;
+var MAX_RETRIES = 3;
+var MAX_RETRY_WAIT = 10;                // Seconds, a longer Retry-After is handed to the player as it is
+
+var params = new URL(self.location.href).searchParams;
+var maxBytes = (params.has('max_mb') ? Number(params.get('max_mb')) || 0 : 200) * 1024 * 1024;
+var retryThrottled = params.get('retry_throttled') === '1';
+var entries = new Map();                // Cache key -> size in bytes, in least recently used first order
+var totalBytes = 0;
+var stats = {hits: 0, misses: 0, hit_bytes: 0, miss_bytes: 0, throttled: 0};
+var ready = loadIndex();
+
+// Rebuilds the LRU index after the browser restarted the worker, cache.keys() is in insertion order
+function loadIndex() {
+    return caches.open(CACHE_NAME).then(function(cache) {
+        return cache.keys().then(function(requests) {
+            return Promise.all(requests.map(function(request) {
+                return cache.match(request).then(function(response) {
+                    var size = response ? Number(response.headers.get(SIZE_HEADER)) || 0 : 0;
+                    entries.set(request.url, size);
+                    totalBytes += size;
+                });
+            }));
+        });
+    });
+}
+
+function cacheKey(request) {
+    var url = new URL(request.url);
+    Array.from(url.searchParams.keys()).forEach(function(name) {
+        if (SIGNATURE_PARAM.test(name)) {
+            url.searchParams.delete(name);
+        }
+    });
+    var range = request.headers.get('Range');
+    if (range) {
+        url.searchParams.set('segment-cache-range', range);
+    }
+    return url.toString();
+}
+
+function touch(key, size) {
+    if (entries.has(key)) {
+        totalBytes -= entries.get(key);
+        entries.delete(key);
+    }
+    entries.set(key, size);
+    totalBytes += size;
+}
+
+function evict(cache) {
+    var deletions = [];
+    var iterator = entries.keys();
+    while (totalBytes > maxBytes && entries.size > 1) {
+        var oldest = iterator.next().value;
+        totalBytes -= entries.get(oldest);
+        entries.delete(oldest);
+        deletions.push(cache.delete(oldest));
+    }
+    return Promise.all(deletions);
+}
+
+// Seconds the response may be kept, 0 when it must not be stored
+function maxAge(response) {
+    var cacheControl = response.headers.get('Cache-Control') || '';
+    if (/no-store|no-cache/i.test(cacheControl)) {
+        return 0;
+    }
+    var match = /max-age=(\d+)/i.exec(cacheControl);
+    return match ? Number(match[1]) : DEFAULT_MAX_AGE;
+}
+
+function remove(cache, key) {
+    if (entries.has(key)) {
+        totalBytes -= entries.get(key);
+        entries.delete(key);
+    }
+    return cache.delete(key);
+}
+
+// The Cache API does not store 206 responses, partial responses are stored as 200 and turned back into 206 on a hit
+function toStored(response, body, seconds) {
+    var headers = new Headers(response.headers);
+    headers.set(SIZE_HEADER, String(body.byteLength));
+    headers.set(STATUS_HEADER, String(response.status));
+    headers.set(EXPIRES_HEADER, String(Date.now() + seconds * 1000));
+    return new Response(body, {status: 200, headers: headers});
+}
+
+function fromStored(response) {
+    var status = Number(response.headers.get(STATUS_HEADER)) || 200;
+    return response.arrayBuffer().then(function(body) {
+        var headers = new Headers(response.headers);
+        headers.delete(SIZE_HEADER);
+        headers.delete(STATUS_HEADER);
+        headers.delete(EXPIRES_HEADER);
+        return new Response(body, {status: status, headers: headers});
+    });
+}
+
+// Seconds to wait from a Retry-After header, which is either a number of seconds or an HTTP date
+function retryAfterSeconds(response) {
+    var value = response.headers.get('Retry-After');
+    if (!value) {
+        return 1;
+    }
+    var seconds = Number(value);
+    return isNaN(seconds) ? Math.max(0, (Date.parse(value) - Date.now()) / 1000) : seconds;
+}
+
+function retryingFetch(request, retries) {
+    retries = retries === undefined ? MAX_RETRIES : retries;
+    return fetch(request).then(function(response) {
+        if (response.status !== 429) {
+            return response;
+        }
+        stats.throttled += 1;
+        var wait = retryAfterSeconds(response);
+        if (!retryThrottled || retries === 0 || wait > MAX_RETRY_WAIT) {
+            return response;
+        }
+        return new Promise(function(resolve) { setTimeout(resolve, wait * 1000); })
+            .then(function() { return retryingFetch(request, retries - 1); });
+    });
+}
+
+function cachedFetch(request) {
+    var key = cacheKey(request);
+    return ready.then(function() { return caches.open(CACHE_NAME); }).then(function(cache) {
+        return cache.match(key).then(function(cached) {
+            if (cached && Number(cached.headers.get(EXPIRES_HEADER)) <= Date.now()) {
+                remove(cache, key);
+                cached = undefined;
+            }
+            if (cached) {
+                var size = Number(cached.headers.get(SIZE_HEADER)) || 0;
+                stats.hits += 1;
+                stats.hit_bytes += size;
+                touch(key, size);
+                return fromStored(cached);
+            }
+            return retryingFetch(request).then(function(response) {
+                if (response.status !== 200 && response.status !== 206) {
+                    return response;
+                }
+                return response.clone().arrayBuffer().then(function(body) {
+                    stats.misses += 1;
+                    stats.miss_bytes += body.byteLength;
+                    // A segment larger than the whole cache is passed through without being stored
+                    var seconds = maxAge(response);
+                    if (body.byteLength <= maxBytes && seconds > 0) {
+                        touch(key, body.byteLength);
+                        cache.put(key, toStored(response, body, seconds)).then(function() { return evict(cache); });
+                    }
+                    return response;
+                });
+            });
+        });
+    });
+}
+
+self.addEventListener('install', function() {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', function(event) {
+    event.waitUntil(self.clients.claim());
+});
+
+self.addEventListener('fetch', function(event) {
+    var request = event.request;
+    // Anything but segments and playlists is left to the browser, playlists are never cached
+    var path = new URL(request.url).pathname;
+    if (request.method !== 'GET') {
+        return;
+    }
+    if (SEGMENT_PATTERN.test(path)) {
+        event.respondWith(maxBytes > 0 ? cachedFetch(request) : retryingFetch(request));
+    } else if (retryThrottled && PLAYLIST_PATTERN.test(path)) {
+        event.respondWith(retryingFetch(request));
+    }
+});
+
+// The page asks for the counters with a MessageChannel, see segment-cache.js
+self.addEventListener('message', function(event) {
+    var port = event.ports[0];
+    if (!port) {
+        return;
+    }
+    if (event.data === 'stats') {
+        port.postMessage(Object.assign({entries: entries.size, bytes: totalBytes, max_bytes: maxBytes}, stats));
+    } else if (event.data === 'clear') {
+        caches.delete(CACHE_NAME).then(function() {
+            entries.clear();
+            totalBytes = 0;
+            port.postMessage(true);
+        });
+    }
+});
@@ -0,0 +1,34 @@
+import assert from 'node:assert/strict';
+import test from 'node:test';
+import {MIN_LIVE_EDGE_SEGMENTS, PRESETS, liveEdgeSeekBack} from '../src/presets.js';
+
+test('standard preset plays 30 s behind the live edge', function() {
+    var tuning = PRESETS['standard'](6);
+    assert.equal(tuning.live_edge_segments, 5);
+    assert.equal(liveEdgeSeekBack(tuning, 6), 12);
+    assert.equal(PRESETS['standard'](4).live_edge_segments, 8);
+});
+
+test('standard preset never goes closer to the edge than VHS', function() {
+    assert.equal(PRESETS['standard'](15).live_edge_segments, MIN_LIVE_EDGE_SEGMENTS);
+    assert.equal(liveEdgeSeekBack(PRESETS['standard'](15), 15), 0);
+});
+
+test('low latency preset plays as close to the edge as VHS does', function() {
+    for (var segmentLength of [1, 2, 6]) {
+        var tuning = PRESETS['low-latency'](segmentLength);
+        assert.equal(tuning.live_edge_segments, MIN_LIVE_EDGE_SEGMENTS);
+        assert.equal(liveEdgeSeekBack(tuning, segmentLength), 0);
+        assert.equal(tuning.goal_buffer, 3 * segmentLength);
+    }
+});
+
+test('the presets differ for the segment length of each latency profile', function() {
+    for (var segmentLength of [1, 2, 6]) {
+        assert.ok(PRESETS['standard'](segmentLength).live_edge_segments > PRESETS['low-latency'](segmentLength).live_edge_segments);
+    }
+});
+
+test('overrides below the minimum do not seek', function() {
+    assert.equal(liveEdgeSeekBack({live_edge_segments: 1}, 2), 0);
+});
@@ -0,0 +1,29 @@
+import assert from 'node:assert/strict';
+import test from 'node:test';
+import {apiHeaders, isApiRequest} from '../src/request-headers.js';
+
+var PAGE = 'https://abcdef1234-vpce-0123456789abcdef0.execute-api.us-east-1.amazonaws.com/prod/index.html';
+var PRESIGNED = 'https://bucket.vpce-0123456789abcdef0-abcdefgh.s3.us-east-1.vpce.amazonaws.com/media-bucket/pipe-1/media_720p_00001.ts'
+    + '?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Signature=0123';
+
+test('playlists and segments served by the API get the headers', function() {
+    assert.equal(isApiRequest('/prod/pipe-1/media.m3u8', PAGE), true);
+    assert.equal(isApiRequest('media_720p_00001.ts', PAGE), true);
+    assert.equal(isApiRequest(new URL('/prod/pipe-1/media_720p.m3u8', PAGE).href, PAGE), true);
+});
+
+test('presigned S3 segment URLs of the redirect delivery mode do not', function() {
+    assert.equal(isApiRequest(PRESIGNED, PAGE), false);
+});
+
+test('API key and viewer token headers', function() {
+    var config = {apiKeyHeader: 'x-api-key', apiKey: 'key', authHeader: 'Authorization', token: 'payload.signature'};
+    assert.deepEqual(apiHeaders(config), {headers: {'x-api-key': 'key', 'Authorization': 'Bearer payload.signature'}, warnings: []});
+});
+
+test('no headers when the API needs none, a warning when the viewer did not pass one', function() {
+    assert.deepEqual(apiHeaders({apiKeyHeader: null, authHeader: null}), {headers: {}, warnings: []});
+    var result = apiHeaders({apiKeyHeader: null, authHeader: 'Authorization', token: null});
+    assert.deepEqual(result.headers, {});
+    assert.equal(result.warnings.length, 1);
+});